@@ -0,0 +1,201 @@
+import os
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from pytube import exceptions, extract
+
+from blobstore import BlobStore
+from ledger import SHORT
+from range_download import RangeDownloader
+from youtube_downloader import YouTubeChannelDownloader
+
+
+class AsyncYouTubeChannelDownloader(YouTubeChannelDownloader):
+    """
+    asyncio variant of YouTubeChannelDownloader that processes many videos at once.
+    
+    Each video goes through three phases - metadata fetching, short detection
+    and stream download - and every phase has its own concurrency limit, so
+    slow downloads never stop metadata for later videos from being fetched.
+    pytube is blocking, so each phase runs on a dedicated thread pool.
+    """
+    
+    def __init__(self, channel_url, metadata_concurrency=8, probe_concurrency=8, download_concurrency=4, **kwargs):
+        """
+        Initialize the asynchronous downloader.
+        
+        Args:
+            channel_url (str): URL of the YouTube channel
+            metadata_concurrency (int): Videos whose metadata may be fetched at once
+            probe_concurrency (int): Videos that may be checked for being a Short at once
+            download_concurrency (int): Videos that may be downloaded at once
+            **kwargs: Passed on to YouTubeChannelDownloader
+        """
+        super().__init__(channel_url, **kwargs)
+        self.metadata_concurrency = metadata_concurrency
+        self.probe_concurrency = probe_concurrency
+        self.download_concurrency = download_concurrency
+    
+    async def _run(self, func, *args):
+        """Run a blocking call on the downloader's thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+    
+    async def process_video(self, video_url):
+        """
+        Fetch, classify and download a single video.
+        
+        Args:
+            video_url (str): URL of the video to download
+            
+        Returns:
+            bool: True if download was successful, False otherwise
+        """
+        try:
+            # Consult the ledger before any network request
+            video_id = extract.video_id(video_url)
+            if self.is_known(video_id):
+                return self.ledger.is_downloaded(video_id)
+            
+            try:
+                # Phase 1: metadata
+                async with self._metadata_slots:
+                    await self._run(self.rate_limiter.acquire)
+                    yt = await self._run(self.video_factory, video_url)
+                    video_data = await self._run(self.collect_metadata, yt, video_url)
+                print(f"Processing: {video_data['title']} ({video_id})")
+                
+                # Phase 2: short detection
+                if self.skip_shorts:
+                    async with self._probe_slots:
+                        short = await self._run(self.is_short, yt, video_data)
+                    if short:
+                        print(f"Skipping YouTube Short: {video_data['title']}")
+                        await self._run(self.ledger.record, video_id, SHORT)
+                        self.rate_limiter.record()
+                        return False
+                
+                video_path, metadata_path = self.video_paths(video_id)
+                if os.path.exists(video_path) and os.path.exists(metadata_path):
+                    # Checksums the whole file
+                    await self._run(self.ledger.record_file, video_id, video_path)
+                    self.rate_limiter.record()
+                    return True
+                
+                await self._run(self.save_metadata, video_data, metadata_path)
+                
+                # Phase 3: download, unless another output directory stored it
+                if await self._run(self.link_stored, video_id):
+                    downloaded = True
+                else:
+                    async with self._download_slots:
+                        downloaded = await self._run(self.download_stream, yt, video_id)
+            except Exception as e:
+                self.rate_limiter.record(e)
+                raise
+            self.rate_limiter.record()
+            return downloaded
+            
+        except exceptions.VideoUnavailable:
+            print(f"Video {video_url} is unavailable, skipping.")
+            return False
+        except Exception as e:
+            print(f"Error downloading {video_url}: {str(e)}")
+            return False
+    
+    async def download_all_videos_async(self, stop_after=None):
+        """
+        Download all videos from the channel concurrently.
+        
+        Args:
+            stop_after (int): If set, only list new uploads (see get_video_list)
+        
+        Returns:
+            tuple: (success_count, total_count)
+        """
+        self._metadata_slots = asyncio.Semaphore(self.metadata_concurrency)
+        self._probe_slots = asyncio.Semaphore(self.probe_concurrency)
+        self._download_slots = asyncio.Semaphore(self.download_concurrency)
+        workers = self.metadata_concurrency + self.probe_concurrency + self.download_concurrency
+        
+        with ThreadPoolExecutor(max_workers=workers) as self._executor:
+            with self.metrics.stage("list"):
+                video_urls = await self._run(self.get_video_list, stop_after)
+            
+            if not video_urls:
+                print("No videos found to download.")
+                return 0, 0
+            
+            with self.metrics.stage("download"):
+                results = await asyncio.gather(*(self.process_video(video_url) for video_url in video_urls))
+        
+        success_count = sum(1 for result in results if result)
+        total_count = len(video_urls)
+        
+        print(f"\nDownload complete! Successfully downloaded {success_count}/{total_count} videos.")
+        print(f"Videos saved to: {os.path.abspath(self.video_dir)}")
+        print(f"Metadata saved to: {os.path.abspath(self.metadata_dir)}")
+        print(f"Final request rate: {self.rate_limiter.rate:.2f}/s")
+        stats = self.metadata_cache.stats()
+        print(f"Metadata cache: {stats['hits']} hits, {stats['partial_hits']} partial hits, {stats['misses']} misses")
+        self.write_metrics()
+        
+        return success_count, total_count
+    
+    def download_all_videos(self, stop_after=None):
+        """
+        Download all videos from the channel concurrently.
+        
+        Args:
+            stop_after (int): If set, only list new uploads (see get_video_list)
+        
+        Returns:
+            tuple: (success_count, total_count)
+        """
+        return asyncio.run(self.download_all_videos_async(stop_after))
+
+
+def main():
+    """Main function to run the script."""
+    parser = argparse.ArgumentParser(description='Download videos from a YouTube channel concurrently')
+    parser.add_argument('channel_url', help='YouTube channel URL')
+    parser.add_argument('--output', '-o', default='downloads', help='Output directory for downloads')
+    parser.add_argument('--include-shorts', action='store_true', help='Include YouTube Shorts in download')
+    parser.add_argument('--delay', '-d', type=float, default=1.5, help='Initial delay between requests (in seconds); adapts to throttling')
+    parser.add_argument('--incremental', type=int, nargs='?', const=5, metavar='N',
+                        help='Stop listing after N consecutive videos already in the download ledger (default N: 5)')
+    parser.add_argument('--metadata-concurrency', type=int, default=8, help='Videos whose metadata is fetched at once')
+    parser.add_argument('--probe-concurrency', type=int, default=8, help='Videos checked for being a Short at once')
+    parser.add_argument('--download-concurrency', type=int, default=4, help='Videos downloaded at once')
+    parser.add_argument('--connections', type=int, default=4, help='Parallel Range requests per video (0 for a single stream)')
+    parser.add_argument('--blob-store', metavar='DIR', help='Content-addressed store shared with other output directories')
+    
+    args = parser.parse_args()
+    
+    try:
+        downloader = AsyncYouTubeChannelDownloader(
+            channel_url=args.channel_url,
+            output_dir=args.output,
+            skip_shorts=not args.include_shorts,
+            delay=args.delay,
+            metadata_concurrency=args.metadata_concurrency,
+            probe_concurrency=args.probe_concurrency,
+            download_concurrency=args.download_concurrency,
+            range_downloader=RangeDownloader(max_connections=args.connections) if args.connections else False,
+            blob_store=BlobStore(args.blob_store) if args.blob_store else None
+        )
+        
+        downloader.download_all_videos(stop_after=args.incremental)
+        
+    except KeyboardInterrupt:
+        print("\nProcess interrupted by user.")
+        return 1
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return 1
+        
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
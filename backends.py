@@ -0,0 +1,222 @@
+
+"""
+Pluggable yt-dlp backends used to list channels and download videos
+
+SubprocessBackend drives the yt-dlp command line tool; LibraryBackend drives
+yt_dlp.YoutubeDL in-process and reuses extractor state and HTTP connections
+across videos. Tests can substitute any object with the same methods.
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+import threading
+
+try:
+    import yt_dlp
+except ImportError:
+    yt_dlp = None
+
+YT_DLP = "yt-dlp"
+DEFAULT_BACKEND = "auto"
+
+class BackendError(Exception):
+    """
+    Raised when a backend cannot list a channel
+    """
+
+class DownloadBackend:
+    """
+    Interface shared by all backends
+
+    list_channel() yields flat-playlist entries as they are fetched.
+    download() fetches one video with its description, info JSON and
+    thumbnail into video_dir and returns a dict with "status" ("downloaded"
+    or "failed"), "returncode" and "error". Backends take an optional
+    limit_rate, the maximum bytes per second of each download.
+    """
+    
+    name = None
+    
+    def list_channel(self, channel_url, lazy=False):
+        raise NotImplementedError
+    
+    def download(self, video_url, video_dir):
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+class SubprocessBackend(DownloadBackend):
+    """
+    Runs the yt-dlp executable found on PATH
+    """
+    
+    name = "cli"
+    
+    def __init__(self, executable=YT_DLP, limit_rate=None):
+        self.executable = executable
+        self.limit_rate = limit_rate
+    
+    def list_channel(self, channel_url, lazy=False):
+        """
+        Yield entries read line by line from a yt-dlp pipe
+
+        If the consumer stops early the yt-dlp process is killed.
+        """
+        cmd = [
+            self.executable,
+            "--dump-json",
+            "--flat-playlist",
+            channel_url
+        ]
+        if lazy:
+            cmd.insert(-1, "--lazy-playlist")
+        
+        # stderr goes to a temporary file so a chatty yt-dlp cannot block on a full pipe
+        stderr = tempfile.TemporaryFile(mode="w+")
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        except OSError as e:
+            stderr.close()
+            raise BackendError(f"Cannot run {self.executable}: {e}")
+        except BaseException:
+            stderr.close()
+            raise
+        try:
+            for line in process.stdout:
+                if line.strip():
+                    yield json.loads(line)
+            
+            process.wait()
+            if process.returncode != 0:
+                stderr.seek(0)
+                raise BackendError(f"{self.executable} exited with {process.returncode}: {stderr.read().strip()}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            stderr.close()
+    
+    def download(self, video_url, video_dir):
+        cmd = [
+            self.executable,
+            "-f", "best",  # Best quality
+            "-o", os.path.join(video_dir, "%(title)s.%(ext)s"),
+            "--write-description",
+            "--write-info-json",
+            "--write-thumbnail",
+            video_url
+        ]
+        if self.limit_rate:
+            cmd[-1:-1] = ["--limit-rate", str(int(self.limit_rate))]
+        
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        except OSError as e:
+            return {"status": "failed", "returncode": None, "error": str(e)}
+        
+        if result.returncode == 0:
+            return {"status": "downloaded", "returncode": 0, "error": None}
+        stderr = result.stderr.strip()
+        return {
+            "status": "failed",
+            "returncode": result.returncode,
+            "error": stderr.splitlines()[-1] if stderr else f"{self.executable} exited with {result.returncode}"
+        }
+
+class LibraryBackend(DownloadBackend):
+    """
+    Drives yt_dlp.YoutubeDL in-process
+
+    Each thread gets its own long-lived YoutubeDL instance, since instances
+    are not thread-safe, so extractor state and connections are reused for
+    every video that thread downloads.
+    """
+    
+    name = "library"
+    
+    DOWNLOAD_OPTIONS = {
+        "format": "best",
+        "writedescription": True,
+        "writeinfojson": True,
+        "writethumbnail": True,
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+    }
+    
+    def __init__(self, limit_rate=None):
+        if yt_dlp is None:
+            raise BackendError("The yt_dlp package is not installed")
+        self.limit_rate = limit_rate
+        self._local = threading.local()
+        self._instances = []
+        self._lock = threading.Lock()
+    
+    def _downloader(self):
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            options = dict(self.DOWNLOAD_OPTIONS)
+            if self.limit_rate:
+                options["ratelimit"] = int(self.limit_rate)
+            ydl = yt_dlp.YoutubeDL(options)
+            self._local.ydl = ydl
+            with self._lock:
+                self._instances.append(ydl)
+        return ydl
+    
+    def list_channel(self, channel_url, lazy=False):
+        options = {"extract_flat": "in_playlist", "lazy_playlist": lazy, "quiet": True, "no_warnings": True}
+        try:
+            with yt_dlp.YoutubeDL(options) as ydl:
+                playlist = ydl.extract_info(channel_url, download=False, process=False)
+                for entry in playlist.get("entries") or []:
+                    entry = dict(entry)
+                    entry.setdefault("webpage_url", entry.get("url"))
+                    yield entry
+        except yt_dlp.utils.DownloadError as e:
+            raise BackendError(str(e))
+    
+    def download(self, video_url, video_dir):
+        ydl = self._downloader()
+        ydl.params["outtmpl"] = {"default": os.path.join(video_dir, "%(title)s.%(ext)s")}
+        try:
+            ydl.extract_info(video_url, download=True)
+            return {"status": "downloaded", "returncode": 0, "error": None}
+        except yt_dlp.utils.DownloadError as e:
+            return {"status": "failed", "returncode": 1, "error": str(e)}
+    
+    def close(self):
+        with self._lock:
+            for ydl in self._instances:
+                ydl.close()
+            self._instances = []
+
+BACKENDS = {
+    "cli": SubprocessBackend,
+    "library": LibraryBackend,
+}
+
+def get_backend(name=DEFAULT_BACKEND, limit_rate=None):
+    """
+    Create a backend by name: "cli", "library" or "auto"
+
+    "auto" uses the library backend when yt_dlp is importable and the
+    command line tool otherwise. limit_rate caps each download at that
+    many bytes per second.
+    """
+    if name == "auto":
+        name = "library" if yt_dlp is not None else "cli"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name}")
+    return BACKENDS[name](limit_rate=limit_rate)
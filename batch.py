@@ -0,0 +1,449 @@
+
+"""
+Download several YouTube channels in one run
+
+Every channel is listed concurrently and its videos are fed into one
+shared pool of download workers. A round-robin scheduler hands out work
+fairly between channels, so a channel with thousands of uploads cannot
+starve the others, and an optional bandwidth cap applies to the whole run.
+The results of every channel go into a combined report.
+
+    python batch.py https://www.youtube.com/@one https://www.youtube.com/@two
+    python batch.py --file channels.txt --workers 8 --bandwidth 20M
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+from backends import BACKENDS, DEFAULT_BACKEND, BackendError, get_backend
+from blobstore import BlobStore
+from download_videos import (HostLimiter, download_video, failed_outcome, positive_int, record_outcomes,
+                             recover_downloads, DEFAULT_PER_HOST)
+from journal import DownloadJournal, JOURNAL_FILE
+from ledger import DownloadLedger, LEDGER_FILE, SHORT
+from metadata_store import compact_entry
+from metrics import Metrics, METRICS_FILE, PROMETHEUS_FILE
+from ratelimit import AdaptiveRateLimiter, DEFAULT_MAX_RATE
+from scheduling import SizeScheduler, POLICIES, DEFAULT_POLICY
+from shorts import ShortClassifier
+from verify_downloads import (load_manifest, save_manifest, update_manifest, record_results, verify_video,
+                              DEFAULT_WORKERS as DEFAULT_VERIFY_WORKERS)
+
+BATCH_REPORT_FILE = "reports/batch_report.md"
+BATCH_RESULTS_FILE = "reports/batch_results.json"
+DEFAULT_WORKERS = 4
+DEFAULT_LISTERS = 4
+
+# Suffixes accepted by --bandwidth, as in yt-dlp's --limit-rate
+UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+class FairScheduler:
+    """
+    Hands out queued videos round-robin across channels
+
+    Each channel has its own queue and next() takes from the channels in
+    turn, so every channel keeps getting workers while others still have
+    a long backlog. Within a channel items are handed out in the given
+    order (see scheduling.SizeScheduler). With per_channel set at most that many videos of one
+    channel are handed out at once. Channels can be added while workers
+    are already waiting. next() blocks until a video is available and
+    returns None once the scheduler is closed and every queue is empty.
+    Safe to share between threads.
+    """
+    
+    def __init__(self, per_channel=None, order=DEFAULT_POLICY):
+        if per_channel is not None and per_channel < 1:
+            raise ValueError(f"per_channel must be at least 1: {per_channel}")
+        self.per_channel = per_channel
+        self.order = order
+        self._queues = {}
+        self._active = {}
+        self._order = deque()
+        self._closed = False
+        self._cond = threading.Condition()
+    
+    def add(self, channel, items):
+        """
+        Queue items for channel; each item is a video entry with an "id"
+        """
+        with self._cond:
+            if channel not in self._queues:
+                self._queues[channel] = SizeScheduler(self.order)
+                self._active[channel] = 0
+                self._order.append(channel)
+            for item in items:
+                self._queues[channel].push(item.get("id"), item)
+            self._cond.notify_all()
+    
+    def close(self):
+        """
+        Signal that no more items will be added
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+    
+    def _pick(self):
+        for _ in range(len(self._order)):
+            channel = self._order[0]
+            self._order.rotate(-1)
+            if self._queues[channel] and (self.per_channel is None or self._active[channel] < self.per_channel):
+                self._active[channel] += 1
+                return channel, self._queues[channel].get(block=False)
+        return None
+    
+    def next(self):
+        """
+        Return the next (channel, item) pair, or None when all work is handed out
+        """
+        with self._cond:
+            while True:
+                picked = self._pick()
+                if picked is not None:
+                    return picked
+                if self._closed and not any(len(queue) for queue in self._queues.values()):
+                    return None
+                self._cond.wait()
+    
+    def done(self, channel):
+        """
+        Mark one item handed out for channel as finished
+        """
+        with self._cond:
+            self._active[channel] -= 1
+            self._cond.notify_all()
+    
+    def pending(self):
+        """
+        Return the number of queued items that have not been handed out
+        """
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+def parse_rate(text):
+    """
+    Parse a byte rate such as "500K" or "2.5M" into bytes per second
+    """
+    text = text.strip().upper().removesuffix("B")
+    unit = text[-1:] if text[-1:] in UNITS else ""
+    try:
+        value = float(text[:len(text) - len(unit)])
+    except ValueError:
+        raise ValueError(f"Invalid rate: {text}")
+    if value <= 0:
+        raise ValueError(f"Rate must be positive: {text}")
+    return value * UNITS[unit]
+
+def download_rate(bandwidth, workers):
+    """
+    Return the per-download rate that keeps workers downloads under bandwidth
+
+    yt-dlp can only throttle each download on its own, so the total is
+    split evenly between the worker slots; the cap holds even when every
+    worker is busy.
+    """
+    if not bandwidth:
+        return None
+    return bandwidth / max(1, workers)
+
+def channel_name(channel_url):
+    """
+    Return a short display name for a channel URL, e.g. "@handle"
+    """
+    path = urlparse(channel_url).path.strip("/")
+    return path.split("/")[0] if path else channel_url
+
+def read_channel_file(path):
+    """
+    Return the channel URLs in a file, one per line; blank lines and # comments are ignored
+    """
+    with open(path, "r") as f:
+        return [line.split("#", 1)[0].strip() for line in f if line.split("#", 1)[0].strip()]
+
+def list_channel(channel, backend, classifier, ledger, scheduler, seen, seen_lock):
+    """
+    List one channel and queue its videos as they arrive
+
+    Shorts are recorded in the ledger and videos already queued by another
+    channel are counted as duplicates instead of being downloaded twice.
+    Fills in the "videos", "shorts", "duplicates" and "error" fields of
+    the channel record.
+    """
+    url = channel["channel"]
+    print(f"Listing {url}...")
+    try:
+        for entry in backend.list_channel(url):
+            if classifier.classify(entry):
+                channel["shorts"] += 1
+                if ledger is not None and entry.get("id") not in ledger:
+                    ledger.record(entry.get("id"), SHORT)
+                continue
+            
+            video = compact_entry(entry)
+            with seen_lock:
+                duplicate = video.get("id") in seen
+                seen.add(video.get("id"))
+            if duplicate:
+                channel["duplicates"] += 1
+                continue
+            
+            channel["videos"].append(video)
+            scheduler.add(url, [video])
+    except Exception as e:
+        # Any failure is recorded against this channel only; the other listings carry on
+        channel["error"] = str(e) or type(e).__name__
+        print(f"Error listing {url}: {e}")
+        return
+    print(f"Listed {url}: {len(channel['videos'])} videos, {channel['shorts']} shorts")
+
+def channel_summary(channel):
+    """
+    Return the per-channel totals that go into the batch report
+    """
+    outcomes = channel["outcomes"]
+    results = channel["results"]
+    durations = {video.get("id"): video.get("duration") or 0 for video in channel["videos"]}
+    return {
+        "channel": channel["channel"],
+        "name": channel_name(channel["channel"]),
+        "videos": len(channel["videos"]),
+        "shorts": channel["shorts"],
+        "duplicates": channel["duplicates"],
+        "downloaded": sum(1 for outcome in outcomes if outcome["status"] == "downloaded"),
+        "existing": sum(1 for outcome in outcomes if outcome["status"] == "existing"),
+        "linked": sum(1 for outcome in outcomes if outcome["status"] == "linked"),
+        "failed": sum(1 for outcome in outcomes if outcome["status"] == "failed"),
+        "verified": sum(1 for result in results if result["verified"]),
+        "bytes": sum(outcome["bytes"] for outcome in outcomes),
+        "duration": sum(durations.get(result["id"], 0) for result in results if result["verified"]),
+        "error": channel["error"],
+    }
+
+def run_batch(channel_urls, workers=DEFAULT_WORKERS, per_channel=None, per_host=DEFAULT_PER_HOST, listers=DEFAULT_LISTERS,
+              ledger_path=LEDGER_FILE, backend=None, rate_limiter=None, checksums=True, metrics=None, order=DEFAULT_POLICY,
+              blob_store=None, journal_path=JOURNAL_FILE):
+    """
+    List, download and verify several channels with shared workers
+
+    Up to listers channels are listed at once. Their videos are queued
+    in a FairScheduler as soon as they are listed and downloaded in the
+    given order by a single pool of workers threads, with at most per_channel downloads
+    of one channel and per_host downloads against one host at a time.
+    All channels share the download ledger at ledger_path, rate_limiter
+    and backend; give the backend a limit_rate (see download_rate()) to
+    cap the total bandwidth. Videos listed by more than one channel are
+    downloaded once, and videos already in blob_store (a
+    blobstore.BlobStore) are linked instead. Downloads are journaled to
+    journal_path (see download_videos.recover_downloads()). Every
+    downloaded video is then verified and the per-channel results are
+    written to BATCH_REPORT_FILE and BATCH_RESULTS_FILE. Returns the list
+    of per-channel summaries (see channel_summary()), or None on failure.
+    """
+    channel_urls = list(dict.fromkeys(channel_urls))
+    print(f"Starting batch of {len(channel_urls)} channels using {workers} download worker(s)")
+    
+    videos_dir = os.path.abspath("downloads/videos")
+    os.makedirs(videos_dir, exist_ok=True)
+    
+    try:
+        # Invalid limits are rejected before the backend, ledger and journal are opened
+        scheduler = FairScheduler(per_channel, order)
+        host_limiter = HostLimiter(per_host)
+        if metrics is None:
+            metrics = Metrics()
+        if rate_limiter is None:
+            rate_limiter = AdaptiveRateLimiter(rate=DEFAULT_MAX_RATE)
+        owns_backend = backend is None
+        if owns_backend:
+            backend = get_backend()
+        ledger = DownloadLedger(ledger_path) if ledger_path else None
+        journal = DownloadJournal(journal_path) if journal_path else None
+        if journal is not None:
+            recover_downloads(journal, videos_dir, ledger)
+        
+        channels = {
+            url: {"channel": url, "videos": [], "shorts": 0, "duplicates": 0, "error": None, "outcomes": [], "results": []}
+            for url in channel_urls
+        }
+        classifier = ShortClassifier()
+        seen = set()
+        lock = threading.Lock()
+        
+        def download_worker():
+            while True:
+                picked = scheduler.next()
+                if picked is None:
+                    return
+                url, video = picked
+                try:
+                    outcome = download_video(video, videos_dir, backend, host_limiter, ledger, rate_limiter,
+                                             blob_store, journal)
+                except Exception as e:
+                    outcome = failed_outcome(video, e)
+                finally:
+                    scheduler.done(url)
+                with lock:
+                    channels[url]["outcomes"].append(outcome)
+        
+        try:
+            with metrics.stage("list_and_download"):
+                with ThreadPoolExecutor(max_workers=max(1, workers)) as download_pool:
+                    downloads = [download_pool.submit(download_worker) for _ in range(max(1, workers))]
+                    try:
+                        with ThreadPoolExecutor(max_workers=max(1, listers)) as list_pool:
+                            list(list_pool.map(
+                                lambda url: list_channel(channels[url], backend, classifier, ledger, scheduler, seen, lock),
+                                channel_urls))
+                    finally:
+                        scheduler.close()
+                    for future in downloads:
+                        future.result()
+            
+            # Verify every channel against a single scan of the videos directory
+            with metrics.stage("verify"):
+                with os.scandir(videos_dir) as it:
+                    video_dirs = {entry.name for entry in it if entry.is_dir()}
+                manifest = load_manifest() if checksums else None
+                
+                def verify(item):
+                    url, video = item
+                    with metrics.phase("verify"):
+                        return url, verify_video(video, videos_dir, video_dirs, manifest, ledger if checksums else None)
+                
+                items = [(url, video) for url in channel_urls for video in channels[url]["videos"]]
+                with ThreadPoolExecutor(max_workers=DEFAULT_VERIFY_WORKERS) as pool:
+                    for url, result in pool.map(verify, items):
+                        channels[url]["results"].append(result)
+                
+                results = [result for url in channel_urls for result in channels[url]["results"]]
+                if manifest is not None:
+                    update_manifest(manifest, results, metrics)
+                    save_manifest(manifest)
+                record_results(metrics, results)
+        finally:
+            if ledger is not None:
+                ledger.close()
+            if journal is not None:
+                journal.checkpoint()
+                journal.close()
+            if owns_backend:
+                backend.close()
+        
+        record_outcomes(metrics, [outcome for channel in channels.values() for outcome in channel["outcomes"]],
+                        rate_limiter.stats())
+        
+        summaries = [channel_summary(channels[url]) for url in channel_urls]
+        with metrics.stage("summary"):
+            write_batch_report(summaries)
+        for summary in summaries:
+            status = f"error: {summary['error']}" if summary["error"] else \
+                f"{summary['verified']}/{summary['videos']} verified, {summary['failed']} failed"
+            print(f"{summary['name']}: {status}")
+        print(f"Batch report written to {BATCH_REPORT_FILE}")
+        return summaries
+    except Exception as e:
+        print(f"Error during batch download: {e}")
+        return None
+
+def format_size(size_bytes):
+    return f"{size_bytes / (1024 * 1024):.2f} MB"
+
+def format_duration(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours}h {minutes}m {seconds}s"
+
+def write_batch_report(summaries, report_path=BATCH_REPORT_FILE, results_path=BATCH_RESULTS_FILE):
+    """
+    Write the combined per-channel report as Markdown and the summaries as JSON
+    """
+    columns = ("videos", "shorts", "duplicates", "downloaded", "existing", "linked", "failed", "verified", "bytes",
+               "duration")
+    totals = {column: sum(summary[column] for summary in summaries) for column in columns}
+    
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w") as f:
+        f.write("# Batch Download Report\n\n")
+        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"Channels: {len(summaries)}, with listing errors: {sum(1 for s in summaries if s['error'])}\n\n")
+        
+        f.write("| Channel | Videos | Shorts | Duplicates | Downloaded | Existing | Linked | Failed | Verified | Size | Duration |\n")
+        f.write("|---------|--------|--------|------------|------------|----------|--------|--------|----------|------|----------|\n")
+        for row in summaries + [dict(totals, name="**Total**", channel=None)]:
+            name = f"[{row['name']}]({row['channel']})" if row["channel"] else row["name"]
+            f.write(f"| {name} | {row['videos']} | {row['shorts']} | {row['duplicates']} | {row['downloaded']} | "
+                    f"{row['existing']} | {row['linked']} | {row['failed']} | {row['verified']} | {format_size(row['bytes'])} | "
+                    f"{format_duration(row['duration'])} |\n")
+        
+        errors = [summary for summary in summaries if summary["error"]]
+        if errors:
+            f.write("\n## Listing Errors\n\n")
+            for summary in errors:
+                f.write(f"- {summary['channel']}: {summary['error']}\n")
+    
+    with open(results_path, "w") as f:
+        json.dump({"channels": summaries, "totals": totals}, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Download several YouTube channels with a shared pool of workers.')
+    parser.add_argument('channel_urls', nargs='*', help='YouTube channel URLs')
+    parser.add_argument('--file', '-f', help='File with one channel URL per line')
+    parser.add_argument('--workers', '-w', type=positive_int, default=DEFAULT_WORKERS,
+                        help=f'Number of concurrent video downloads across all channels (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--per-channel', type=positive_int, default=None,
+                        help='Maximum concurrent downloads of one channel (default: no limit)')
+    parser.add_argument('--per-host', type=positive_int, default=DEFAULT_PER_HOST,
+                        help=f'Maximum concurrent downloads per host (default: {DEFAULT_PER_HOST})')
+    parser.add_argument('--listers', type=int, default=DEFAULT_LISTERS,
+                        help=f'Channels listed at once (default: {DEFAULT_LISTERS})')
+    parser.add_argument('--bandwidth', type=parse_rate, default=None,
+                        help='Total download bandwidth in bytes per second, e.g. 500K or 20M (default: unlimited)')
+    parser.add_argument('--max-rate', type=float, default=DEFAULT_MAX_RATE,
+                        help=f'Maximum download requests per second (default: {DEFAULT_MAX_RATE})')
+    parser.add_argument('--order', choices=POLICIES, default=DEFAULT_POLICY,
+                        help=f'Download order within each channel by estimated size (default: {DEFAULT_POLICY})')
+    parser.add_argument('--no-ledger', action='store_true', help='Ignore the download ledger and fetch every video')
+    parser.add_argument('--backend', choices=['auto'] + sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help='Use yt-dlp as an in-process library or as a command line tool (default: auto)')
+    parser.add_argument('--blob-store', metavar='DIR', default=None,
+                        help='Content-addressed store shared with other download trees; videos already in it are linked')
+    args = parser.parse_args()
+    
+    channel_urls = list(args.channel_urls)
+    if args.file:
+        channel_urls += read_channel_file(args.file)
+    if not channel_urls:
+        parser.error("no channel URLs given")
+    
+    print(f"Starting batch download at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    try:
+        backend = get_backend(args.backend, limit_rate=download_rate(args.bandwidth, args.workers))
+    except BackendError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    metrics = Metrics()
+    blob_store = BlobStore(args.blob_store) if args.blob_store else None
+    try:
+        with backend:
+            summaries = run_batch(channel_urls, workers=args.workers, per_channel=args.per_channel, per_host=args.per_host,
+                                  listers=args.listers, ledger_path=None if args.no_ledger else LEDGER_FILE,
+                                  backend=backend, rate_limiter=AdaptiveRateLimiter(rate=args.max_rate, max_rate=args.max_rate),
+                                  metrics=metrics, order=args.order, blob_store=blob_store)
+    finally:
+        if blob_store is not None:
+            blob_store.close()
+        metrics.write()
+        print(f"Metrics written to {METRICS_FILE} and {PROMETHEUS_FILE}")
+    if summaries is None or any(summary["error"] for summary in summaries):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
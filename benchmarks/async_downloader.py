@@ -0,0 +1,66 @@
+"""
+Compare YouTubeChannelDownloader with AsyncYouTubeChannelDownloader
+
+Both downloaders are pointed at the local HTTP stand-in server, so the
+numbers reflect how well each one overlaps request latency.
+
+    python -m benchmarks.async_downloader --videos 50 --latency 0.1
+"""
+
+import argparse
+import tempfile
+import time
+
+from async_downloader import AsyncYouTubeChannelDownloader
+from benchmarks.http_standin import StandInConfig, StandInServer
+from ratelimit import AdaptiveRateLimiter
+from youtube_downloader import YouTubeChannelDownloader
+
+
+def run(downloader_class, server, **kwargs):
+    """Download the stand-in channel into a fresh directory and return elapsed seconds."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        downloader = downloader_class(
+            "https://www.youtube.com/@standin",
+            output_dir=output_dir,
+            video_factory=server.video_factory(),
+            rate_limiter=AdaptiveRateLimiter(rate=1000, max_rate=1000),
+            **kwargs
+        )
+        downloader.get_video_list = lambda stop_after=None: server.video_urls()
+        started = time.perf_counter()
+        success_count, total_count = downloader.download_all_videos()
+        elapsed = time.perf_counter() - started
+        downloader.ledger.close()
+    return elapsed, success_count, total_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--videos', type=int, default=50, help='Number of videos in the stand-in channel')
+    parser.add_argument('--size', type=int, default=256 * 1024, help='Bytes per video')
+    parser.add_argument('--latency', type=float, default=0.1, help='Server latency per request (seconds)')
+    parser.add_argument('--bandwidth', type=int, default=None, help='Bytes per second per connection')
+    parser.add_argument('--shorts-every', type=int, default=5, help='Every Nth video is a short')
+    parser.add_argument('--download-concurrency', type=int, default=8)
+    parser.add_argument('--metadata-concurrency', type=int, default=16)
+    args = parser.parse_args()
+    
+    config = StandInConfig(video_count=args.videos, video_size=args.size, info_latency=args.latency,
+                           video_latency=args.latency, bandwidth=args.bandwidth, shorts_every=args.shorts_every)
+    results = {}
+    with StandInServer(config) as server:
+        results["sequential"] = run(YouTubeChannelDownloader, server)
+        results["asyncio"] = run(AsyncYouTubeChannelDownloader, server,
+                                 metadata_concurrency=args.metadata_concurrency,
+                                 probe_concurrency=args.metadata_concurrency,
+                                 download_concurrency=args.download_concurrency)
+    
+    print()
+    print(f"{'engine':<12} {'seconds':>9} {'videos/s':>9} {'ok/total':>10}")
+    for name, (elapsed, success_count, total_count) in results.items():
+        print(f"{name:<12} {elapsed:9.2f} {total_count / elapsed:9.1f} {success_count:>4}/{total_count:<5}")
+
+
+if __name__ == "__main__":
+    main()
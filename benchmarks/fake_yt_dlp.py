@@ -0,0 +1,135 @@
+"""
+Stand-in for the yt-dlp executable used by the pipeline benchmarks
+
+Understands the two command lines SubprocessBackend runs:
+
+    yt-dlp --dump-json --flat-playlist [--lazy-playlist] CHANNEL_URL
+    yt-dlp -f best -o TEMPLATE --write-description --write-info-json --write-thumbnail [--limit-rate N] VIDEO_URL
+
+Listing prints a synthetic channel (see benchmarks.synthetic_channel).
+Channel URLs ending in a numbered handle such as @synthetic3 list the
+third block of FAKE_YT_DLP_VIDEOS IDs, so several channels can be listed
+without sharing any video.
+Downloading writes a structurally valid MP4 whose mvhd duration matches the
+listing, plus the .info.json, .description and .webp files the verification
+stage expects. Behaviour is configured through environment variables:
+
+    FAKE_YT_DLP_VIDEOS        entries in the channel (default 10)
+    FAKE_YT_DLP_SHORTS_EVERY  every Nth entry is a short (default 5, 0 for none)
+    FAKE_YT_DLP_LATENCY       seconds slept per download and per listing page (default 0)
+    FAKE_YT_DLP_PAGE_SIZE     entries per listing page (default 100)
+    FAKE_YT_DLP_SIZE          bytes per video file (default 1 MiB)
+    FAKE_YT_DLP_FAIL_EVERY    every Nth download fails with HTTP 429 (default 0, never)
+"""
+
+import json
+import os
+import re
+import struct
+import sys
+import time
+
+from benchmarks.synthetic_channel import DEFAULT_SHORTS_EVERY, synthetic_entry, video_index
+
+WRITE_CHUNK = 1024 * 1024
+TIMESCALE = 1000
+
+
+def setting(name, default, kind=int):
+    value = os.environ.get(f"FAKE_YT_DLP_{name}")
+    return kind(value) if value else default
+
+
+def box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def mp4_header(seconds):
+    """Return the ftyp and moov boxes of an MP4 lasting seconds."""
+    ftyp = box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2mp41")
+    mvhd = box(b"mvhd", struct.pack(
+        ">B3xIIII I H 10x 36s 24x I",
+        0, 0, 0, TIMESCALE, int(seconds * TIMESCALE),
+        0x00010000, 0x0100,
+        struct.pack(">9I", 0x00010000, 0, 0, 0, 0x00010000, 0, 0, 0, 0x40000000),
+        2,
+    ))
+    return ftyp + box(b"moov", mvhd)
+
+
+def write_mp4(path, seconds, size):
+    """Write an MP4 of about size bytes whose mdat is zero-filled."""
+    header = mp4_header(seconds)
+    remaining = max(size - len(header) - 8, 0)
+    zeros = bytes(min(remaining, WRITE_CHUNK))
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(struct.pack(">I4s", 8 + remaining, b"mdat"))
+        while remaining:
+            n = min(remaining, len(zeros))
+            f.write(zeros[:n])
+            remaining -= n
+
+
+def channel_offset(channel_url, count):
+    """Return the index of the first video of a numbered channel such as @synthetic3."""
+    match = re.search(r"@synthetic(\d+)/?$", channel_url)
+    return int(match.group(1)) * count if match else 0
+
+
+def list_channel(channel_url, count, shorts_every, latency, page_size):
+    out = sys.stdout
+    offset = channel_offset(channel_url, count)
+    for index in range(count):
+        if latency and index % page_size == 0:
+            out.flush()
+            time.sleep(latency)
+        out.write(json.dumps(synthetic_entry(offset + index, count, shorts_every)) + "\n")
+    out.flush()
+
+
+def download(video_url, template, count, shorts_every, latency, size, fail_every, limit_rate=None):
+    vid = video_url.rstrip("/").split("=")[-1].split("/")[-1]
+    index = video_index(vid)
+    if latency:
+        time.sleep(latency)
+    if fail_every and index % fail_every == fail_every - 1:
+        print(f"ERROR: [youtube] {vid}: HTTP Error 429: Too Many Requests", file=sys.stderr)
+        return 1
+    
+    entry = synthetic_entry(index, count, shorts_every)
+    base = template.replace("%(title)s", entry["title"])
+    os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+    started = time.monotonic()
+    write_mp4(base.replace("%(ext)s", "mp4"), entry["duration"] or 0, size)
+    if limit_rate:
+        # Take as long as a transfer at limit_rate bytes per second would
+        time.sleep(max(0.0, size / limit_rate - (time.monotonic() - started)))
+    with open(base.replace("%(ext)s", "info.json"), "w") as f:
+        json.dump(entry, f)
+    with open(base.replace("%(ext)s", "description"), "w") as f:
+        f.write(entry["description"] or "")
+    with open(base.replace("%(ext)s", "webp"), "wb") as f:
+        f.write(b"RIFF\x04\x00\x00\x00WEBP")
+    return 0
+
+
+def main(argv):
+    count = setting("VIDEOS", 10)
+    shorts_every = setting("SHORTS_EVERY", DEFAULT_SHORTS_EVERY)
+    latency = setting("LATENCY", 0.0, float)
+    
+    if "--flat-playlist" in argv:
+        list_channel(argv[-1], count, shorts_every, latency, setting("PAGE_SIZE", 100))
+        return 0
+    if "-o" in argv:
+        template = argv[argv.index("-o") + 1]
+        limit_rate = float(argv[argv.index("--limit-rate") + 1]) if "--limit-rate" in argv else None
+        return download(argv[-1], template, count, shorts_every, latency,
+                        setting("SIZE", 1024 * 1024), setting("FAIL_EVERY", 0), limit_rate)
+    print(f"fake yt-dlp: unsupported arguments {argv}", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
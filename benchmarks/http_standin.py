@@ -0,0 +1,215 @@
+"""
+Local HTTP stand-in for YouTube used by the benchmarks
+
+The server exposes per-video metadata at /info/<id> and video bytes at
+/video/<id>, with configurable latency, per-connection bandwidth, HTTP Range
+support and injected disconnects. StandInVideo mimics the parts of
+pytube.YouTube the downloaders use, fetching everything from the server.
+"""
+
+import json
+import re
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInConfig:
+    """Behaviour of the stand-in server, shared by all request handlers."""
+    
+    def __init__(self, video_count=20, video_size=256 * 1024, info_latency=0.05, video_latency=0.05,
+                 bandwidth=None, shorts_every=0, disconnect_after=None, chunk_size=16 * 1024):
+        self.video_count = video_count
+        self.video_size = video_size
+        self.info_latency = info_latency
+        self.video_latency = video_latency
+        self.bandwidth = bandwidth  # bytes per second per connection, None for unlimited
+        self.shorts_every = shorts_every  # every Nth video is a vertical short, 0 for none
+        self.disconnect_after = disconnect_after  # drop each connection after this many bytes
+        self.chunk_size = chunk_size
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+    
+    def video_ids(self):
+        return [f"vid{i:08d}" for i in range(self.video_count)]
+    
+    def info(self, video_id):
+        index = int(video_id[3:])
+        short = self.shorts_every and index % self.shorts_every == 0
+        return {
+            "video_id": video_id,
+            "title": f"Stand-in video {index}",
+            "description": "Synthetic video served by the benchmark stand-in",
+            "author": "Stand-in",
+            "length": 30 if short else 180 + index % 600,
+            "views": index * 7,
+            "keywords": ["benchmark"],
+            "channel_id": "UCstandin",
+            "resolution": "720x1280" if short else "1280x720",
+        }
+    
+    def count(self, sent=0):
+        with self._lock:
+            self.requests += sent == 0
+            self.bytes_sent += sent
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args):
+        pass
+    
+    @property
+    def config(self):
+        return self.server.config
+    
+    def do_GET(self):
+        self.config.count()
+        match = re.match(r"^/(info|video)/(vid\d{8})$", self.path)
+        if not match:
+            self.send_error(404)
+            return
+        kind, video_id = match.groups()
+        if kind == "info":
+            time.sleep(self.config.info_latency)
+            body = json.dumps(self.config.info(video_id)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_video()
+    
+    def send_video(self):
+        time.sleep(self.config.video_latency)
+        size = self.config.video_size
+        start, end = 0, size - 1
+        range_header = self.headers.get("Range")
+        if range_header:
+            match = re.match(r"bytes=(\d+)-(\d*)$", range_header)
+            if not match or int(match.group(1)) >= size:
+                self.send_error(416)
+                return
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        
+        sent = 0
+        position = start
+        chunk = self.config.chunk_size
+        while position <= end:
+            if self.config.disconnect_after is not None and sent >= self.config.disconnect_after:
+                self.close_connection = True
+                return
+            n = min(chunk, end - position + 1)
+            # Deterministic content so resumed downloads can be checked byte for byte
+            self.wfile.write(bytes((position + i) % 251 for i in range(n)))
+            position += n
+            sent += n
+            self.config.count(n)
+            if self.config.bandwidth:
+                time.sleep(n / self.config.bandwidth)
+
+
+def expected_content(size):
+    """Return the bytes the stand-in serves for a video of the given size."""
+    return bytes(i % 251 for i in range(size))
+
+
+class StandInServer:
+    """Runs the stand-in HTTP server on a background thread."""
+    
+    def __init__(self, config=None):
+        self.config = config or StandInConfig()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = self.config
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        return False
+    
+    def video_urls(self):
+        return [f"https://www.youtube.com/watch?v={video_id}" for video_id in self.config.video_ids()]
+    
+    def video_factory(self):
+        """Return a callable that builds StandInVideo objects bound to this server."""
+        return lambda url: StandInVideo(url, self.base_url)
+
+
+class StandInStream:
+    def __init__(self, video):
+        self.video = video
+        self.resolution = video.info["resolution"]
+        self.url = f"{video.base_url}/video/{video.video_id}"
+    
+    def download(self, output_path, filename):
+        with urllib.request.urlopen(self.url) as response, open(f"{output_path}/{filename}", "wb") as f:
+            while True:
+                chunk = response.read(64 * 1024)
+                if not chunk:
+                    break
+                f.write(chunk)
+
+
+class StandInStreamQuery(list):
+    def filter(self, only_audio=False, **kwargs):
+        return StandInStreamQuery([] if only_audio else self)
+    
+    def order_by(self, attribute):
+        return self
+    
+    def desc(self):
+        return self
+    
+    def first(self):
+        return self[0] if self else None
+
+
+class StandInVideo:
+    """Mimics the pytube.YouTube attributes used by the downloaders."""
+    
+    def __init__(self, url, base_url):
+        self.video_id = url.rsplit("=", 1)[-1]
+        self.watch_url = url
+        self.base_url = base_url
+        self._info = None
+    
+    @property
+    def info(self):
+        if self._info is None:
+            with urllib.request.urlopen(f"{self.base_url}/info/{self.video_id}") as response:
+                self._info = json.load(response)
+        return self._info
+    
+    title = property(lambda self: self.info["title"])
+    description = property(lambda self: self.info["description"])
+    author = property(lambda self: self.info["author"])
+    length = property(lambda self: self.info["length"])
+    views = property(lambda self: self.info["views"])
+    keywords = property(lambda self: self.info["keywords"])
+    channel_id = property(lambda self: self.info["channel_id"])
+    channel_url = property(lambda self: f"https://www.youtube.com/channel/{self.info['channel_id']}")
+    publish_date = None
+    
+    @property
+    def streams(self):
+        return StandInStreamQuery([StandInStream(self)])
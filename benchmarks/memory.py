@@ -0,0 +1,149 @@
+"""
+Measure the peak memory of the download, verify and summary stages
+
+Extracts a synthetic channel of --entries entries (100k by default) into
+a scratch directory, then runs each stage in a fresh process in two
+modes. "lists" loads the extracted metadata and the verification results
+into lists first, as the stages did before they streamed their input.
+"streaming" lets each stage read its input through iterators
+(collect=False). The benchmark reports peak RSS and wall time for each
+stage and mode.
+
+    python -m benchmarks.memory --entries 100000
+
+Every video is already in the download ledger and has an empty set of
+files on disk, so no yt-dlp work or checksumming is done. The numbers
+reflect how each stage holds metadata and results.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_channel import DEFAULT_SHORTS_EVERY, write_channel
+from channel_info import RAW_INFO_FILE
+from create_summary import create_summary_report, SHORT_REPORT_FIELDS, VIDEO_REPORT_FIELDS
+from download_videos import download_videos
+from extract_metadata import extract_metadata, iter_metadata, load_metadata
+from ledger import DownloadLedger, LEDGER_FILE, DOWNLOADED
+from metadata_store import SHORT, VIDEO
+from verify_downloads import organize_and_verify, VERIFICATION_RESULTS_FILE
+
+DEFAULT_ENTRIES = 100000
+STAGES = ("download", "verify", "summary")
+MODES = ("lists", "streaming")
+VIDEO_FILES = ("metadata.json", "video.mp4", "video.info.json", "video.description", "video.webp")
+
+
+def prepare(entries, shorts_every):
+    """Extract a synthetic channel in the current directory and fake its downloads."""
+    os.makedirs(os.path.dirname(RAW_INFO_FILE), exist_ok=True)
+    with open(RAW_INFO_FILE, "w") as f:
+        write_channel(f, entries, shorts_every)
+    extract_metadata(collect=False)
+    
+    DownloadLedger(LEDGER_FILE).close()
+    now = time.time()
+    rows = []
+    for video in iter_metadata(VIDEO, fields=("id",)):
+        video_dir = os.path.join("downloads", "videos", video["id"])
+        os.makedirs(video_dir)
+        for name in VIDEO_FILES:
+            open(os.path.join(video_dir, name), "w").close()
+        rows.append((video["id"], DOWNLOADED, 0, None, now, now))
+    # One transaction instead of a commit per DownloadLedger.record()
+    with sqlite3.connect(LEDGER_FILE) as conn:
+        conn.executemany("INSERT INTO videos VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+def run_stage(stage, mode):
+    """Run one stage in the current process, reading its input as mode says."""
+    lists = mode == "lists"
+    if stage == "download":
+        videos = load_metadata(VIDEO) if lists else None
+        return download_videos(videos, workers=8, collect=lists) is not None
+    if stage == "verify":
+        videos = load_metadata(VIDEO, fields=("id", "title", "duration")) if lists else None
+        return organize_and_verify(videos, checksums=False, structure=False, collect=lists) is not None
+    if lists:
+        with open(VERIFICATION_RESULTS_FILE) as f:
+            results = json.load(f)
+        return create_summary_report(load_metadata(VIDEO, fields=VIDEO_REPORT_FIELDS),
+                                     load_metadata(SHORT, fields=SHORT_REPORT_FIELDS), results)
+    return create_summary_report()
+
+
+def measure(stage, mode, workdir, env):
+    """Run stage in a child process; return its peak RSS and wall time."""
+    cmd = [sys.executable, "-m", "benchmarks.memory", "--run", stage, mode]
+    with open(os.path.join(workdir, f"{stage}-{mode}.log"), "w") as log:
+        started = time.perf_counter()
+        process = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+    return {
+        "stage": stage,
+        "mode": mode,
+        "returncode": os.waitstatus_to_exitcode(status),
+        "seconds": elapsed,
+        "peak_rss_mb": usage.ru_maxrss / 1024,
+    }
+
+
+def run(args):
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = repo_dir + os.pathsep + env.get("PYTHONPATH", "")
+    workdir = tempfile.mkdtemp(prefix=f"memory-{args.entries}-")
+    results = []
+    try:
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "benchmarks.memory", "--prepare", str(args.entries),
+                        str(args.shorts_every)], cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL)
+        print(f"Prepared {args.entries} entries in {time.perf_counter() - started:.1f}s")
+        print(f"{'stage':<9} {'mode':<10} {'peak MB':>8} {'seconds':>8} {'rc':>3}")
+        for stage in STAGES:
+            for mode in MODES:
+                result = measure(stage, mode, workdir, env)
+                result["entries"] = args.entries
+                results.append(result)
+                print(f"{stage:<9} {mode:<10} {result['peak_rss_mb']:8.1f} {result['seconds']:8.2f} "
+                      f"{result['returncode']:>3}")
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=DEFAULT_ENTRIES, help='Channel size, including shorts')
+    parser.add_argument('--shorts-every', type=int, default=DEFAULT_SHORTS_EVERY, help='Every Nth entry is a short')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch directory')
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--prepare', nargs=2, type=int, metavar=('ENTRIES', 'SHORTS_EVERY'), help=argparse.SUPPRESS)
+    parser.add_argument('--run', nargs=2, metavar=('STAGE', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.prepare:
+        prepare(*args.prepare)
+        return
+    if args.run:
+        sys.exit(0 if run_stage(*args.run) else 1)
+    
+    results = run(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
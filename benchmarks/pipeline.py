@@ -0,0 +1,178 @@
+"""
+Time every pipeline stage against a synthetic channel
+
+Each stage script runs in its own process, in a scratch directory, with
+benchmarks/fake_yt_dlp.py standing in for the yt-dlp executable, so no
+network access is needed. For each channel size the benchmark reports
+wall time, throughput, peak RSS, CPU time and syscall counts per stage.
+
+    python -m benchmarks.pipeline --sizes 10,1000 --size 65536 --latency 0.05
+
+Syscall counts come from strace -f -c when strace is installed and
+--strace is given; otherwise the read/write syscall counters of the stage
+process from /proc/self/io are shown. Peak RSS and CPU time include the
+fake yt-dlp processes a stage waits for. Use --json to keep the results
+for comparison between runs.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_channel import DEFAULT_SHORTS_EVERY, is_short
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHANNEL_URL = "https://www.youtube.com/@synthetic"
+DEFAULT_SIZES = (10, 1000, 100000)
+STAGES = ("channel_info", "extract_metadata", "download_videos", "verify_downloads", "create_summary")
+
+
+def stage_command(stage, args):
+    """Return the script and arguments that run stage."""
+    if stage == "channel_info":
+        return ["channel_info.py", CHANNEL_URL, "--backend", "cli"]
+    if stage == "download_videos":
+        return ["download_videos.py", "--backend", "cli", "--workers", str(args.workers),
+                "--max-rate", str(args.max_rate)]
+    return [f"{stage}.py"]
+
+
+def install_fake_yt_dlp(bin_dir):
+    """Put a yt-dlp wrapper around benchmarks.fake_yt_dlp into bin_dir."""
+    os.makedirs(bin_dir, exist_ok=True)
+    path = os.path.join(bin_dir, "yt-dlp")
+    with open(path, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" -m benchmarks.fake_yt_dlp "$@"\n')
+    os.chmod(path, 0o755)
+
+
+def strace_calls(path):
+    """Return the total syscall count from an strace -c summary."""
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if parts and parts[-1] == "total":
+                return int(parts[3])
+    return None
+
+
+def run_stage(stage, workdir, env, args, use_strace):
+    script, *script_args = stage_command(stage, args)
+    counters_path = os.path.join(workdir, f"{stage}.io.json")
+    strace_path = os.path.join(workdir, f"{stage}.strace")
+    cmd = [sys.executable, "-m", "benchmarks.stage_runner", counters_path, os.path.join(REPO_DIR, script), *script_args]
+    if use_strace:
+        cmd = ["strace", "-f", "-c", "-o", strace_path, *cmd]
+    
+    with open(os.path.join(workdir, f"{stage}.log"), "w") as log:
+        started = time.perf_counter()
+        process = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    
+    try:
+        with open(counters_path) as f:
+            counters = json.load(f)
+    except (OSError, ValueError):
+        counters = {}
+    return {
+        "stage": stage,
+        "returncode": process.returncode,
+        "seconds": elapsed,
+        "peak_rss_mb": usage.ru_maxrss / 1024,
+        "cpu_seconds": usage.ru_utime + usage.ru_stime,
+        "context_switches": usage.ru_nvcsw + usage.ru_nivcsw,
+        "read_syscalls": counters.get("syscr"),
+        "write_syscalls": counters.get("syscw"),
+        "syscalls": strace_calls(strace_path) if use_strace else None,
+    }
+
+
+def run_channel(count, args, use_strace):
+    """Run every selected stage on a synthetic channel of count entries."""
+    video_count = sum(1 for index in range(count) if not is_short(index, args.shorts_every))
+    workdir = tempfile.mkdtemp(prefix=f"pipeline-{count}-")
+    env = dict(os.environ)
+    env["PATH"] = os.path.join(workdir, "bin") + os.pathsep + env.get("PATH", "")
+    env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    env.update({
+        "FAKE_YT_DLP_VIDEOS": str(count),
+        "FAKE_YT_DLP_SHORTS_EVERY": str(args.shorts_every),
+        "FAKE_YT_DLP_LATENCY": str(args.latency),
+        "FAKE_YT_DLP_SIZE": str(args.size),
+    })
+    install_fake_yt_dlp(os.path.join(workdir, "bin"))
+    
+    results = []
+    try:
+        for stage in args.stages:
+            result = run_stage(stage, workdir, env, args, use_strace)
+            items = count if stage in ("channel_info", "extract_metadata") else video_count
+            result.update(entries=count, items=items, items_per_second=items / result["seconds"])
+            results.append(result)
+            print_row(result)
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def print_header():
+    print(f"{'entries':>8} {'stage':<17} {'seconds':>9} {'items/s':>10} {'peak MB':>8} {'cpu s':>8} "
+          f"{'syscalls':>10} {'reads':>9} {'writes':>9} {'rc':>3}")
+
+
+def print_row(result):
+    def count(value):
+        return "-" if value is None else str(value)
+    print(f"{result['entries']:>8} {result['stage']:<17} {result['seconds']:9.2f} {result['items_per_second']:10.1f} "
+          f"{result['peak_rss_mb']:8.1f} {result['cpu_seconds']:8.2f} {count(result['syscalls']):>10} "
+          f"{count(result['read_syscalls']):>9} {count(result['write_syscalls']):>9} {result['returncode']:>3}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=",".join(map(str, DEFAULT_SIZES)),
+                        help='Comma-separated channel sizes (entries, including shorts)')
+    parser.add_argument('--stages', default=",".join(STAGES), help='Comma-separated stages to run, in order')
+    parser.add_argument('--shorts-every', type=int, default=DEFAULT_SHORTS_EVERY, help='Every Nth entry is a short')
+    parser.add_argument('--size', type=int, default=64 * 1024, help='Bytes per downloaded video')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Fake yt-dlp latency per download and per listing page (seconds)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent downloads')
+    parser.add_argument('--max-rate', type=float, default=1000.0,
+                        help='Download rate cap passed to download_videos.py; the default lifts the usual '
+                             '10/s cap so the numbers show pipeline overhead rather than the limiter')
+    parser.add_argument('--strace', action='store_true', help='Count all syscalls with strace -f -c')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch directories')
+    parser.add_argument('--json', default=None, help='Also write the results to this file')
+    args = parser.parse_args()
+    args.stages = args.stages.split(",")
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    
+    use_strace = args.strace and shutil.which("strace") is not None
+    if args.strace and not use_strace:
+        print("strace not found; showing /proc/self/io read/write counts only")
+    
+    print_header()
+    results = []
+    for count in (int(size) for size in args.sizes.split(",")):
+        results.extend(run_channel(count, args, use_strace))
+    
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark RangeDownloader against a single-stream download
+
+The local stand-in server limits per-connection bandwidth and can drop
+connections after a number of bytes, so the benchmark shows both the gain
+from parallel segments and the cost of recovering from disconnects.
+
+    python -m benchmarks.range_download --size 20000000 --bandwidth 4000000 --disconnect-after 3000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.http_standin import StandInConfig, StandInServer, expected_content
+from range_download import RangeDownloader
+
+
+def single_stream(url, path):
+    with urllib.request.urlopen(url) as response, open(path, "wb") as f:
+        while True:
+            chunk = response.read(64 * 1024)
+            if not chunk:
+                break
+            f.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=20 * 1000 * 1000, help='Bytes in the test file')
+    parser.add_argument('--bandwidth', type=int, default=4 * 1000 * 1000, help='Bytes per second per connection')
+    parser.add_argument('--disconnect-after', type=int, default=None, help='Drop each connection after this many bytes')
+    parser.add_argument('--connections', type=int, default=8)
+    args = parser.parse_args()
+    
+    config = StandInConfig(video_count=1, video_size=args.size, info_latency=0, video_latency=0.02,
+                           bandwidth=args.bandwidth, disconnect_after=args.disconnect_after, chunk_size=256 * 1024)
+    expected = expected_content(args.size)
+    with StandInServer(config) as server, tempfile.TemporaryDirectory() as output_dir:
+        url = f"{server.base_url}/video/vid00000000"
+        path = os.path.join(output_dir, "video.mp4")
+        
+        if args.disconnect_after is None:
+            started = time.perf_counter()
+            single_stream(url, path)
+            print(f"single stream: {time.perf_counter() - started:6.2f}s")
+            os.remove(path)
+        
+        config.requests = 0
+        started = time.perf_counter()
+        RangeDownloader(max_connections=args.connections).download(url, path)
+        elapsed = time.perf_counter() - started
+        with open(path, "rb") as f:
+            intact = f.read() == expected
+        print(f"segmented:     {elapsed:6.2f}s  {config.requests} requests  content {'ok' if intact else 'CORRUPT'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Compare download orders on synthetic workloads
+
+Simulates a pool of download workers pulling from scheduling.SizeScheduler
+on a virtual clock, so hours of downloads take well under a second. Each
+workload is a list of videos with a listed duration, an actual size that
+differs from the duration-based estimate by a random factor, and an
+arrival time (all at once for a finished listing, spread out for a
+listing streamed into the downloader). For every order the benchmark
+reports videos completed in the first hour, mean and p95 completion time,
+the longest wait before a download started, and the total run time.
+
+    python -m benchmarks.scheduling --workers 4 --videos 500
+"""
+
+import argparse
+import heapq
+import json
+import random
+
+from scheduling import SizeScheduler, estimate_size, DEFAULT_BITRATE, POLICIES
+
+HOUR = 3600.0
+DEFAULT_VIDEOS = 500
+DEFAULT_WORKERS = 4
+# Per-worker download speed, bytes per second (about 20 Mbit/s)
+DEFAULT_SPEED = 2500000
+# Fixed cost of each download (extraction, connection setup), seconds
+DEFAULT_OVERHEAD = 2.0
+
+
+def clip_mix(rng, count):
+    """Mostly clips of a few minutes with an occasional multi-hour concert."""
+    return [rng.uniform(3 * HOUR, 4 * HOUR) if rng.random() < 0.05 else rng.uniform(60, 900) for _ in range(count)]
+
+
+def uniform(rng, count):
+    return [rng.uniform(300, 1800) for _ in range(count)]
+
+
+def long_tail(rng, count):
+    """Pareto-distributed durations, capped at 12 hours."""
+    return [min(60 * rng.paretovariate(1.2), 12 * HOUR) for _ in range(count)]
+
+
+WORKLOADS = {"clip_mix": clip_mix, "uniform": uniform, "long_tail": long_tail}
+
+
+def make_videos(workload, count, seed, arrival_span):
+    """Return the synthetic videos of a workload in listing order."""
+    rng = random.Random(seed)
+    videos = []
+    for index, duration in enumerate(WORKLOADS[workload](rng, count)):
+        videos.append({
+            "id": f"sim{index:08d}",
+            "duration": duration,
+            "actual_size": duration * DEFAULT_BITRATE * rng.lognormvariate(0, 0.3),
+            "arrival": arrival_span * index / count,
+        })
+    return videos
+
+
+def simulate(videos, policy, workers, speed, overhead):
+    """Run videos through workers pulling from a SizeScheduler; return the stats."""
+    now = [0.0]
+    scheduler = SizeScheduler(policy, clock=lambda: now[0])
+    arrivals = sorted(videos, key=lambda video: video["arrival"])
+    next_arrival = 0
+    free = [(0.0, worker) for worker in range(workers)]
+    completions = []
+    finish_times = []
+    waits = []
+    
+    while free:
+        now[0], worker = heapq.heappop(free)
+        while next_arrival < len(arrivals) and arrivals[next_arrival]["arrival"] <= now[0]:
+            video = arrivals[next_arrival]
+            scheduler.push(video["id"], video, estimate_size(video))
+            next_arrival += 1
+        
+        video = scheduler.get(block=False)
+        if video is None:
+            if next_arrival < len(arrivals):
+                heapq.heappush(free, (arrivals[next_arrival]["arrival"], worker))
+            continue
+        waits.append(now[0] - video["arrival"])
+        finished = now[0] + overhead + video["actual_size"] / speed
+        completions.append(finished - video["arrival"])
+        finish_times.append(finished)
+        heapq.heappush(free, (finished, worker))
+    
+    completions.sort()
+    return {
+        "first_hour": sum(1 for finished in finish_times if finished <= HOUR),
+        "mean_completion": sum(completions) / len(completions),
+        "p95_completion": completions[int(0.95 * (len(completions) - 1))],
+        "max_wait": max(waits),
+        "makespan": max(finish_times),
+    }
+
+
+def run(args):
+    results = []
+    for workload in args.workloads:
+        for label, arrival_span in (("batch", 0.0), ("streamed", args.arrival_span)):
+            videos = make_videos(workload, args.videos, args.seed, arrival_span)
+            for policy in POLICIES:
+                stats = simulate(videos, policy, args.workers, args.speed, args.overhead)
+                results.append(dict(stats, workload=workload, arrivals=label, order=policy))
+    return results
+
+
+def print_results(results):
+    print(f"{'workload':<10} {'arrivals':<9} {'order':<9} {'1st hour':>8} {'mean done':>10} {'p95 done':>10} "
+          f"{'max wait':>10} {'total':>10}")
+    for r in results:
+        print(f"{r['workload']:<10} {r['arrivals']:<9} {r['order']:<9} {r['first_hour']:>8} "
+              f"{r['mean_completion'] / 60:>9.1f}m {r['p95_completion'] / 60:>9.1f}m "
+              f"{r['max_wait'] / 60:>9.1f}m {r['makespan'] / 60:>9.1f}m")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--videos', type=int, default=DEFAULT_VIDEOS, help='Videos per workload')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent downloads')
+    parser.add_argument('--speed', type=float, default=DEFAULT_SPEED, help='Bytes per second per download')
+    parser.add_argument('--overhead', type=float, default=DEFAULT_OVERHEAD, help='Fixed seconds per download')
+    parser.add_argument('--arrival-span', type=float, default=HOUR,
+                        help='Seconds over which a streamed listing delivers its videos')
+    parser.add_argument('--workloads', type=lambda text: text.split(","), default=list(WORKLOADS),
+                        help='Comma-separated workloads: ' + ", ".join(WORKLOADS))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    
+    results = run(args)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Run one pipeline stage script and record its I/O counters
+
+Used by benchmarks.pipeline, which needs the counters of the stage process
+itself rather than of the Python interpreter that launched it:
+
+    python -m benchmarks.stage_runner COUNTERS_JSON SCRIPT [ARGS...]
+
+The script runs as __main__ with sys.argv set as if it had been started
+directly. On exit the read/write syscall and byte counters from
+/proc/self/io (empty where unavailable) are written to COUNTERS_JSON.
+"""
+
+import json
+import runpy
+import sys
+
+
+def io_counters():
+    counters = {}
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                name, value = line.split(":")
+                counters[name.strip()] = int(value)
+    except OSError:
+        pass
+    return counters
+
+
+def main():
+    output, script, *args = sys.argv[1:]
+    sys.argv = [script, *args]
+    try:
+        runpy.run_path(script, run_name="__main__")
+    finally:
+        with open(output, "w") as f:
+            json.dump(io_counters(), f)
+
+
+if __name__ == "__main__":
+    main()
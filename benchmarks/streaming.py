@@ -0,0 +1,107 @@
+"""
+Compare the staged and streaming pipelines end to end
+
+Runs main.py once with --staged and once streaming against the same
+synthetic channel, with benchmarks/fake_yt_dlp.py standing in for yt-dlp,
+and reports total wall time, time to the first verified video and peak
+RSS for each mode.
+
+    python -m benchmarks.streaming --videos 500 --latency 0.05
+
+In staged mode no video can be verified before every video has been
+downloaded, so its time to first verified video is reported as the time
+the verify stage started. The streaming pipeline records the exact time
+in the first_verified_seconds gauge of reports/metrics.json.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.pipeline import CHANNEL_URL, REPO_DIR, install_fake_yt_dlp
+from benchmarks.synthetic_channel import DEFAULT_SHORTS_EVERY
+
+MODES = ("staged", "streaming")
+
+
+def gauge(metrics, name):
+    samples = metrics.get("gauges", {}).get(name)
+    return samples[0]["value"] if samples else None
+
+
+def run_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix=f"streaming-{mode}-")
+    env = dict(os.environ)
+    env["PATH"] = os.path.join(workdir, "bin") + os.pathsep + env.get("PATH", "")
+    env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    env.update({
+        "FAKE_YT_DLP_VIDEOS": str(args.videos),
+        "FAKE_YT_DLP_SHORTS_EVERY": str(args.shorts_every),
+        "FAKE_YT_DLP_LATENCY": str(args.latency),
+        "FAKE_YT_DLP_SIZE": str(args.size),
+    })
+    install_fake_yt_dlp(os.path.join(workdir, "bin"))
+    cmd = [sys.executable, os.path.join(REPO_DIR, "main.py"), CHANNEL_URL, "--backend", "cli",
+           "--workers", str(args.workers)]
+    if mode == "staged":
+        cmd.append("--staged")
+    
+    try:
+        with open(os.path.join(workdir, "main.log"), "w") as log:
+            started = time.perf_counter()
+            process = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+            _, status, usage = os.wait4(process.pid, 0)
+            elapsed = time.perf_counter() - started
+        with open(os.path.join(workdir, "reports", "metrics.json")) as f:
+            metrics = json.load(f)
+        if mode == "staged":
+            stages = metrics["stages"]
+            first_verified = stages.get("list_and_extract", 0) + stages.get("download", 0)
+        else:
+            first_verified = gauge(metrics, "first_verified_seconds")
+        return {
+            "mode": mode,
+            "returncode": os.waitstatus_to_exitcode(status),
+            "seconds": elapsed,
+            "first_verified": first_verified,
+            "peak_rss_mb": usage.ru_maxrss / 1024,
+        }
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--videos', type=int, default=500, help='Entries in the synthetic channel')
+    parser.add_argument('--shorts-every', type=int, default=DEFAULT_SHORTS_EVERY, help='Every Nth entry is a short')
+    parser.add_argument('--size', type=int, default=65536, help='Bytes per video file')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='Seconds the fake yt-dlp sleeps per download and per listing page')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent downloads')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch directories')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    
+    results = []
+    print(f"{'mode':<10} {'seconds':>9} {'first verified':>15} {'peak MB':>8} {'rc':>3}")
+    for mode in MODES:
+        result = run_mode(mode, args)
+        results.append(result)
+        first = "-" if result["first_verified"] is None else f"{result['first_verified']:.2f}s"
+        print(f"{result['mode']:<10} {result['seconds']:9.2f} {first:>15} {result['peak_rss_mb']:8.1f} "
+              f"{result['returncode']:>3}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Synthetic YouTube channels for the pipeline benchmarks
+
+Entries have the same fields and value shapes as the yt-dlp flat-playlist
+output in metadata/channel_raw_info.json, including four signed thumbnail
+URLs per video, so parsing and storage costs match a real channel.
+
+    python -m benchmarks.synthetic_channel 1000 -o channel.jsonl
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+
+CHANNEL_ID = "UCsynthetic0000000000000"
+CHANNEL_HANDLE = "@synthetic"
+CHANNEL_NAME = "SYNTHETIC"
+EPOCH = 1743777947
+DEFAULT_SHORTS_EVERY = 5
+
+VIDEO_THUMBNAILS = ((168, 94), (196, 110), (246, 138), (336, 188))
+SHORT_THUMBNAILS = ((270, 480),)
+
+
+def video_id(index):
+    """Return the 11-character video ID of the index-th synthetic video."""
+    return f"syn{index:08d}"
+
+
+def video_index(video_id):
+    return int(video_id[3:])
+
+
+def is_short(index, shorts_every=DEFAULT_SHORTS_EVERY):
+    return bool(shorts_every) and index % shorts_every == shorts_every - 1
+
+
+def duration(index, shorts_every=DEFAULT_SHORTS_EVERY):
+    return 15.0 + index % 45 if is_short(index, shorts_every) else 120.0 + index * 37 % 1200
+
+
+def thumbnail_url(vid, width, height):
+    # Stand-in for the signed sqp/rs query string YouTube attaches to each size
+    signature = hashlib.sha1(f"{vid}{width}x{height}".encode()).hexdigest()
+    return f"https://i.ytimg.com/vi/{vid}/hqdefault.jpg?sqp=-oaymwE{signature[:30]}&rs=AOn4CL{signature[30:]}"
+
+
+def synthetic_entry(index, count, shorts_every=DEFAULT_SHORTS_EVERY):
+    """Return the flat-playlist entry for the index-th of count videos."""
+    vid = video_id(index)
+    short = is_short(index, shorts_every)
+    seconds = duration(index, shorts_every)
+    url = f"https://www.youtube.com/shorts/{vid}" if short else f"https://www.youtube.com/watch?v={vid}"
+    tab = "shorts" if short else "videos"
+    return {
+        "_type": "url",
+        "ie_key": "Youtube",
+        "id": vid,
+        "url": url,
+        "title": f"Synthetic {'short' if short else 'video'} {index}",
+        "description": None if short else f"Synthetic video {index} generated for the pipeline benchmarks",
+        "duration": None if short else seconds,
+        "channel_id": None,
+        "channel": None,
+        "channel_url": None,
+        "uploader": None,
+        "uploader_id": None,
+        "uploader_url": None,
+        "thumbnails": [
+            {"url": thumbnail_url(vid, width, height), "height": height, "width": width}
+            for width, height in (SHORT_THUMBNAILS if short else VIDEO_THUMBNAILS)
+        ],
+        "timestamp": None,
+        "release_timestamp": None,
+        "availability": None,
+        "view_count": index * 7 % 100000,
+        "live_status": None,
+        "channel_is_verified": None,
+        "__x_forwarded_for_ip": None,
+        "webpage_url": url,
+        "original_url": url,
+        "webpage_url_basename": vid if short else "watch",
+        "webpage_url_domain": "youtube.com",
+        "extractor": "youtube",
+        "extractor_key": "Youtube",
+        "playlist_count": count,
+        "playlist": f"{CHANNEL_NAME} - {tab.title()}",
+        "playlist_id": CHANNEL_ID,
+        "playlist_title": f"{CHANNEL_NAME} - {tab.title()}",
+        "playlist_uploader": CHANNEL_NAME,
+        "playlist_uploader_id": CHANNEL_HANDLE,
+        "playlist_channel": CHANNEL_NAME,
+        "playlist_channel_id": CHANNEL_ID,
+        "playlist_webpage_url": f"https://www.youtube.com/{CHANNEL_HANDLE}/{tab}",
+        "n_entries": count,
+        "playlist_index": index + 1,
+        "__last_playlist_index": count,
+        "playlist_autonumber": index + 1,
+        "epoch": EPOCH,
+        "duration_string": None if short else f"{int(seconds // 60)}:{int(seconds % 60):02d}",
+        "release_year": None,
+        "_version": {
+            "version": "2025.03.31",
+            "current_git_head": None,
+            "release_git_head": "5e457af57fae9645b1b8fa0ed689229c8fb9656b",
+            "repository": "yt-dlp/yt-dlp",
+        },
+    }
+
+
+def iter_channel(count, shorts_every=DEFAULT_SHORTS_EVERY):
+    for index in range(count):
+        yield synthetic_entry(index, count, shorts_every)
+
+
+def write_channel(f, count, shorts_every=DEFAULT_SHORTS_EVERY):
+    """Write count entries to f as JSON lines, like yt-dlp --dump-json --flat-playlist."""
+    for entry in iter_channel(count, shorts_every):
+        f.write(json.dumps(entry) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('count', type=int, help='Number of entries')
+    parser.add_argument('--shorts-every', type=int, default=DEFAULT_SHORTS_EVERY, help='Every Nth entry is a short')
+    parser.add_argument('-o', '--output', default=None, help='Output file (default: stdout)')
+    args = parser.parse_args()
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            write_channel(f, args.count, args.shorts_every)
+    else:
+        write_channel(sys.stdout, args.count, args.shorts_every)
+
+
+if __name__ == "__main__":
+    main()
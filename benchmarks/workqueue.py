@@ -0,0 +1,132 @@
+"""
+Share a synthetic channel between several local worker processes
+
+Enqueues a synthetic channel in a fresh work queue, starts workqueue.py
+worker processes against it with benchmarks/fake_yt_dlp.py standing in
+for yt-dlp, and reports the wall time and videos per second for each
+process count. With --kill-after one worker of every run is killed with
+SIGKILL that many seconds in; the run then only completes once its
+leases expire and the other workers re-claim them. Every run checks
+that each video ends up done with exactly one video file.
+
+    python -m benchmarks.workqueue --processes 1,2,4 --videos 200 --latency 0.2
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.pipeline import REPO_DIR, install_fake_yt_dlp
+from benchmarks.synthetic_channel import iter_channel
+
+
+def prepare(workdir, args):
+    """Write the synthetic channel to the metadata store and enqueue it."""
+    sys.path.insert(0, REPO_DIR)
+    from metadata_store import MetadataStore, SHORT, VIDEO
+    from shorts import classify_entry
+    
+    os.makedirs(os.path.join(workdir, "metadata"))
+    with MetadataStore(os.path.join(workdir, "metadata", "metadata.sqlite3")) as store:
+        for entry in iter_channel(args.videos, shorts_every=0):
+            store.add(entry, SHORT if classify_entry(entry) else VIDEO)
+
+
+def check(workdir):
+    """Return (done, failed, retried, videos with other than one .mp4) for a finished run."""
+    conn = sqlite3.connect(os.path.join(workdir, "downloads", "workqueue.sqlite3"))
+    states = dict(conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state"))
+    retried = conn.execute("SELECT COUNT(*) FROM items WHERE attempts > 1").fetchone()[0]
+    conn.close()
+    videos_dir = os.path.join(workdir, "downloads", "videos")
+    bad = sum(1 for name in os.listdir(videos_dir)
+              if sum(1 for f in os.listdir(os.path.join(videos_dir, name)) if f.endswith(".mp4")) != 1)
+    return states.get("done", 0), states.get("failed", 0), retried, bad
+
+
+def run(processes, args):
+    workdir = tempfile.mkdtemp(prefix=f"workqueue-{processes}-")
+    env = dict(os.environ)
+    env["PATH"] = os.path.join(workdir, "bin") + os.pathsep + env.get("PATH", "")
+    env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    env.update({
+        "FAKE_YT_DLP_VIDEOS": str(args.videos),
+        "FAKE_YT_DLP_SHORTS_EVERY": "0",
+        "FAKE_YT_DLP_LATENCY": str(args.latency),
+        "FAKE_YT_DLP_SIZE": str(args.size),
+    })
+    install_fake_yt_dlp(os.path.join(workdir, "bin"))
+    script = os.path.join(REPO_DIR, "workqueue.py")
+    
+    try:
+        prepare(workdir, args)
+        subprocess.run([sys.executable, script, "enqueue"], cwd=workdir, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        started = time.perf_counter()
+        workers = []
+        for index in range(processes):
+            log = open(os.path.join(workdir, f"worker{index}.log"), "w")
+            workers.append(subprocess.Popen(
+                [sys.executable, script, "work", "--backend", "cli", "--worker-id", f"worker{index}",
+                 "--workers", str(args.workers), "--lease", str(args.lease), "--poll-interval", "0.5",
+                 "--max-rate", "1000"],
+                cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT))
+            log.close()
+        if args.kill_after is not None:
+            time.sleep(args.kill_after)
+            workers[0].send_signal(signal.SIGKILL)
+        for process in workers:
+            process.wait()
+        elapsed = time.perf_counter() - started
+        done, failed, retried, bad = check(workdir)
+        return {
+            "processes": processes,
+            "seconds": elapsed,
+            "videos_per_second": done / elapsed,
+            "done": done,
+            "failed": failed,
+            "retried": retried,
+            "bad_dirs": bad,
+        }
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--processes', default="1,2,4", help='Comma-separated worker process counts')
+    parser.add_argument('--videos', type=int, default=200, help='Videos in the synthetic channel')
+    parser.add_argument('--workers', type=int, default=2, help='Download threads per process')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds the fake yt-dlp sleeps per download')
+    parser.add_argument('--size', type=int, default=65536, help='Bytes per video file')
+    parser.add_argument('--lease', type=float, default=3.0, help='Lease time in seconds')
+    parser.add_argument('--kill-after', type=float, default=None,
+                        help='Kill one worker process this many seconds into each run')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch directories')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    
+    results = []
+    print(f"{'processes':>9} {'seconds':>9} {'videos/s':>9} {'done':>6} {'failed':>7} {'retried':>8} {'bad dirs':>9}")
+    for processes in (int(count) for count in args.processes.split(",")):
+        r = run(processes, args)
+        results.append(r)
+        print(f"{r['processes']:>9} {r['seconds']:9.2f} {r['videos_per_second']:9.1f} {r['done']:>6} "
+              f"{r['failed']:>7} {r['retried']:>8} {r['bad_dirs']:>9}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+
+"""
+Content-addressed store for downloaded video files
+
+Every file is kept once under its checksum; the video directories of each
+download tree are views made of hardlinks (or reflinks) into the store.
+"""
+
+import errno
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from checksums import file_checksum
+
+BLOB_STORE_DIR = "downloads/blobs"
+INDEX_FILE = "index.sqlite3"
+
+# How files are placed in the store and linked back out of it
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+COPY = "copy"
+AUTO = "auto"
+LINK_MODES = (AUTO, HARDLINK, REFLINK, COPY)
+
+# Linux ioctl that clones a file's extents (btrfs, XFS)
+FICLONE = 0x40049409
+
+def reflink(src, dst):
+    """
+    Create dst as a copy-on-write clone of src; raises OSError where unsupported
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+
+def place(src, dst, mode=AUTO):
+    """
+    Make dst a link to or copy of src, atomically replacing any existing dst
+
+    AUTO tries a hardlink, then a reflink, then a plain copy. Returns the
+    method that was used.
+    """
+    methods = {HARDLINK: (HARDLINK,), REFLINK: (REFLINK,), COPY: (COPY,), AUTO: (HARDLINK, REFLINK, COPY)}[mode]
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    for method in methods:
+        try:
+            if method == HARDLINK:
+                os.link(src, tmp)
+            elif method == REFLINK:
+                reflink(src, tmp)
+            else:
+                shutil.copyfile(src, tmp)
+        except OSError as e:
+            # Fall through to the next method only when this one is unsupported here
+            if method == methods[-1] or e.errno not in (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY,
+                                                         errno.EINVAL, errno.EMLINK):
+                raise
+            continue
+        os.replace(tmp, dst)
+        return method
+
+class BlobStore:
+    """
+    Files stored by checksum, with an index of which video they belong to
+
+    Blobs live at <root>/<first two hex digits>/<checksum>, and the index in
+    <root>/index.sqlite3 maps each video ID to the names and checksums of
+    its files, so a video can be found before anything is downloaded. add()
+    moves a downloaded file into the store and turns the original into a
+    link to the blob; a file whose content is already stored is replaced
+    by a link to the existing blob, so identical files only take space
+    once. link_video() and link_file() recreate a stored video in another
+    directory or layout. One store can be shared by several download trees
+    and processes; hardlinks need the trees on the same file system as the
+    store, otherwise the mode falls back to reflinks or copies.
+    """
+    
+    def __init__(self, root=BLOB_STORE_DIR, mode=AUTO):
+        if mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode: {mode}")
+        self.root = root
+        self.mode = mode
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, INDEX_FILE), timeout=60, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " video_id TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " checksum TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " added_at REAL NOT NULL,"
+            " PRIMARY KEY (video_id, name))"
+        )
+        self._conn.commit()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def blob_path(self, checksum):
+        return os.path.join(self.root, checksum[:2], checksum)
+    
+    def files(self, video_id):
+        """
+        Return the stored files of a video as {name: checksum}
+        """
+        with self._lock:
+            return dict(self._conn.execute("SELECT name, checksum FROM files WHERE video_id = ?", (video_id,)))
+    
+    def add(self, video_id, path, checksum=None):
+        """
+        Store the file at path as one of video_id's files and return its checksum
+
+        Afterwards path is a link to (or, across file systems, a copy of)
+        the blob.
+        """
+        if checksum is None:
+            checksum = file_checksum(path)
+        blob = self.blob_path(checksum)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            # Already stored: replace the new file with a link to the blob
+            place(blob, path, self.mode)
+        else:
+            place(path, blob, self.mode)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (video_id, name, checksum, size, added_at) VALUES (?, ?, ?, ?, ?)",
+                (video_id, os.path.basename(path), checksum, os.path.getsize(blob), time.time())
+            )
+            self._conn.commit()
+        return checksum
+    
+    def add_video(self, video_id, video_dir, skip=("metadata.json",)):
+        """
+        Store every file in video_dir except those named in skip; returns {name: checksum}
+        """
+        return {
+            name: self.add(video_id, os.path.join(video_dir, name))
+            for name in sorted(os.listdir(video_dir))
+            if name not in skip and os.path.isfile(os.path.join(video_dir, name))
+        }
+    
+    def _stored(self, video_id):
+        """
+        Return {name: checksum} for the files of video_id whose blob is present
+        """
+        return {name: checksum for name, checksum in self.files(video_id).items()
+                if os.path.exists(self.blob_path(checksum))}
+    
+    def link_video(self, video_id, video_dir, required=()):
+        """
+        Recreate the stored files of video_id in video_dir
+
+        Only links anything if, for every suffix in required, a file with
+        that suffix is stored. Returns {name: checksum} of the linked files,
+        or None if the video is not (completely) in the store.
+        """
+        stored = self._stored(video_id)
+        if not stored or not all(any(name.endswith(suffix) for name in stored) for suffix in required):
+            return None
+        os.makedirs(video_dir, exist_ok=True)
+        for name, checksum in stored.items():
+            place(self.blob_path(checksum), os.path.join(video_dir, name), self.mode)
+        return stored
+    
+    def link_file(self, video_id, path, suffix=".mp4"):
+        """
+        Link the stored file of video_id ending in suffix to path
+
+        Returns its checksum, or None if no such file is stored.
+        """
+        for name, checksum in sorted(self._stored(video_id).items()):
+            if name.endswith(suffix):
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                place(self.blob_path(checksum), path, self.mode)
+                return checksum
+        return None
+    
+    def stats(self):
+        """
+        Return the number of videos and blobs, and the bytes stored and referenced
+        """
+        with self._lock:
+            videos, referenced = self._conn.execute(
+                "SELECT COUNT(DISTINCT video_id), COALESCE(SUM(size), 0) FROM files").fetchone()
+            blobs, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM"
+                " (SELECT checksum, MAX(size) AS size FROM files GROUP BY checksum)").fetchone()
+        return {"videos": videos, "blobs": blobs, "bytes_stored": stored, "bytes_referenced": referenced}
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
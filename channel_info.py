@@ -2,50 +2,152 @@
 Script to access YouTube channel and extract video information
 """
 
+import argparse
 import json
 import os
-import subprocess
 import sys
 from datetime import datetime
 
+from backends import BACKENDS, DEFAULT_BACKEND, BackendError, get_backend
+from ledger import DownloadLedger
+
 CHANNEL_URL = "https://www.youtube.com/@vk-streaming3526"
+RAW_INFO_FILE = "metadata/channel_raw_info.json"
+DEFAULT_STOP_AFTER = 5
 
-def get_channel_info():
+def iter_channel_entries(channel_url=CHANNEL_URL, checkpoint=True, lazy=False, backend=None, merge=False):
     """
-    Get basic information about the YouTube channel
+    Yield flat-playlist entries for the channel as they are fetched
+
+    Entries are produced one at a time by the backend (see backends.py), so
+    they are available while later pages are still being fetched. When
+    checkpoint is set each entry is also appended to RAW_INFO_FILE as one
+    JSON line. The entries go to a temporary file that replaces RAW_INFO_FILE
+    once the listing ends or the consumer stops early, so a failed listing
+    leaves the previous checkpoint in place. With merge set (incremental
+    listings, which stop early) the entries of the previous checkpoint that
+    were not listed again are kept after the new ones. With lazy set
+    playlist pages are fetched only as entries are consumed. Raises
+    BackendError if the listing fails.
     """
-    print(f"Accessing channel: {CHANNEL_URL}")
+    print(f"Accessing channel: {channel_url}")
     
-    # Use yt-dlp to get channel info
-    cmd = [
-        "yt-dlp", 
-        "--dump-json",
-        "--flat-playlist",
-        CHANNEL_URL
-    ]
+    if backend is None:
+        backend = get_backend()
     
-    try:
-        # Create output directory for metadata
+    raw_file = None
+    if checkpoint:
         os.makedirs("metadata", exist_ok=True)
+        raw_file = open(RAW_INFO_FILE + ".tmp", "w")
+    
+    entries = None
+    listed = False
+    listed_ids = set()
+    try:
+        entries = iter(backend.list_channel(channel_url, lazy=lazy))
+        for entry in entries:
+            if raw_file:
+                raw_file.write(json.dumps(entry) + "\n")
+                if merge:
+                    listed_ids.add(entry.get("id"))
+            yield entry
+        listed = True
+    except GeneratorExit:
+        # The consumer stopped early, e.g. an incremental listing; keep what was listed
+        listed = True
+        raise
+    finally:
+        close = getattr(entries, "close", None)
+        if close:
+            close()
+        if raw_file:
+            try:
+                if listed and merge and os.path.exists(RAW_INFO_FILE):
+                    with open(RAW_INFO_FILE, "r") as previous:
+                        for line in previous:
+                            if line.strip() and json.loads(line).get("id") not in listed_ids:
+                                raw_file.write(line if line.endswith("\n") else line + "\n")
+            finally:
+                raw_file.close()
+            if listed:
+                os.replace(RAW_INFO_FILE + ".tmp", RAW_INFO_FILE)
+                print(f"Channel information saved to {RAW_INFO_FILE}")
+            else:
+                os.remove(RAW_INFO_FILE + ".tmp")
+
+def iter_new_entries(entries, known_ids, stop_after=DEFAULT_STOP_AFTER):
+    """
+    Yield the entries of a newest-first listing that are not in known_ids
+
+    Iteration stops once stop_after consecutive entries are already known,
+    so only about as many entries are pulled from the listing as there are
+    new uploads. Known entries are not yielded. If entries is a generator
+    it is closed when iteration stops, which ends the underlying yt-dlp
+    process.
+    """
+    iterator = iter(entries)
+    streak = 0
+    try:
+        for entry in iterator:
+            if entry.get("id") in known_ids:
+                streak += 1
+                if streak >= stop_after:
+                    print(f"Stopped listing after {streak} consecutive known videos")
+                    break
+                continue
+            streak = 0
+            yield entry
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
+
+def get_channel_info(channel_url=CHANNEL_URL, known_ids=None, stop_after=DEFAULT_STOP_AFTER, backend=None):
+    """
+    Get basic information about the YouTube channel
+
+    Streams the listing into RAW_INFO_FILE and returns the number of entries,
+    or None on failure. When known_ids is given the listing is incremental
+    (see iter_new_entries) and only new entries are counted.
+    """
+    try:
+        entries = iter_channel_entries(channel_url, checkpoint=True, lazy=known_ids is not None, backend=backend,
+                                       merge=known_ids is not None)
+        if known_ids is not None:
+            entries = iter_new_entries(entries, known_ids, stop_after)
         
-        # Run the command and capture output
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        
-        # Save raw channel info
-        with open("metadata/channel_raw_info.json", "w") as f:
-            f.write(result.stdout)
-            
-        print(f"Channel information saved to metadata/channel_raw_info.json")
-        return True
-    except subprocess.CalledProcessError as e:
+        count = 0
+        for _ in entries:
+            count += 1
+        return count
+    except BackendError as e:
         print(f"Error accessing channel: {e}")
-        print(f"Error output: {e.stderr}")
-        return False
+        return None
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='List the videos of a YouTube channel.')
+    parser.add_argument('channel_url', nargs='?', default=CHANNEL_URL, help='YouTube channel URL')
+    parser.add_argument('--incremental', type=int, nargs='?', const=DEFAULT_STOP_AFTER, metavar='N',
+                        help=f'Stop listing after N consecutive videos already in the download ledger (default N: {DEFAULT_STOP_AFTER})')
+    parser.add_argument('--backend', choices=['auto'] + sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help='Use yt-dlp as an in-process library or as a command line tool (default: auto)')
+    args = parser.parse_args()
+    
+    known_ids = None
+    if args.incremental:
+        with DownloadLedger() as ledger:
+            known_ids = ledger.settled_ids()
+    
+    try:
+        backend = get_backend(args.backend)
+    except BackendError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
     print(f"Starting channel access at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    success = get_channel_info()
-    if success:
+    with backend:
+        count = get_channel_info(args.channel_url, known_ids, args.incremental or DEFAULT_STOP_AFTER, backend=backend)
+    if count is not None:
         print("Successfully accessed channel information")
     else:
         print("Failed to access channel information")
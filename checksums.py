@@ -0,0 +1,27 @@
+
+"""
+Streaming file checksums
+"""
+
+import hashlib
+
+DEFAULT_ALGORITHM = "sha256"
+CHUNK_SIZE = 4 * 1024 * 1024
+
+def file_checksum(path, algorithm=DEFAULT_ALGORITHM, chunk_size=CHUNK_SIZE):
+    """
+    Return the hex digest of a file
+
+    The file is read in large chunks into one reused buffer, so memory use is
+    constant and hashlib can release the GIL while hashing each chunk.
+    """
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
@@ -3,40 +3,109 @@
 Script to create a comprehensive summary report of the downloaded YouTube videos
 """
 
-import json
 import os
 import sys
+import tempfile
 from datetime import datetime
 import shutil
 
-def create_summary_report():
+from extract_metadata import iter_metadata
+from jsonstream import iter_json_array
+from metadata_store import VIDEO, SHORT
+from verify_downloads import VERIFICATION_RESULTS_FILE
+
+# Fields of each entry that appear in the report
+VIDEO_REPORT_FIELDS = ("id", "title", "duration", "duration_string", "webpage_url", "view_count", "description")
+SHORT_REPORT_FIELDS = ("id", "title", "webpage_url", "view_count")
+
+class SummaryReport:
     """
-    Create a comprehensive summary report of the downloaded videos
+    Builds the Markdown and text summary reports in a single pass
+
+    Videos, shorts and verification results are each fed in once, in any
+    order. Every entry updates the running totals and is written straight
+    to a spool file for each report section, so memory use does not grow
+    with the channel size. The totals go at the top of the reports, which
+    are assembled from the spools in write().
     """
-    print("Creating summary report...")
     
-    # Create reports directory
-    reports_dir = os.path.abspath("reports")
-    os.makedirs(reports_dir, exist_ok=True)
+    def __init__(self):
+        self.video_count = 0
+        self.short_count = 0
+        self.verified_count = 0
+        self.total_duration = 0
+        self.total_size_bytes = 0
     
-    try:
-        # Read metadata files
-        with open("metadata/videos_metadata.json", "r") as f:
-            videos_metadata = json.load(f)
-        
-        with open("metadata/shorts_metadata.json", "r") as f:
-            shorts_metadata = json.load(f)
-        
-        with open("downloads/verification_results.json", "r") as f:
-            verification_results = json.load(f)
+    def __enter__(self):
+        self._md_videos = tempfile.TemporaryFile(mode="w+")
+        self._md_shorts = tempfile.TemporaryFile(mode="w+")
+        self._txt_videos = tempfile.TemporaryFile(mode="w+")
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._md_videos.close()
+        self._md_shorts.close()
+        self._txt_videos.close()
+        return False
+    
+    def add_video(self, video):
+        self.video_count += 1
+        i = self.video_count
+        self.total_duration += video.get('duration') or 0
         
-        # Copy verification report to reports directory
-        shutil.copy("downloads/verification_report.txt", os.path.join(reports_dir, "verification_report.txt"))
+        title, video_id, duration = video.get('title'), video.get('id'), video.get('duration_string')
+        url, views, description = video.get('webpage_url'), video.get('view_count'), video.get('description')
+        self._md_videos.write(
+            f"### {i}. {title}\n\n"
+            f"- **Video ID:** {video_id}\n"
+            f"- **Duration:** {duration}\n"
+            f"- **URL:** {url}\n"
+            f"- **Views:** {views}\n"
+            f"- **Description:** {description}\n\n"
+        )
+        self._txt_videos.write(
+            f"{i}. {title}\n"
+            f"   Video ID: {video_id}\n"
+            f"   Duration: {duration}\n"
+            f"   URL: {url}\n"
+            f"   Views: {views}\n"
+            f"   Description: {description}\n\n"
+        )
+    
+    def add_short(self, short):
+        self.short_count += 1
+        self._md_shorts.write(
+            f"### {self.short_count}. {short.get('title')}\n\n"
+            f"- **Short ID:** {short.get('id')}\n"
+            f"- **URL:** {short.get('webpage_url')}\n"
+            f"- **Views:** {short.get('view_count')}\n\n"
+        )
+    
+    def add_result(self, result):
+        if not result['verified']:
+            return
+        self.verified_count += 1
+        if 'video_size' in result:
+            self.total_size_bytes += result['video_size']
+        elif 'video_file' in result:
+            # Results saved before verification recorded video_size
+            video_path = os.path.join("downloads/videos", result['id'], result['video_file'])
+            if os.path.exists(video_path):
+                self.total_size_bytes += os.path.getsize(video_path)
+    
+    def write(self, reports_dir):
+        """
+        Write summary_report.md and summary_report.txt to reports_dir
+        """
+        generated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        success_rate = self.verified_count / max(self.video_count, 1) * 100
+        total_duration_formatted = f"{int(self.total_duration // 60)}:{int(self.total_duration % 60):02d}"
+        total_size_mb = self.total_size_bytes / (1024 * 1024)
         
         # Create main summary report
         with open(os.path.join(reports_dir, "summary_report.md"), "w") as f:
             f.write("# YouTube Video Downloader Summary Report\n\n")
-            f.write(f"**Report Generated:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+            f.write(f"**Report Generated:** {generated}\n\n")
             
             f.write("## Channel Information\n\n")
             f.write("- **Channel Name:** VK-STREAMING\n")
@@ -44,42 +113,21 @@ def create_summary_report():
             f.write("- **Channel ID:** UCOsQ3iGRosvnpP1hAdtplvQ\n\n")
             
             f.write("## Download Summary\n\n")
-            f.write(f"- **Total Videos Found:** {len(videos_metadata)}\n")
-            f.write(f"- **Total Shorts Found:** {len(shorts_metadata)}\n")
-            f.write(f"- **Videos Downloaded:** {sum(1 for v in verification_results if v['verified'])}\n")
-            f.write(f"- **Download Success Rate:** {(sum(1 for v in verification_results if v['verified']) / len(videos_metadata)) * 100:.1f}%\n\n")
-            
-            # Calculate total duration and size
-            total_duration = sum(video.get('duration', 0) for video in videos_metadata)
-            total_duration_formatted = f"{int(total_duration // 60)}:{int(total_duration % 60):02d}"
-            
-            total_size_bytes = 0
-            for video in verification_results:
-                if video['verified'] and 'video_file' in video:
-                    video_path = os.path.join("downloads/videos", video['id'], video['video_file'])
-                    if os.path.exists(video_path):
-                        total_size_bytes += os.path.getsize(video_path)
-            
-            total_size_mb = total_size_bytes / (1024 * 1024)
+            f.write(f"- **Total Videos Found:** {self.video_count}\n")
+            f.write(f"- **Total Shorts Found:** {self.short_count}\n")
+            f.write(f"- **Videos Downloaded:** {self.verified_count}\n")
+            f.write(f"- **Download Success Rate:** {success_rate:.1f}%\n\n")
             
             f.write(f"- **Total Video Duration:** {total_duration_formatted}\n")
             f.write(f"- **Total Size:** {total_size_mb:.2f} MB\n\n")
             
             f.write("## Downloaded Videos\n\n")
-            for i, video in enumerate(videos_metadata, 1):
-                f.write(f"### {i}. {video.get('title')}\n\n")
-                f.write(f"- **Video ID:** {video.get('id')}\n")
-                f.write(f"- **Duration:** {video.get('duration_string')}\n")
-                f.write(f"- **URL:** {video.get('webpage_url')}\n")
-                f.write(f"- **Views:** {video.get('view_count')}\n")
-                f.write(f"- **Description:** {video.get('description')}\n\n")
+            self._md_videos.seek(0)
+            shutil.copyfileobj(self._md_videos, f)
             
             f.write("## Excluded Shorts\n\n")
-            for i, short in enumerate(shorts_metadata, 1):
-                f.write(f"### {i}. {short.get('title')}\n\n")
-                f.write(f"- **Short ID:** {short.get('id')}\n")
-                f.write(f"- **URL:** {short.get('webpage_url')}\n")
-                f.write(f"- **Views:** {short.get('view_count')}\n\n")
+            self._md_shorts.seek(0)
+            shutil.copyfileobj(self._md_shorts, f)
             
             f.write("## Application Information\n\n")
             f.write("This report was generated by the YouTube Video Downloader application, which downloads videos and their associated metadata from a specified YouTube channel, excluding shorts.\n\n")
@@ -124,7 +172,7 @@ def create_summary_report():
         with open(os.path.join(reports_dir, "summary_report.txt"), "w") as f:
             f.write("YouTube Video Downloader Summary Report\n")
             f.write("=======================================\n\n")
-            f.write(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+            f.write(f"Report Generated: {generated}\n\n")
             
             f.write("Channel Information\n")
             f.write("-------------------\n\n")
@@ -134,22 +182,53 @@ def create_summary_report():
             
             f.write("Download Summary\n")
             f.write("----------------\n\n")
-            f.write(f"Total Videos Found: {len(videos_metadata)}\n")
-            f.write(f"Total Shorts Found: {len(shorts_metadata)}\n")
-            f.write(f"Videos Downloaded: {sum(1 for v in verification_results if v['verified'])}\n")
-            f.write(f"Download Success Rate: {(sum(1 for v in verification_results if v['verified']) / len(videos_metadata)) * 100:.1f}%\n")
+            f.write(f"Total Videos Found: {self.video_count}\n")
+            f.write(f"Total Shorts Found: {self.short_count}\n")
+            f.write(f"Videos Downloaded: {self.verified_count}\n")
+            f.write(f"Download Success Rate: {success_rate:.1f}%\n")
             f.write(f"Total Video Duration: {total_duration_formatted}\n")
             f.write(f"Total Size: {total_size_mb:.2f} MB\n\n")
             
             f.write("Downloaded Videos\n")
             f.write("-----------------\n\n")
-            for i, video in enumerate(videos_metadata, 1):
-                f.write(f"{i}. {video.get('title')}\n")
-                f.write(f"   Video ID: {video.get('id')}\n")
-                f.write(f"   Duration: {video.get('duration_string')}\n")
-                f.write(f"   URL: {video.get('webpage_url')}\n")
-                f.write(f"   Views: {video.get('view_count')}\n")
-                f.write(f"   Description: {video.get('description')}\n\n")
+            self._txt_videos.seek(0)
+            shutil.copyfileobj(self._txt_videos, f)
+
+def create_summary_report(videos_metadata=None, shorts_metadata=None, verification_results=None):
+    """
+    Create a comprehensive summary report of the downloaded videos
+
+    Each input may be any iterable and is consumed once; any input that is
+    not passed in is streamed from its checkpoint file.
+    """
+    print("Creating summary report...")
+    
+    # Create reports directory
+    reports_dir = os.path.abspath("reports")
+    os.makedirs(reports_dir, exist_ok=True)
+    
+    try:
+        # Read metadata files
+        if videos_metadata is None:
+            videos_metadata = iter_metadata(VIDEO, fields=VIDEO_REPORT_FIELDS)
+        
+        if shorts_metadata is None:
+            shorts_metadata = iter_metadata(SHORT, fields=SHORT_REPORT_FIELDS)
+        
+        if verification_results is None:
+            verification_results = iter_json_array(VERIFICATION_RESULTS_FILE)
+        
+        # Copy verification report to reports directory
+        shutil.copy("downloads/verification_report.txt", os.path.join(reports_dir, "verification_report.txt"))
+        
+        with SummaryReport() as report:
+            for video in videos_metadata:
+                report.add_video(video)
+            for short in shorts_metadata:
+                report.add_short(short)
+            for result in verification_results:
+                report.add_result(result)
+            report.write(reports_dir)
         
         # Create a README file for the project
         with open(os.path.join(reports_dir, "README.md"), "w") as f:
@@ -3,15 +3,251 @@
 Script to download videos and their metadata from the YouTube channel
 """
 
+import argparse
 import json
 import os
-import subprocess
+import shutil
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import urlparse
 
-def download_videos():
+from backends import BACKENDS, DEFAULT_BACKEND, BackendError, get_backend
+from blobstore import BlobStore
+from extract_metadata import iter_metadata
+from journal import DownloadJournal, JOURNAL_FILE, STARTED, INTERRUPTED, install, staging_dir
+from ledger import DownloadLedger, LEDGER_FILE, DOWNLOADED, FAILED
+from metadata_store import compact_entry, VIDEO
+from ratelimit import AdaptiveRateLimiter, DEFAULT_MAX_RATE
+from scheduling import SizeScheduler, estimate_size, POLICIES, DEFAULT_POLICY, DEFAULT_SCHEDULE_SIZE
+
+DEFAULT_WORKERS = 1
+DEFAULT_PER_HOST = 4
+
+# Files a video directory needs before a stored copy can stand in for a download
+VIDEO_FILE_SUFFIXES = (".mp4", ".info.json", ".description", ".webp")
+
+class HostLimiter:
+    """
+    Caps the number of concurrent downloads per host
+    """
+    
+    def __init__(self, per_host):
+        if per_host < 1:
+            raise ValueError(f"per_host must be at least 1: {per_host}")
+        self.per_host = per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+    
+    def slot(self, url):
+        """
+        Return the semaphore guarding the host of url
+        """
+        host = urlparse(url).hostname or ""
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+def positive_int(text):
+    """
+    Parse a command line count that must be at least 1
+    """
+    value = int(text)
+    if value < 1:
+        raise ValueError(f"Must be at least 1: {text}")
+    return value
+
+def find_video_file(video_dir):
+    """
+    Return the path of the downloaded .mp4 in video_dir, or None
+    """
+    try:
+        for name in os.listdir(video_dir):
+            if name.endswith('.mp4'):
+                return os.path.join(video_dir, name)
+    except FileNotFoundError:
+        pass
+    return None
+
+def failed_outcome(video, error):
+    """
+    Return the outcome of a download that raised instead of returning one
+    """
+    return {
+        "id": video.get('id'),
+        "title": video.get('title'),
+        "status": "failed",
+        "returncode": None,
+        "error": str(error),
+        "elapsed": 0.0,
+        "bytes": 0
+    }
+
+def lost_outcome(outcome, staging, started):
+    """
+    Discard the staged copy of a video whose lease was lost and return its outcome
+    """
+    shutil.rmtree(staging, ignore_errors=True)
+    outcome.update(status="lost", error="lease lost before install", bytes=0)
+    outcome["elapsed"] = time.monotonic() - started
+    return outcome
+
+def download_video(video, videos_dir, backend, host_limiter=None, ledger=None, rate_limiter=None, blob_store=None,
+                   journal=None, worker=None, holds_lease=None):
+    """
+    Download a single video and its metadata through a yt-dlp backend
+
+    Returns an outcome dict with the video id, title, status ("downloaded",
+    "existing", "linked", "failed" or "skipped"), yt-dlp return code, error text,
+    elapsed time and size of the downloaded file in bytes. Videos the ledger already has as downloaded are skipped
+    without touching the filesystem or the backend. When a rate_limiter is
+    given it is acquired before the download and told about the result.
+    With a blobstore.BlobStore, a video that is already in the store is
+    linked into place instead of downloaded ("linked"), and new downloads
+    are added to it. The video is downloaded to a staging directory (see
+    journal.staging_dir()) that is renamed to <videos_dir>/<id> once
+    complete; a failed download's staging directory is kept so the next
+    attempt resumes it. The start and end of the download are recorded
+    in journal, a journal.DownloadJournal, when given. worker names the
+    process's own staging directory when several share videos_dir. When
+    holds_lease is given it is called right before the video is installed;
+    if it returns False another worker owns the video now, the staged copy
+    is discarded and nothing is recorded ("lost").
+    """
+    video_id = video.get('id')
+    video_title = video.get('title')
+    video_url = video.get('webpage_url')
+    
+    outcome = {
+        "id": video_id,
+        "title": video_title,
+        "status": "skipped",
+        "returncode": None,
+        "error": None,
+        "elapsed": 0.0,
+        "bytes": 0
+    }
+    
+    if not video_id or not video_url:
+        outcome["error"] = "missing ID or URL"
+        return outcome
+    
+    if ledger is not None and ledger.is_downloaded(video_id):
+        outcome["status"] = "existing"
+        return outcome
+    
+    started = time.monotonic()
+    video_dir = os.path.join(videos_dir, video_id)
+    
+    # Adopt a finished download that predates the ledger
+    if ledger is not None:
+        existing = find_video_file(video_dir)
+        if existing:
+            checksum = None
+            if blob_store is not None:
+                checksum = blob_store.add_video(video_id, video_dir).get(os.path.basename(existing))
+            ledger.record_file(video_id, existing, checksum)
+            outcome["status"] = "existing"
+            outcome["elapsed"] = time.monotonic() - started
+            return outcome
+    
+    # Create the staging directory the video is downloaded to
+    staging = staging_dir(videos_dir, video_id, worker)
+    os.makedirs(staging, exist_ok=True)
+    
+    # Save video metadata
+    with open(os.path.join(staging, "metadata.json"), "w") as f:
+        json.dump(compact_entry(video), f, separators=(",", ":"))
+    
+    # Link a copy stored by another channel or download tree
+    if blob_store is not None:
+        linked = blob_store.link_video(video_id, staging, VIDEO_FILE_SUFFIXES)
+        if linked and holds_lease is not None and not holds_lease():
+            return lost_outcome(outcome, staging, started)
+        if linked:
+            install(staging, video_dir)
+            video_file = find_video_file(video_dir)
+            if ledger is not None:
+                ledger.record_file(video_id, video_file, linked[os.path.basename(video_file)])
+            outcome["status"] = "linked"
+            outcome["elapsed"] = time.monotonic() - started
+            return outcome
+    
+    # Download video using yt-dlp
+    if journal is not None:
+        journal.append(video_id, STARTED, worker=worker)
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    slot = host_limiter.slot(video_url) if host_limiter else None
+    if slot:
+        slot.acquire()
+    try:
+        outcome.update(backend.download(video_url, staging))
+    except Exception:
+        # Settle the STARTED record; the caller turns the exception into a failed outcome
+        if ledger is not None:
+            ledger.record(video_id, FAILED)
+        if journal is not None:
+            journal.append(video_id, FAILED)
+        raise
+    finally:
+        if slot:
+            slot.release()
+    if rate_limiter is not None:
+        rate_limiter.record(outcome["error"] if outcome["status"] == "failed" else None)
+    
+    video_file = find_video_file(staging) if outcome["status"] == "downloaded" else None
+    if video_file and holds_lease is not None and not holds_lease():
+        if journal is not None:
+            journal.append(video_id, FAILED)
+        return lost_outcome(outcome, staging, started)
+    checksum = None
+    if video_file:
+        install(staging, video_dir)
+        video_file = os.path.join(video_dir, os.path.basename(video_file))
+        outcome["bytes"] = os.path.getsize(video_file)
+        if blob_store is not None:
+            checksum = blob_store.add_video(video_id, video_dir).get(os.path.basename(video_file))
+    if ledger is not None:
+        if video_file:
+            ledger.record_file(video_id, video_file, checksum)
+        else:
+            ledger.record(video_id, FAILED)
+    if journal is not None:
+        journal.append(video_id, DOWNLOADED if video_file else FAILED)
+    
+    outcome["elapsed"] = time.monotonic() - started
+    return outcome
+
+def download_videos(videos=None, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, ledger_path=LEDGER_FILE,
+                    backend=None, rate_limiter=None, metrics=None, order=DEFAULT_POLICY, blob_store=None,
+                    journal_path=JOURNAL_FILE, collect=True):
     """
     Download videos and their metadata using yt-dlp
+
+    videos is the list returned by extract_metadata(), or any iterable of
+    entries; when omitted the entries are streamed from the metadata
+    store. A list is ordered as a whole, while other iterables are read
+    as the workers need them and ordered DEFAULT_SCHEDULE_SIZE entries at
+    a time, so memory use stays bounded regardless of channel size. Up
+    to workers downloads run at once, with at most per_host of them
+    against the same host. Videos recorded as downloaded in the ledger at
+    ledger_path are skipped; pass None to disable the ledger. backend is a backends.DownloadBackend and defaults
+    to get_backend(). All workers share rate_limiter, which by default
+    starts at its maximum rate and only slows down once the server
+    throttles. Videos are downloaded in the given order, one of the
+    scheduling.SizeScheduler policies; the default blend starts short
+    videos first so more of them complete per hour, without letting long
+    ones starve. Videos already in blob_store (a blobstore.BlobStore) are
+    linked instead of downloaded. Download times, bytes, outcomes and
+    throttled responses are recorded in metrics. Downloads are journaled
+    to journal_path, and any a crash interrupted are resolved before new
+    ones start (see recover_downloads()). Returns the list of per-video
+    outcomes in listing order, or None on failure. With collect=False only
+    the outcomes of failed downloads are kept and returned.
     """
     print("Starting video downloads...")
     
@@ -21,58 +257,182 @@ def download_videos():
     
     # Read the videos metadata
     try:
-        with open("metadata/videos_metadata.json", "r") as f:
-            videos = json.load(f)
+        if videos is None:
+            videos = iter_metadata(VIDEO)
+        
+        if isinstance(videos, list):
+            print(f"Found {len(videos)} videos to download using {workers} worker(s), {order} order")
+        else:
+            print(f"Downloading videos using {workers} worker(s), {order} order")
+        
+        host_limiter = HostLimiter(per_host)
+        ledger = DownloadLedger(ledger_path) if ledger_path else None
+        journal = DownloadJournal(journal_path) if journal_path else None
+        if journal is not None:
+            recover_downloads(journal, videos_dir, ledger)
+        if rate_limiter is None:
+            rate_limiter = AdaptiveRateLimiter(rate=DEFAULT_MAX_RATE)
+        owns_backend = backend is None
+        if owns_backend:
+            backend = get_backend()
+        scheduler = SizeScheduler(order, maxsize=None if isinstance(videos, list) else DEFAULT_SCHEDULE_SIZE)
+        outcomes = []
+        counts = {}
+        lock = threading.Lock()
         
-        print(f"Found {len(videos)} videos to download")
+        def worker():
+            while True:
+                picked = scheduler.get()
+                if picked is None:
+                    return
+                index, video = picked
+                try:
+                    outcome = download_video(video, videos_dir, backend, host_limiter, ledger, rate_limiter,
+                                             blob_store, journal)
+                except Exception as e:
+                    outcome = failed_outcome(video, e)
+                if metrics is not None:
+                    record_outcome(metrics, outcome)
+                with lock:
+                    counts[outcome["status"]] = counts.get(outcome["status"], 0) + 1
+                    if collect or outcome["status"] == "failed":
+                        outcomes.append((index, outcome))
         
-        # Download each video
-        for i, video in enumerate(videos, 1):
-            video_id = video.get('id')
-            video_title = video.get('title')
-            video_url = video.get('webpage_url')
-            
-            if not video_id or not video_url:
-                print(f"Skipping video {i} due to missing ID or URL")
-                continue
-            
-            print(f"Downloading video {i}/{len(videos)}: {video_title} (ID: {video_id})")
-            
-            # Create video-specific directory
-            video_dir = os.path.join(videos_dir, video_id)
-            os.makedirs(video_dir, exist_ok=True)
-            
-            # Save video metadata
-            with open(os.path.join(video_dir, "metadata.json"), "w") as f:
-                json.dump(video, f, indent=2)
-            
-            # Download video using yt-dlp
-            cmd = [
-                "yt-dlp",
-                "-f", "best",  # Best quality
-                "-o", os.path.join(video_dir, "%(title)s.%(ext)s"),
-                "--write-description",
-                "--write-info-json",
-                "--write-thumbnail",
-                video_url
-            ]
-            
-            try:
-                subprocess.run(cmd, check=True)
-                print(f"Successfully downloaded video: {video_title}")
-            except subprocess.CalledProcessError as e:
-                print(f"Error downloading video {video_title}: {e}")
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                futures = [pool.submit(worker) for _ in range(max(1, workers))]
+                # Entries are read on this thread while the workers download
+                try:
+                    for index, video in enumerate(videos):
+                        scheduler.push(index, (index, video), estimate_size(video))
+                finally:
+                    scheduler.close()
+                for future in futures:
+                    future.result()
+        finally:
+            if ledger is not None:
+                ledger.close()
+            if journal is not None:
+                journal.checkpoint()
+                journal.close()
+            if owns_backend:
+                backend.close()
         
+        outcomes = [outcome for _, outcome in sorted(outcomes, key=lambda item: item[0])]
+        print_outcome_counts(counts, outcomes)
+        stats = rate_limiter.stats()
+        if metrics is not None:
+            record_rate_stats(metrics, stats)
+        print(f"Request rate: {stats['rate']:.2f}/s ({stats['throttles']} throttled responses)")
         print(f"Video download process completed")
-        return True
+        return outcomes
     except Exception as e:
         print(f"Error during video download process: {e}")
-        return False
+        return None
+
+def recover_downloads(journal, videos_dir, ledger=None):
+    """
+    Resolve the downloads a crash left unfinished, by replaying journal
+
+    A download whose staging directory (under the worker named in its
+    STARTED record, see journal.staging_dir()) was already installed in
+    videos_dir only missed its ledger entry, which is recorded now. Any
+    other was cut short and is marked INTERRUPTED; its staging directory
+    is kept so that yt-dlp resumes the partial files on the next attempt.
+    The journal is checkpointed afterwards. Returns the number of
+    downloads completed and interrupted.
+    """
+    completed = interrupted = 0
+    for video_id, record in journal.pending().items():
+        video_file = None
+        if not os.path.isdir(staging_dir(videos_dir, video_id, record.get("worker"))):
+            video_file = find_video_file(os.path.join(videos_dir, video_id))
+        if video_file:
+            if ledger is not None and not ledger.is_downloaded(video_id):
+                ledger.record_file(video_id, video_file)
+            journal.append(video_id, DOWNLOADED)
+            completed += 1
+        else:
+            journal.append(video_id, INTERRUPTED)
+            interrupted += 1
+    journal.checkpoint()
+    if completed or interrupted:
+        print(f"Recovered {completed} completed and {interrupted} interrupted download(s) from {journal.path}")
+    return completed, interrupted
+
+def record_outcomes(metrics, outcomes, rate_stats):
+    """
+    Add the download outcomes and rate limiter statistics to metrics
+    """
+    for outcome in outcomes:
+        record_outcome(metrics, outcome)
+    record_rate_stats(metrics, rate_stats)
+
+def record_rate_stats(metrics, rate_stats):
+    """
+    Add the throttled responses and waits of a rate limiter to metrics
+    """
+    metrics.inc("throttled_total", rate_stats["throttles"])
+    metrics.inc("rate_limit_wait_seconds_total", rate_stats["waited"])
+
+def record_outcome(metrics, outcome):
+    """
+    Add one download outcome to metrics
+    """
+    metrics.inc("videos_total", status=outcome["status"])
+    if outcome["status"] in ("downloaded", "failed"):
+        metrics.observe("download", outcome["elapsed"])
+    metrics.inc("bytes_downloaded_total", outcome["bytes"])
+
+def summarize_outcomes(outcomes):
+    """
+    Print a short summary of the download outcomes
+    """
+    counts = {}
+    for outcome in outcomes:
+        counts[outcome["status"]] = counts.get(outcome["status"], 0) + 1
+    print_outcome_counts(counts, outcomes)
+
+def print_outcome_counts(counts, outcomes):
+    """
+    Print the number of outcomes per status and the failures among outcomes
+    """
+    print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+    for outcome in outcomes:
+        if outcome["status"] == "failed":
+            print(f"Error downloading video {outcome['title']} (ID: {outcome['id']}): {outcome['error']}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Download the videos listed in the metadata file.')
+    parser.add_argument('--workers', '-w', type=positive_int, default=DEFAULT_WORKERS, help='Number of concurrent downloads')
+    parser.add_argument('--per-host', type=positive_int, default=DEFAULT_PER_HOST, help='Maximum concurrent downloads per host')
+    parser.add_argument('--no-ledger', action='store_true', help='Ignore the download ledger and fetch every video')
+    parser.add_argument('--backend', choices=['auto'] + sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help='Use yt-dlp as an in-process library or as a command line tool (default: auto)')
+    parser.add_argument('--max-rate', type=float, default=DEFAULT_MAX_RATE,
+                        help=f'Maximum download requests per second (default: {DEFAULT_MAX_RATE})')
+    parser.add_argument('--order', choices=POLICIES, default=DEFAULT_POLICY,
+                        help=f'Download order by estimated size (default: {DEFAULT_POLICY})')
+    parser.add_argument('--blob-store', metavar='DIR', default=None,
+                        help='Content-addressed store shared with other download trees; videos already in it are linked')
+    args = parser.parse_args()
+    
     print(f"Starting video download process at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    success = download_videos()
-    if success:
+    try:
+        backend = get_backend(args.backend)
+    except BackendError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    blob_store = BlobStore(args.blob_store) if args.blob_store else None
+    with backend:
+        outcomes = download_videos(workers=args.workers, per_host=args.per_host,
+                                   ledger_path=None if args.no_ledger else LEDGER_FILE, backend=backend,
+                                   rate_limiter=AdaptiveRateLimiter(rate=args.max_rate, max_rate=args.max_rate),
+                                   order=args.order, blob_store=blob_store, collect=False)
+    if blob_store is not None:
+        blob_store.close()
+    if outcomes is not None:
         print("Successfully downloaded videos and metadata")
     else:
         print("Failed to download videos and metadata")
@@ -3,14 +3,77 @@
 Script to extract and process video metadata from the YouTube channel
 """
 
+import argparse
 import json
 import os
+import shutil
 import sys
+import tempfile
+from contextlib import ExitStack
 from datetime import datetime
 
-def extract_metadata():
+from channel_info import RAW_INFO_FILE
+from jsonstream import iter_json_array
+from metadata_store import MetadataStore, METADATA_STORE_FILE, VIDEO, SHORT
+from metrics import Metrics
+from shorts import ShortClassifier
+
+VIDEOS_METADATA_FILE = "metadata/videos_metadata.json"
+SHORTS_METADATA_FILE = "metadata/shorts_metadata.json"
+
+def iter_raw_entries(path=RAW_INFO_FILE):
+    """
+    Yield entries from a raw flat-playlist listing (one JSON object per line)
+    """
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_metadata(kind=VIDEO, fields=None):
+    """
+    Yield the extracted videos or shorts (kind is VIDEO or SHORT)
+
+    Entries are read from METADATA_STORE_FILE, falling back to the JSON
+    files written by older runs or with json_export. fields limits the
+    keys of each entry. Only one entry is held in memory at a time.
+    """
+    if os.path.exists(METADATA_STORE_FILE):
+        with MetadataStore() as store:
+            yield from store.iter_entries(kind, fields)
+        return
+    
+    for entry in iter_json_array(VIDEOS_METADATA_FILE if kind == VIDEO else SHORTS_METADATA_FILE):
+        if fields is not None:
+            entry = {field: entry[field] for field in fields if field in entry}
+        yield entry
+
+def load_metadata(kind=VIDEO, fields=None):
+    """
+    Load the extracted videos or shorts as a list; see iter_metadata()
+    """
+    return list(iter_metadata(kind, fields))
+
+def extract_metadata(entries=None, checkpoint=True, collect=True, classifier=None, json_export=False, metrics=None,
+                     incremental=False):
     """
     Extract and process video metadata from the raw channel information
+
+    entries is any iterable of flat-playlist entries, such as the stream
+    from iter_channel_entries(); when omitted it is read back from
+    RAW_INFO_FILE. Each entry is classified and written out as soon as it
+    arrives. Returns a (videos, shorts) tuple, or None on failure. When
+    checkpoint is set the entries are also saved to METADATA_STORE_FILE,
+    and with json_export to VIDEOS_METADATA_FILE and SHORTS_METADATA_FILE
+    as well. With collect=False the returned lists are empty and memory
+    use stays bounded regardless of channel size. Shorts are detected with
+    classifier, a shorts.ShortClassifier. The wait for each entry and its
+    classification are recorded as the "metadata" and "classification"
+    phases in metrics. With incremental set, entries holds only the new
+    uploads: they are added to the existing store ahead of the earlier
+    entries instead of replacing them, and the summary file is written
+    from the whole store. The returned lists and counts cover the new
+    entries only.
     """
     print("Extracting video metadata...")
     
@@ -18,74 +81,156 @@ def extract_metadata():
     os.makedirs("metadata/videos", exist_ok=True)
     os.makedirs("metadata/shorts", exist_ok=True)
     
-    # Read the raw channel info
     try:
-        with open("metadata/channel_raw_info.json", "r") as f:
-            lines = f.readlines()
+        if entries is None:
+            entries = iter_raw_entries()
+        if classifier is None:
+            classifier = ShortClassifier()
+        if metrics is None:
+            metrics = Metrics()
         
-        # Process each line (each line is a JSON object)
         videos = []
         shorts = []
         
-        for line in lines:
-            if not line.strip():
-                continue
-                
-            data = json.loads(line)
+        with ExitStack() as stack:
+            summary = stack.enter_context(SummaryWriter("metadata/summary.txt"))
+            merge = incremental and checkpoint
+            if checkpoint:
+                store = stack.enter_context(MetadataStore())
+                if merge:
+                    marker = store.mark()
+                else:
+                    store.clear()
             
-            # Determine if it's a video or a short
-            if "shorts" in data.get("webpage_url", "").lower():
-                shorts.append(data)
-            else:
-                videos.append(data)
-        
-        # Save processed metadata
-        with open("metadata/videos_metadata.json", "w") as f:
-            json.dump(videos, f, indent=2)
+            video_count = short_count = 0
+            for data in metrics.timed(entries, "metadata"):
+                # Determine if it's a video or a short
+                with metrics.phase("classification"):
+                    is_short = classifier.classify(data)
+                
+                if is_short:
+                    short_count += 1
+                    if not merge:
+                        summary.add_short(data)
+                else:
+                    video_count += 1
+                    if not merge:
+                        summary.add_video(data)
+                
+                if checkpoint:
+                    store.add(data, SHORT if is_short else VIDEO)
+                
+                if collect:
+                    (shorts if is_short else videos).append(data)
             
-        with open("metadata/shorts_metadata.json", "w") as f:
-            json.dump(shorts, f, indent=2)
+            if merge:
+                store.move_to_front(marker)
+                summarize_store(summary, store)
             
-        # Create a summary file with key information
-        create_summary(videos, shorts)
+            if checkpoint and json_export:
+                store.export_json(VIDEOS_METADATA_FILE, VIDEO)
+                store.export_json(SHORTS_METADATA_FILE, SHORT)
+        
+        metrics.inc("entries_total", video_count, kind=VIDEO)
+        metrics.inc("entries_total", short_count, kind=SHORT)
+        metrics.inc("classification_probes_total", classifier.probes)
         
-        print(f"Found {len(videos)} videos and {len(shorts)} shorts")
-        print(f"Metadata extracted and saved to metadata/videos_metadata.json and metadata/shorts_metadata.json")
+        new = "new " if incremental else ""
+        print(f"Found {video_count} {new}videos and {short_count} {new}shorts")
+        if checkpoint:
+            print(f"Metadata extracted and saved to {METADATA_STORE_FILE}")
+        if checkpoint and json_export:
+            print(f"Metadata exported to {VIDEOS_METADATA_FILE} and {SHORTS_METADATA_FILE}")
         
-        return True
+        return videos, shorts
     except Exception as e:
         print(f"Error extracting metadata: {e}")
+        return None
+
+class SummaryWriter:
+    """
+    Writes the summary file with key information about videos and shorts
+
+    Totals go at the top of the file, so both sections are spooled to
+    temporary files and copied in after the counts are known.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.video_count = 0
+        self.short_count = 0
+    
+    def __enter__(self):
+        self._videos = tempfile.TemporaryFile(mode="w+")
+        self._shorts = tempfile.TemporaryFile(mode="w+")
+        return self
+    
+    def add_video(self, video):
+        self.video_count += 1
+        f = self._videos
+        f.write(f"{self.video_count}. {video.get('title', 'Unknown Title')} (ID: {video.get('id', 'Unknown ID')})\n")
+        f.write(f"   Duration: {video.get('duration_string', 'Unknown')}\n")
+        f.write(f"   URL: {video.get('webpage_url', 'Unknown URL')}\n")
+        f.write(f"   Views: {video.get('view_count', 'Unknown')}\n")
+        f.write(f"   Description: {video.get('description', 'No description')}\n\n")
+    
+    def add_short(self, short):
+        self.short_count += 1
+        f = self._shorts
+        f.write(f"{self.short_count}. {short.get('title', 'Unknown Title')} (ID: {short.get('id', 'Unknown ID')})\n")
+        f.write(f"   URL: {short.get('webpage_url', 'Unknown URL')}\n")
+        f.write(f"   Views: {short.get('view_count', 'Unknown')}\n\n")
+    
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                with open(self.path, "w") as f:
+                    f.write(f"Channel: VK-STREAMING (@vk-streaming3526)\n")
+                    f.write(f"Extraction date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+                    
+                    f.write(f"Total videos: {self.video_count}\n")
+                    f.write(f"Total shorts: {self.short_count}\n\n")
+                    
+                    f.write("=== VIDEOS ===\n")
+                    self._videos.seek(0)
+                    shutil.copyfileobj(self._videos, f)
+                    
+                    f.write("=== SHORTS ===\n")
+                    self._shorts.seek(0)
+                    shutil.copyfileobj(self._shorts, f)
+        finally:
+            self._videos.close()
+            self._shorts.close()
         return False
 
+def summarize_store(summary, store):
+    """
+    Add every video and short in store, a MetadataStore, to summary
+    """
+    for video in store.iter_entries(VIDEO):
+        summary.add_video(video)
+    for short in store.iter_entries(SHORT):
+        summary.add_short(short)
+
 def create_summary(videos, shorts):
     """
     Create a summary file with key information about videos and shorts
     """
-    with open("metadata/summary.txt", "w") as f:
-        f.write(f"Channel: VK-STREAMING (@vk-streaming3526)\n")
-        f.write(f"Extraction date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        
-        f.write(f"Total videos: {len(videos)}\n")
-        f.write(f"Total shorts: {len(shorts)}\n\n")
-        
-        f.write("=== VIDEOS ===\n")
-        for i, video in enumerate(videos, 1):
-            f.write(f"{i}. {video.get('title', 'Unknown Title')} (ID: {video.get('id', 'Unknown ID')})\n")
-            f.write(f"   Duration: {video.get('duration_string', 'Unknown')}\n")
-            f.write(f"   URL: {video.get('webpage_url', 'Unknown URL')}\n")
-            f.write(f"   Views: {video.get('view_count', 'Unknown')}\n")
-            f.write(f"   Description: {video.get('description', 'No description')}\n\n")
-        
-        f.write("=== SHORTS ===\n")
-        for i, short in enumerate(shorts, 1):
-            f.write(f"{i}. {short.get('title', 'Unknown Title')} (ID: {short.get('id', 'Unknown ID')})\n")
-            f.write(f"   URL: {short.get('webpage_url', 'Unknown URL')}\n")
-            f.write(f"   Views: {short.get('view_count', 'Unknown')}\n\n")
+    with SummaryWriter("metadata/summary.txt") as summary:
+        for video in videos:
+            summary.add_video(video)
+        for short in shorts:
+            summary.add_short(short)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Classify the raw channel listing into videos and shorts.')
+    parser.add_argument('--json', action='store_true',
+                        help=f'Also export {VIDEOS_METADATA_FILE} and {SHORTS_METADATA_FILE}')
+    args = parser.parse_args()
+    
     print(f"Starting metadata extraction at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    success = extract_metadata()
-    if success:
+    result = extract_metadata(collect=False, json_export=args.json)
+    if result is not None:
         print("Successfully extracted video metadata")
     else:
         print("Failed to extract video metadata")
@@ -0,0 +1,172 @@
+
+"""
+Write-ahead journal of download state transitions
+
+Downloads are written to a staging directory and renamed into place once
+complete, so a directory under downloads/videos/ always holds a finished
+download. The journal records when each download starts and how it ends,
+so after a crash the interrupted downloads can be found by replaying the
+journal instead of scanning the download tree.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+JOURNAL_FILE = "downloads/journal.jsonl"
+
+# States recorded in the journal, besides the ledger's DOWNLOADED and FAILED
+STARTED = "started"
+INTERRUPTED = "interrupted"
+
+def staging_dir(videos_dir, video_id, worker=None):
+    """
+    Return the directory a video is downloaded to before it is installed
+
+    It sits next to videos_dir, on the same file system, so install() can
+    rename it into place. With worker set it is kept under a directory of
+    that worker's own, so processes sharing videos_dir never download into
+    the same staging directory.
+    """
+    partial = os.path.join(os.path.dirname(os.path.abspath(videos_dir)), "partial")
+    if worker is not None:
+        partial = os.path.join(partial, re.sub(r"[^\w.-]", "_", worker))
+    return os.path.join(partial, video_id)
+
+def install(staging, video_dir):
+    """
+    Atomically move a finished staging directory to video_dir
+
+    An existing video_dir (from an earlier, incomplete attempt or a forced
+    re-download) is moved aside first and removed afterwards. The rename is
+    flushed to disk before returning, so it is durable before the ledger and
+    journal record the download.
+    """
+    old = f"{staging}.old"
+    if os.path.isdir(old):
+        shutil.rmtree(old)
+    replaced = os.path.isdir(video_dir)
+    if replaced:
+        os.replace(video_dir, old)
+    os.replace(staging, video_dir)
+    fsync_dir(os.path.dirname(os.path.abspath(video_dir)))
+    if replaced:
+        shutil.rmtree(old, ignore_errors=True)
+
+def fsync_dir(path):
+    """
+    Flush a directory entry change, such as a rename, to disk where supported
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # Windows cannot open directories
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class DownloadJournal:
+    """
+    Append-only JSON Lines log of download state transitions
+
+    Each line records one transition of one video: STARTED before its
+    download begins (with the worker whose staging directory it uses), then DOWNLOADED once it is installed and in the ledger,
+    FAILED, or INTERRUPTED when recovery finds it was cut short. Every
+    line is flushed and fsynced before the transition takes effect.
+    pending() replays the log and returns the videos whose last transition
+    is STARTED, i.e. the downloads a crash interrupted. checkpoint()
+    rewrites the log with only those entries, so it stays as small as the
+    number of downloads in flight and replaying it takes the same time for
+    any archive size. A line torn by a crash during a write is skipped.
+    Safe to share between threads, but not between processes.
+    """
+    
+    def __init__(self, path=JOURNAL_FILE, sync=True):
+        self.path = path
+        self.sync = sync
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        # Terminate a line torn by a crash so the next record starts on its own line
+        if self._file.tell() and not self._ends_with_newline():
+            self._write("\n")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def _write(self, line):
+        self._file.write(line)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+    
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+    
+    def _replay(self):
+        last = {}
+        self._file.flush()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A write torn by a crash, never acknowledged
+                    continue
+                last.pop(record["id"], None)
+                last[record["id"]] = record
+        return last
+    
+    def append(self, video_id, state, **fields):
+        """
+        Durably record that video_id entered state
+        """
+        record = dict(fields, id=video_id, state=state, at=time.time())
+        with self._lock:
+            self._write(json.dumps(record, separators=(",", ":")) + "\n")
+    
+    def replay(self):
+        """
+        Return the last journal record of every video, in journal order
+        """
+        with self._lock:
+            return self._replay()
+    
+    def pending(self):
+        """
+        Return {video_id: record} for the downloads that were started but never finished
+        """
+        return {video_id: record for video_id, record in self.replay().items() if record["state"] == STARTED}
+    
+    def checkpoint(self):
+        """
+        Rewrite the journal with only the records of downloads still in flight
+        """
+        tmp = f"{self.path}.tmp"
+        with self._lock:
+            records = [record for record in self._replay().values() if record["state"] == STARTED]
+            with open(tmp, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp, self.path)
+            fsync_dir(os.path.dirname(os.path.abspath(self.path)))
+            self._file = open(self.path, "a", encoding="utf-8")
+    
+    def close(self):
+        with self._lock:
+            self._file.close()
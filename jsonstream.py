@@ -0,0 +1,105 @@
+
+"""
+Helpers to write large JSON files incrementally
+"""
+
+import json
+import os
+
+WHITESPACE = " \t\n\r"
+
+class JsonArrayWriter:
+    """
+    Writes a JSON array one element at a time
+
+    The output matches json.dump(items, f, indent=indent), but only the
+    element currently being written is held in memory. The array is written
+    to a temporary file that replaces path only when the with block exits
+    without an exception, so an interrupted run leaves the previous file.
+    """
+    
+    def __init__(self, path, indent=2):
+        self.path = path
+        self.indent = indent
+        self.count = 0
+        self._file = None
+    
+    def __enter__(self):
+        self._file = open(self.path + ".tmp", "w")
+        self._file.write("[")
+        return self
+    
+    def write(self, item):
+        """
+        Append one element to the array
+        """
+        pad = " " * self.indent
+        text = json.dumps(item, indent=self.indent).replace("\n", "\n" + pad)
+        self._file.write(("," if self.count else "") + "\n" + pad + text)
+        self.count += 1
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._file.close()
+            os.remove(self.path + ".tmp")
+            return False
+        self._file.write("\n]" if self.count else "]")
+        self._file.close()
+        os.replace(self.path + ".tmp", self.path)
+        return False
+
+def iter_json_array(path, chunk_size=64 * 1024):
+    """
+    Yield the elements of the JSON array in path one at a time
+
+    The file is read in chunks of chunk_size characters, so memory use is
+    bounded by the largest single element rather than the file size.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buf, pos, eof = "", 0, False
+        
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            return not eof
+        
+        def next_char():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in WHITESPACE:
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if not fill():
+                    raise ValueError(f"{path}: unexpected end of JSON array")
+        
+        if next_char() != "[":
+            raise ValueError(f"{path}: expected a JSON array")
+        pos += 1
+        if next_char() == "]":
+            return
+        while True:
+            next_char()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    item = end = None
+                # A value must be followed by a separator, otherwise it may be
+                # a truncated number that continues in the next chunk
+                if end is not None and (eof or (end < len(buf) and buf[end] in WHITESPACE + ",]")):
+                    break
+                if not fill():
+                    raise ValueError(f"{path}: unexpected end of JSON array")
+            pos = end
+            yield item
+            
+            separator = next_char()
+            pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"{path}: expected ',' or ']' in JSON array")
@@ -0,0 +1,131 @@
+
+"""
+Persistent ledger of downloaded videos, keyed by video ID
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from checksums import file_checksum
+
+LEDGER_FILE = "downloads/ledger.sqlite3"
+
+# Statuses recorded in the ledger
+DOWNLOADED = "downloaded"
+FAILED = "failed"
+SHORT = "short"
+
+class DownloadLedger:
+    """
+    SQLite-backed record of every video the downloaders have processed
+
+    Each row holds the status, size in bytes, checksum and first/last
+    update timestamps of one video. Statuses are also kept in an in-memory
+    dict, so lookups never touch the database and can be made before any
+    network or subprocess work. The ledger can be shared between threads.
+    """
+    
+    def __init__(self, path=LEDGER_FILE):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        # Several work queue processes may write at once; wait for the lock like WorkQueue does
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            " video_id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " bytes INTEGER,"
+            " checksum TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._status = dict(self._conn.execute("SELECT video_id, status FROM videos"))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def __len__(self):
+        return len(self._status)
+    
+    def __contains__(self, video_id):
+        return video_id in self._status
+    
+    def status(self, video_id):
+        """
+        Return the recorded status of a video, or None if it is unknown
+        """
+        return self._status.get(video_id)
+    
+    def ids(self):
+        """
+        Return the set of every video ID in the ledger
+        """
+        return set(self._status)
+    
+    def settled_ids(self):
+        """
+        Return the set of video IDs that need no further work: downloaded videos and shorts
+
+        Failed videos are left out so that incremental runs retry them.
+        """
+        return {video_id for video_id, status in self._status.items() if status in (DOWNLOADED, SHORT)}
+    
+    def is_downloaded(self, video_id):
+        """
+        Return True if the video has been fully downloaded
+        """
+        return self._status.get(video_id) == DOWNLOADED
+    
+    def get(self, video_id):
+        """
+        Return the full ledger row for a video as a dict, or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT video_id, status, bytes, checksum, created_at, updated_at FROM videos WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("video_id", "status", "bytes", "checksum", "created_at", "updated_at"), row))
+    
+    def record(self, video_id, status, size=None, checksum=None):
+        """
+        Insert or update the ledger row for a video
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO videos (video_id, status, bytes, checksum, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(video_id) DO UPDATE SET"
+                " status = excluded.status, bytes = excluded.bytes,"
+                " checksum = excluded.checksum, updated_at = excluded.updated_at",
+                (video_id, status, size, checksum, now, now)
+            )
+            self._conn.commit()
+            self._status[video_id] = status
+    
+    def record_file(self, video_id, path, checksum=None):
+        """
+        Record a video as downloaded, with the size and checksum of path
+
+        Pass checksum when it is already known to avoid hashing the file again.
+        """
+        self.record(video_id, DOWNLOADED, os.path.getsize(path), checksum or file_checksum(path))
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
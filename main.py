@@ -6,9 +6,20 @@ Main script for  YouTube IPLABS Video Downloader application
 import argparse
 import os
 import sys
-import subprocess
 from datetime import datetime
 
+from backends import BACKENDS, DEFAULT_BACKEND, BackendError, get_backend
+from blobstore import BlobStore
+from channel_info import iter_channel_entries, iter_new_entries, DEFAULT_STOP_AFTER
+from extract_metadata import extract_metadata
+from download_videos import download_videos, positive_int, DEFAULT_WORKERS, DEFAULT_PER_HOST
+from scheduling import POLICIES, DEFAULT_POLICY
+from streaming import run_streaming_pipeline
+from verify_downloads import organize_and_verify
+from create_summary import create_summary_report
+from ledger import DownloadLedger, SHORT
+from metrics import Metrics, METRICS_FILE, PROMETHEUS_FILE
+
 def main():
     """
     Main function to run the YouTube Video Downloader application
@@ -16,6 +27,23 @@ def main():
     parser = argparse.ArgumentParser(description='Download videos from a YouTube channel, excluding shorts.')
     parser.add_argument('channel_url', nargs='?', default="https://www.youtube.com/@vk-streaming3526",
                         help='YouTube channel URL (default: https://www.youtube.com/@vk-streaming3526)')
+    parser.add_argument('--no-checkpoint', action='store_true',
+                        help='Pass results between stages in memory only, without writing the intermediate JSON files')
+    parser.add_argument('--workers', '-w', type=positive_int, default=DEFAULT_WORKERS,
+                        help=f'Number of concurrent video downloads (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--per-host', type=positive_int, default=DEFAULT_PER_HOST,
+                        help=f'Maximum concurrent downloads per host (default: {DEFAULT_PER_HOST})')
+    parser.add_argument('--incremental', type=int, nargs='?', const=DEFAULT_STOP_AFTER, metavar='N',
+                        help='Only process new uploads: stop listing the channel after N consecutive videos '
+                             f'already in the download ledger (default N: {DEFAULT_STOP_AFTER})')
+    parser.add_argument('--backend', choices=['auto'] + sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help='Use yt-dlp as an in-process library or as a command line tool (default: auto)')
+    parser.add_argument('--order', choices=POLICIES, default=DEFAULT_POLICY,
+                        help=f'Download order by estimated size (default: {DEFAULT_POLICY})')
+    parser.add_argument('--staged', action='store_true',
+                        help='Finish each stage before starting the next instead of streaming videos through them')
+    parser.add_argument('--blob-store', metavar='DIR', default=None,
+                        help='Content-addressed store shared with other download trees; videos already in it are linked')
     args = parser.parse_args()
     
     channel_url = args.channel_url
@@ -26,60 +54,115 @@ def main():
     print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print()
     
-    # Step 1: Access the YouTube channel
-    print("Step 1: Accessing YouTube channel...")
-    result = run_script("channel_info.py")
-    if not result:
-        print("Failed to access YouTube channel. Exiting.")
+    try:
+        backend = get_backend(args.backend)
+    except BackendError as e:
+        print(f"Error: {e}")
         sys.exit(1)
+    
+    metrics = Metrics()
+    pipeline = run_pipeline if args.staged else run_streaming_pipeline
+    blob_store = BlobStore(args.blob_store) if args.blob_store else None
+    try:
+        with backend:
+            succeeded = pipeline(channel_url, checkpoint=not args.no_checkpoint, workers=args.workers,
+                                 per_host=args.per_host, incremental=args.incremental, backend=backend,
+                                 metrics=metrics, order=args.order, blob_store=blob_store)
+    finally:
+        if blob_store is not None:
+            blob_store.close()
+        metrics.write()
+        print(f"Metrics written to {METRICS_FILE} and {PROMETHEUS_FILE}")
+    if not succeeded:
+        sys.exit(1)
+    
+    print(f"Download process completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Results are available in the following directories:")
+    print(f"  - Downloaded videos: {os.path.abspath('downloads/videos')}")
+    print(f"  - Reports: {os.path.abspath('reports')}")
     print()
+    print("Thank you for using IPLABS YouTube Video Downloader!")
+
+def run_pipeline(channel_url, checkpoint=True, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, incremental=None,
+                 backend=None, metrics=None, order=DEFAULT_POLICY, blob_store=None):
+    """
+    Run every stage in-process, passing each stage's output to the next
+
+    When checkpoint is set each stage also writes its intermediate checkpoint
+    so the stage scripts can still be run on their own afterwards. When
+    incremental is set to N, listing stops after N consecutive videos that
+    are already in the download ledger and only the new uploads go through
+    the later stages; with checkpoint set they are merged into the earlier
+    checkpoints, so the reports still cover the whole channel. The same
+    yt-dlp backend (see backends.py) is used for listing and downloading.
+    Videos are downloaded in the given order (see
+    scheduling.SizeScheduler); videos already in blob_store (a
+    blobstore.BlobStore) are linked instead of downloaded. Stage durations
+    and per-video phase timings are recorded in metrics. Returns False if a required stage failed.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    
+    # Steps 1 and 2: the channel listing is streamed straight into metadata
+    # extraction, so each entry is classified as soon as yt-dlp prints it
+    print("Step 1: Accessing YouTube channel...")
+    if backend is None:
+        backend = get_backend()
+    entries = iter_channel_entries(channel_url, checkpoint=checkpoint, lazy=bool(incremental), backend=backend,
+                                   merge=bool(incremental))
+    if incremental:
+        with DownloadLedger() as ledger:
+            entries = iter_new_entries(entries, ledger.settled_ids(), incremental)
     
-    # Step 2: Extract video metadata
     print("Step 2: Extracting video metadata...")
-    result = run_script("extract_metadata.py")
-    if not result:
-        print("Failed to extract video metadata. Exiting.")
-        sys.exit(1)
+    with metrics.stage("list_and_extract"):
+        result = extract_metadata(entries, checkpoint=checkpoint, metrics=metrics, incremental=bool(incremental))
+    if result is None:
+        print("Failed to access YouTube channel or extract video metadata. Exiting.")
+        return False
+    videos, shorts = result
+    
+    # Remember listed shorts so they count as known on incremental runs
+    with DownloadLedger() as ledger:
+        for short in shorts:
+            if short.get('id') not in ledger:
+                ledger.record(short.get('id'), SHORT)
     print()
     
     # Step 3: Download videos and metadata
     print("Step 3: Downloading videos and metadata...")
-    result = run_script("download_videos.py")
-    if not result:
+    with metrics.stage("download"):
+        outcomes = download_videos(videos, workers=workers, per_host=per_host, backend=backend, metrics=metrics,
+                                   order=order, blob_store=blob_store)
+    if outcomes is None:
         print("Failed to download videos. Exiting.")
-        sys.exit(1)
+        return False
     print()
     
     # Step 4: Verify downloads
     print("Step 4: Verifying downloads...")
-    result = run_script("verify_downloads.py")
-    if not result:
+    with metrics.stage("verify"):
+        verification_results = organize_and_verify(videos, checkpoint=checkpoint, metrics=metrics,
+                                                   keep_previous=bool(incremental))
+    if verification_results is None or not all(r["verified"] for r in verification_results):
         print("Warning: Some videos failed verification.")
     print()
     
     # Step 5: Create summary report
     print("Step 5: Creating summary report...")
-    result = run_script("create_summary.py")
-    if not result:
+    with metrics.stage("summary"):
+        if verification_results is None:
+            reported = False
+        elif incremental and checkpoint:
+            # The checkpoint files cover the whole channel, not just the new uploads
+            reported = create_summary_report()
+        else:
+            reported = create_summary_report(videos, shorts, verification_results)
+    if not reported:
         print("Failed to create summary report.")
     print()
     
-    print(f"Download process completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Results are available in the following directories:")
-    print(f"  - Downloaded videos: {os.path.abspath('downloads/videos')}")
-    print(f"  - Reports: {os.path.abspath('reports')}")
-    print()
-    print("Thank you for using IPLABS YouTube Video Downloader!")
-
-def run_script(script_name):
-    """
-    Run a Python script and return True if successful, False otherwise
-    """
-    try:
-        subprocess.run(["python", script_name], check=True)
-        return True
-    except subprocess.CalledProcessError:
-        return False
+    return True
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,185 @@
+
+"""
+Persistent per-video metadata cache with per-field TTLs and LRU eviction
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_FILE = "metadata/metadata_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 100000
+
+# Field classes and how long each stays fresh, in seconds
+IMMUTABLE = "immutable"
+MUTABLE = "mutable"
+VOLATILE = "volatile"
+
+DEFAULT_TTLS = {
+    IMMUTABLE: 30 * 24 * 3600,
+    MUTABLE: 24 * 3600,
+    VOLATILE: 3600,
+}
+
+FIELD_CLASSES = {
+    "views": VOLATILE,
+    "view_count": VOLATILE,
+    "like_count": VOLATILE,
+    "comment_count": VOLATILE,
+    "description": MUTABLE,
+    "keywords": MUTABLE,
+    "tags": MUTABLE,
+    "thumbnails": MUTABLE,
+}
+
+def field_class(field):
+    """
+    Return the class of a metadata field; unlisted fields are immutable
+    """
+    return FIELD_CLASSES.get(field, IMMUTABLE)
+
+class MetadataCache:
+    """
+    SQLite-backed cache of video metadata keyed by video ID
+
+    Each video's fields are stored in groups by class, and each group
+    expires after its own TTL, so a title stays cached for weeks while a
+    view count is refreshed hourly. At most max_entries videos are kept;
+    the least recently used are evicted first. Hit, partial hit, miss and
+    eviction counts are exposed through stats(). Safe to share between
+    threads, but not between processes: the entry count is kept in memory.
+    """
+    
+    def __init__(self, path=CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES, ttls=None, clock=time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._clock = clock
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS fields ("
+            " video_id TEXT NOT NULL,"
+            " field_class TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " PRIMARY KEY (video_id, field_class));"
+            "CREATE TABLE IF NOT EXISTS access ("
+            " video_id TEXT PRIMARY KEY,"
+            " accessed_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS access_lru ON access (accessed_at);"
+        )
+        self._conn.commit()
+        # Kept up to date by put() and _evict() so a put does not count the table
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM access").fetchone()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def lookup(self, video_id, classes=(IMMUTABLE, MUTABLE, VOLATILE)):
+        """
+        Return (metadata, stale): the cached fields of the fresh classes among
+        classes, and the set of classes that are missing or expired
+
+        The caller refetches only the stale classes and put()s them back. A
+        lookup with nothing stale counts as a hit, one with some classes fresh
+        as a partial hit and one with none fresh as a miss.
+        """
+        now = self._clock()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT field_class, data, fetched_at FROM fields WHERE video_id = ?", (video_id,)
+            ).fetchall()
+            fresh = {cls: data for cls, data, fetched_at in rows if now - fetched_at <= self.ttls[cls]}
+            stale = {cls for cls in classes if cls not in fresh}
+            if len(stale) == len(classes):
+                self.misses += 1
+                return {}, stale
+            if stale:
+                self.partial_hits += 1
+            else:
+                self.hits += 1
+            self._conn.execute("UPDATE access SET accessed_at = ? WHERE video_id = ?", (now, video_id))
+            self._conn.commit()
+        
+        metadata = {}
+        for cls in classes:
+            if cls in fresh:
+                metadata.update(json.loads(fresh[cls]))
+        return metadata, stale
+    
+    def get(self, video_id, classes=(IMMUTABLE, MUTABLE, VOLATILE)):
+        """
+        Return the cached metadata of a video, or None unless every class in
+        classes is present and fresh
+        """
+        metadata, stale = self.lookup(video_id, classes)
+        return None if stale else metadata
+    
+    def put(self, video_id, metadata, classes=None):
+        """
+        Store the metadata of a video, refreshing every field class it contains
+
+        Classes listed in classes (every class by default) are refreshed even
+        if metadata has no fields in them; other classes keep their cached
+        fields and age.
+        """
+        groups = {cls: {} for cls in (self.ttls if classes is None else classes)}
+        for field, value in metadata.items():
+            groups.setdefault(field_class(field), {})[field] = value
+        
+        now = self._clock()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fields (video_id, field_class, data, fetched_at) VALUES (?, ?, ?, ?)",
+                [(video_id, cls, json.dumps(data), now) for cls, data in groups.items()]
+            )
+            known = self._conn.execute("SELECT 1 FROM access WHERE video_id = ?", (video_id,)).fetchone()
+            if known is None:
+                self._entries += 1
+            self._conn.execute("INSERT OR REPLACE INTO access (video_id, accessed_at) VALUES (?, ?)", (video_id, now))
+            self._evict()
+            self._conn.commit()
+    
+    def _evict(self):
+        excess = self._entries - self.max_entries
+        if excess <= 0:
+            return
+        victims = [row[0] for row in self._conn.execute(
+            "SELECT video_id FROM access ORDER BY accessed_at LIMIT ?", (excess,))]
+        self._conn.executemany("DELETE FROM fields WHERE video_id = ?", [(v,) for v in victims])
+        self._conn.executemany("DELETE FROM access WHERE video_id = ?", [(v,) for v in victims])
+        self._entries -= len(victims)
+        self.evictions += len(victims)
+    
+    def stats(self):
+        """
+        Return hit, miss and eviction counters and the number of cached videos
+        """
+        total = self.hits + self.partial_hits + self.misses
+        return {
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "entries": self._entries,
+        }
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,205 @@
+
+"""
+Compact SQLite store for the extracted channel metadata
+"""
+
+import json
+import os
+import sqlite3
+
+from jsonstream import JsonArrayWriter
+
+METADATA_STORE_FILE = "metadata/metadata.sqlite3"
+
+# Entry kinds
+VIDEO = "video"
+SHORT = "short"
+
+# Fields stored in typed columns; everything else goes to a compact JSON blob
+COLUMNS = {
+    "id": "TEXT PRIMARY KEY",
+    "title": "TEXT",
+    "duration": "REAL",
+    "view_count": "INTEGER",
+    "webpage_url": "TEXT",
+}
+
+BATCH_SIZE = 1000
+
+def compact_entry(entry):
+    """
+    Return a copy of a flat-playlist entry without redundant data
+
+    Null fields and yt-dlp internals ("__x_forwarded_for_ip", "_version")
+    are dropped, and the thumbnails list, which repeats long signed URLs
+    at every size, is reduced to the URL of the largest one.
+    """
+    compact = {}
+    for field, value in entry.items():
+        if value is None or field.startswith("__") or field == "_version":
+            continue
+        if field == "thumbnails":
+            if value:
+                largest = max(value, key=lambda t: (t.get("width") or 0) * (t.get("height") or 0))
+                compact.setdefault("thumbnail", largest.get("url"))
+            continue
+        compact[field] = value
+    return compact
+
+class MetadataStore:
+    """
+    SQLite-backed store of video and short entries
+
+    id, title, duration, view_count and webpage_url live in typed columns
+    and the remaining fields of each entry in a compact JSON blob, so
+    readers that project onto the typed columns never parse JSON. Entries
+    keep their listing order and can be looked up by ID. Writes are
+    batched; call close() (or use the store as a context manager) to
+    flush them.
+    """
+    
+    def __init__(self, path=METADATA_STORE_FILE):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._pending = []
+        columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+        self._conn.executescript(
+            f"CREATE TABLE IF NOT EXISTS entries ({columns},"
+            " kind TEXT NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " extra TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS entries_order ON entries (kind, position);"
+        )
+        self._conn.commit()
+        row = self._conn.execute("SELECT MAX(position) FROM entries").fetchone()
+        self._position = (row[0] + 1) if row[0] is not None else 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def clear(self):
+        """
+        Remove every entry
+        """
+        self._pending = []
+        self._conn.execute("DELETE FROM entries")
+        self._conn.commit()
+        self._position = 0
+    
+    def add(self, entry, kind=VIDEO):
+        """
+        Add or replace an entry of the given kind (VIDEO or SHORT)
+        """
+        entry = compact_entry(entry)
+        row = [entry.pop(name, None) for name in COLUMNS]
+        row += [kind, self._position, json.dumps(entry, separators=(",", ":"))]
+        self._position += 1
+        self._pending.append(row)
+        if len(self._pending) >= BATCH_SIZE:
+            self.flush()
+    
+    def flush(self):
+        """
+        Write batched entries to disk
+        """
+        if self._pending:
+            placeholders = ", ".join("?" * (len(COLUMNS) + 3))
+            self._conn.executemany(f"INSERT OR REPLACE INTO entries VALUES ({placeholders})", self._pending)
+            self._conn.commit()
+            self._pending = []
+    
+    def mark(self):
+        """
+        Return a marker for the entries added from now on, for move_to_front()
+        """
+        return self._position
+    
+    def move_to_front(self, marker):
+        """
+        Move the entries added since marker ahead of every older entry
+
+        Their relative order is kept. An incremental listing yields only the
+        newest uploads, which belong at the head of the listing order.
+        """
+        self.flush()
+        (first,) = self._conn.execute("SELECT MIN(position) FROM entries WHERE position < ?", (marker,)).fetchone()
+        if first is None:
+            return
+        added = self._position - marker
+        self._conn.execute("UPDATE entries SET position = position - ? WHERE position >= ?",
+                           (marker - first + added, marker))
+        self._conn.commit()
+    
+    def count(self, kind=None):
+        """
+        Return the number of stored entries, optionally of one kind
+        """
+        self.flush()
+        if kind is None:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return self._conn.execute("SELECT COUNT(*) FROM entries WHERE kind = ?", (kind,)).fetchone()[0]
+    
+    def _select(self, fields):
+        columns = list(COLUMNS) if fields is None else [f for f in fields if f in COLUMNS]
+        with_extra = fields is None or any(f not in COLUMNS for f in fields)
+        return columns, with_extra, ", ".join(columns + (["extra"] if with_extra else [])) or "id"
+    
+    def _row_to_entry(self, row, columns, with_extra, fields):
+        entry = {name: value for name, value in zip(columns, row) if value is not None}
+        if with_extra:
+            extra = json.loads(row[-1])
+            if fields is None:
+                entry.update(extra)
+            else:
+                entry.update((f, extra[f]) for f in fields if f in extra)
+        return entry
+    
+    def get(self, video_id, fields=None):
+        """
+        Return the entry with the given ID, or None
+
+        fields limits the returned keys; projecting onto the typed columns
+        avoids decoding the JSON blob.
+        """
+        self.flush()
+        columns, with_extra, select = self._select(fields)
+        row = self._conn.execute(f"SELECT {select} FROM entries WHERE id = ?", (video_id,)).fetchone()
+        return self._row_to_entry(row, columns, with_extra, fields) if row else None
+    
+    def iter_entries(self, kind=None, fields=None):
+        """
+        Yield stored entries in listing order, optionally of one kind
+
+        fields limits the returned keys, as in get().
+        """
+        self.flush()
+        columns, with_extra, select = self._select(fields)
+        if kind is None:
+            cursor = self._conn.execute(f"SELECT {select} FROM entries ORDER BY position")
+        else:
+            cursor = self._conn.execute(f"SELECT {select} FROM entries WHERE kind = ? ORDER BY position", (kind,))
+        for row in cursor:
+            yield self._row_to_entry(row, columns, with_extra, fields)
+    
+    def export_json(self, path, kind=None, fields=None):
+        """
+        Write entries to path as a JSON array; returns the number written
+        """
+        with JsonArrayWriter(path) as out:
+            for entry in self.iter_entries(kind, fields):
+                out.write(entry)
+        return out.count
+    
+    def close(self):
+        """
+        Flush pending writes and close the database
+        """
+        self.flush()
+        self._conn.close()
@@ -0,0 +1,226 @@
+
+"""
+Run metrics: stage durations, per-video phase latencies and counters
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_FILE = "reports/metrics.json"
+PROMETHEUS_FILE = "reports/metrics.prom"
+PREFIX = "downloader"
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets
+    """
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+    
+    def cumulative(self):
+        """
+        Return (upper bound, observations <= bound) pairs, ending with +Inf
+        """
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+    
+    def quantile(self, q):
+        """
+        Estimate the q-quantile as the upper bound of the bucket it falls in
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+    
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {("+Inf" if bound == float("inf") else str(bound)): total for bound, total in self.cumulative()},
+        }
+
+class Metrics:
+    """
+    Collects the metrics of one run
+
+    stage() times a whole pipeline stage, phase() and observe() record the
+    latency of one per-video phase (metadata, classification, download,
+    verify) in a histogram, inc() adds to a counter such as bytes
+    downloaded, retries or cache hits, optionally with labels, and set()
+    records a one-off value such as the time to the first verified video. Safe to
+    share between threads. write() saves everything as JSON and in the
+    Prometheus text exposition format.
+    """
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS, clock=time.perf_counter):
+        self.buckets = buckets
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.phases = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+    
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the enclosed block as pipeline stage name
+        """
+        started = self._clock()
+        try:
+            yield
+        finally:
+            elapsed = self._clock() - started
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+    
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the enclosed block as one occurrence of per-video phase name
+        """
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self._clock() - started)
+    
+    def timed(self, iterable, phase):
+        """
+        Yield the items of iterable, timing each fetch as phase
+        """
+        iterator = iter(iterable)
+        while True:
+            started = self._clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(phase, self._clock() - started)
+            yield item
+    
+    def observe(self, phase, seconds):
+        """
+        Record one occurrence of phase that took seconds
+        """
+        with self._lock:
+            if phase not in self.phases:
+                self.phases[phase] = Histogram(self.buckets)
+            self.phases[phase].observe(seconds)
+    
+    def inc(self, name, value=1, **labels):
+        """
+        Add value to counter name with the given labels
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def counter(self, name, **labels):
+        """
+        Return the current value of a counter
+        """
+        with self._lock:
+            return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+    
+    def set(self, name, value, **labels):
+        """
+        Set gauge name with the given labels to value
+        """
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+    
+    def to_dict(self):
+        with self._lock:
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+            gauges = {}
+            for (name, labels), value in sorted(self.gauges.items()):
+                gauges.setdefault(name, []).append({"labels": dict(labels), "value": value})
+            return {
+                "started": self.started,
+                "stages": dict(self.stages),
+                "phases": {name: histogram.to_dict() for name, histogram in self.phases.items()},
+                "counters": counters,
+                "gauges": gauges,
+            }
+    
+    def to_prometheus(self):
+        """
+        Return the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            name = f"{PREFIX}_stage_duration_seconds"
+            lines.append(f"# HELP {name} Wall time spent in each pipeline stage.")
+            lines.append(f"# TYPE {name} gauge")
+            for stage, seconds in self.stages.items():
+                lines.append(f'{name}{{stage="{stage}"}} {seconds}')
+            
+            name = f"{PREFIX}_phase_duration_seconds"
+            lines.append(f"# HELP {name} Latency of each per-video phase.")
+            lines.append(f"# TYPE {name} histogram")
+            for phase, histogram in self.phases.items():
+                for bound, total in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else bound
+                    lines.append(f'{name}_bucket{{phase="{phase}",le="{le}"}} {total}')
+                lines.append(f'{name}_sum{{phase="{phase}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{phase="{phase}"}} {histogram.count}')
+            
+            typed = set()
+            samples = [(key, value, "counter") for key, value in sorted(self.counters.items())]
+            samples += [(key, value, "gauge") for key, value in sorted(self.gauges.items())]
+            for (metric, labels), value, kind in samples:
+                name = f"{PREFIX}_{metric}"
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {kind}")
+                    typed.add(name)
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+    
+    def write(self, json_path=METRICS_FILE, prometheus_path=PROMETHEUS_FILE):
+        """
+        Save the metrics as JSON and as Prometheus text
+        """
+        for path in (json_path, prometheus_path):
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        with open(json_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        with open(prometheus_path, "w") as f:
+            f.write(self.to_prometheus())
@@ -0,0 +1,101 @@
+
+"""
+Cheap structural validation of MP4 (ISO-BMFF) files
+
+Only box headers and the mvhd payload are read, so checking a file costs a
+handful of seeks regardless of its size.
+"""
+
+import os
+import struct
+
+REQUIRED_BOXES = ("ftyp", "moov", "mdat")
+DURATION_TOLERANCE = 2.0  # seconds
+DURATION_TOLERANCE_RATIO = 0.02
+
+def iter_boxes(f, start, end):
+    """
+    Yield (type, offset, size, header_size) for each box between start and end
+
+    Stops with a ValueError if a box header is malformed; a box that runs
+    past end is still yielded so the caller can report it.
+    """
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError(f"short box header at offset {offset}")
+        size, box_type = struct.unpack(">I4s", header)
+        box_type = box_type.decode("latin-1")
+        header_size = 8
+        if size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                raise ValueError(f"short box header at offset {offset}")
+            size = struct.unpack(">Q", large)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            raise ValueError(f"invalid size {size} for box '{box_type}' at offset {offset}")
+        yield box_type, offset, size, header_size
+        offset += size
+    if offset < end:
+        raise ValueError(f"{end - offset} trailing bytes after last box")
+
+def read_mvhd_duration(f, offset, header_size):
+    """
+    Return the movie duration in seconds from the mvhd box at offset
+    """
+    f.seek(offset + header_size)
+    version = f.read(4)[0]
+    if version == 1:
+        _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+    else:
+        _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+    if not timescale:
+        return None
+    return duration / timescale
+
+def validate_mp4(path, expected_duration=None):
+    """
+    Check the box structure of an MP4 file
+
+    Verifies that the ftyp, moov and mdat boxes are present, that no box
+    extends past the end of the file and, if expected_duration (seconds) is
+    given, that the mvhd duration is close to it. Returns a list of issues;
+    an empty list means the file looks complete.
+    """
+    issues = []
+    file_size = os.path.getsize(path)
+    found = set()
+    duration = None
+    
+    try:
+        with open(path, "rb") as f:
+            for box_type, offset, size, header_size in iter_boxes(f, 0, file_size):
+                found.add(box_type)
+                if offset + size > file_size:
+                    issues.append(f"MP4 box '{box_type}' extends {offset + size - file_size} bytes past end of file")
+                    break
+                if box_type == "moov":
+                    for child_type, child_offset, _, child_header in iter_boxes(f, offset + header_size, offset + size):
+                        if child_type == "mvhd":
+                            duration = read_mvhd_duration(f, child_offset, child_header)
+                            break
+    except (ValueError, IndexError, struct.error) as e:
+        issues.append(f"Malformed MP4 structure: {e}")
+    
+    for box_type in REQUIRED_BOXES:
+        if box_type not in found:
+            issues.append(f"MP4 box '{box_type}' not found")
+    
+    if expected_duration and duration is not None:
+        tolerance = max(DURATION_TOLERANCE, expected_duration * DURATION_TOLERANCE_RATIO)
+        if abs(duration - expected_duration) > tolerance:
+            issues.append(f"MP4 duration {duration:.1f}s does not match expected {expected_duration:.1f}s")
+    elif "moov" in found and duration is None and not issues:
+        issues.append(f"MP4 mvhd box not found")
+    
+    return issues
@@ -0,0 +1,305 @@
+
+"""
+Resumable, multi-segment HTTP downloads using Range requests
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.client import HTTPException
+
+DEFAULT_CONNECTIONS = 4
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+MIN_SEGMENT_SIZE = 256 * 1024
+MAX_SEGMENT_SIZE = 64 * 1024 * 1024
+SEGMENT_SECONDS = 2.0  # segment size aims for this many seconds per request
+MAX_RETRIES = 5
+CHUNK_SIZE = 64 * 1024
+
+# URLError, ConnectionError and socket timeouts are all OSErrors
+TRANSIENT_ERRORS = (HTTPException, OSError)
+
+class RangeDownloadError(Exception):
+    """
+    Raised when a download cannot be completed; progress is kept for a later resume
+    """
+
+def merge_ranges(ranges):
+    """
+    Merge overlapping or adjacent inclusive (start, end) ranges
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def missing_ranges(done, size):
+    """
+    Return the inclusive ranges of [0, size) not covered by done
+    """
+    missing = []
+    position = 0
+    for start, end in merge_ranges(done):
+        if start > position:
+            missing.append([position, start - 1])
+        position = max(position, end + 1)
+    if position < size:
+        missing.append([position, size - 1])
+    return missing
+
+class SegmentPlanner:
+    """
+    Hands out byte ranges to workers and adapts segment size and parallelism
+
+    Segment size follows the observed per-connection throughput so each
+    request lasts about SEGMENT_SECONDS. Parallelism grows while aggregate
+    throughput keeps improving and shrinks when it drops or requests fail.
+    """
+    
+    def __init__(self, pending, segment_size, max_connections):
+        self.pending = pending
+        self.segment_size = segment_size
+        self.max_connections = max_connections
+        self.parallelism = min(2, max_connections)
+        self.active = 0
+        self.failed = False
+        self._cond = threading.Condition()
+        self._window_bytes = 0
+        self._window_started = time.monotonic()
+        self._window_segments = 0
+        self._last_rate = None
+    
+    def next_segment(self):
+        """
+        Block until a segment may be fetched and return it, or None when done
+        """
+        with self._cond:
+            while True:
+                if self.failed:
+                    return None
+                if not self.pending:
+                    if self.active == 0:
+                        self._cond.notify_all()
+                        return None
+                elif self.active < self.parallelism:
+                    start, end = self.pending[0]
+                    segment_end = min(end, start + self.segment_size - 1)
+                    if segment_end == end:
+                        self.pending.pop(0)
+                    else:
+                        self.pending[0] = [segment_end + 1, end]
+                    self.active += 1
+                    return start, segment_end
+                self._cond.wait()
+    
+    def finished(self, fetched, seconds):
+        """
+        Report a completed segment of fetched bytes that took seconds
+        """
+        with self._cond:
+            self.active -= 1
+            if seconds > 0:
+                rate = fetched / seconds
+                self.segment_size = int(min(MAX_SEGMENT_SIZE, max(MIN_SEGMENT_SIZE,
+                                        (self.segment_size + rate * SEGMENT_SECONDS) / 2)))
+            self._adapt_parallelism(fetched)
+            self._cond.notify_all()
+    
+    def retrying(self):
+        """
+        Report a failed request that will be retried; backs off parallelism
+        """
+        with self._cond:
+            self.parallelism = max(1, self.parallelism - 1)
+            self._last_rate = None
+    
+    def abort(self):
+        with self._cond:
+            self.failed = True
+            self.active -= 1
+            self._cond.notify_all()
+    
+    def _adapt_parallelism(self, fetched):
+        self._window_bytes += fetched
+        self._window_segments += 1
+        if self._window_segments < self.parallelism:
+            return
+        now = time.monotonic()
+        rate = self._window_bytes / max(now - self._window_started, 1e-6)
+        if self._last_rate is None or rate > self._last_rate * 1.1:
+            self.parallelism = min(self.max_connections, self.parallelism + 1)
+        elif rate < self._last_rate * 0.9:
+            self.parallelism = max(1, self.parallelism - 1)
+        self._last_rate = rate
+        self._window_bytes = 0
+        self._window_segments = 0
+        self._window_started = now
+
+class RangeDownloader:
+    """
+    Downloads a URL as parallel HTTP Range segments into a preallocated file
+
+    Data goes to <path>.part and completed ranges are recorded in the
+    <path>.part.json sidecar, so an interrupted download resumes where it
+    stopped. The file is renamed to path once every byte has arrived.
+    Servers without Range support are downloaded as a single stream.
+    """
+    
+    def __init__(self, max_connections=DEFAULT_CONNECTIONS, segment_size=DEFAULT_SEGMENT_SIZE,
+                 retries=MAX_RETRIES, timeout=30):
+        self.max_connections = max_connections
+        self.segment_size = segment_size
+        self.retries = retries
+        self.timeout = timeout
+        self.retried = 0
+        self._retried_lock = threading.Lock()
+    
+    def _open(self, url, start=None, end=None):
+        request = urllib.request.Request(url)
+        if start is not None:
+            request.add_header("Range", f"bytes={start}-{end}")
+        return urllib.request.urlopen(request, timeout=self.timeout)
+    
+    def download(self, url, path):
+        """
+        Download url to path, resuming from a previous attempt if possible
+
+        Returns the file size in bytes. Raises RangeDownloadError when a
+        segment keeps failing; the partial file and sidecar are kept.
+        """
+        part_path = path + ".part"
+        sidecar_path = part_path + ".json"
+        
+        try:
+            try:
+                response = self._open(url, 0, 0)
+            except urllib.error.HTTPError as e:
+                if e.code != 416:
+                    raise
+                e.close()
+                # A zero-length resource has no byte 0 to serve; request it without a Range
+                response = self._open(url)
+        except TRANSIENT_ERRORS as e:
+            raise RangeDownloadError(f"Cannot reach {url}: {e}")
+        
+        with response:
+            content_range = response.headers.get("Content-Range", "")
+            if response.status != 206 or "/" not in content_range:
+                # No Range support: stream the response we already have
+                return self._download_single(response, path, part_path)
+            size = int(content_range.rsplit("/", 1)[1])
+        
+        done = []
+        if os.path.exists(sidecar_path) and os.path.exists(part_path):
+            with open(sidecar_path, "r") as f:
+                progress = json.load(f)
+            if progress.get("size") == size:
+                done = progress["done"]
+        
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT)
+        try:
+            if not done:
+                os.truncate(part_path, size)
+            planner = SegmentPlanner(missing_ranges(done, size), self.segment_size, self.max_connections)
+            state = {"url": url, "size": size, "done": merge_ranges(done)}
+            lock = threading.Lock()
+            errors = []
+            
+            def save_progress(start, end):
+                with lock:
+                    state["done"] = merge_ranges(state["done"] + [[start, end]])
+                    tmp_path = sidecar_path + ".tmp"
+                    with open(tmp_path, "w") as f:
+                        json.dump(state, f)
+                    os.replace(tmp_path, sidecar_path)
+            
+            def fetch(start, end):
+                started = time.monotonic()
+                fetched = 0
+                for attempt in range(self.retries + 1):
+                    try:
+                        fetched += self._fetch_segment(url, fd, start + fetched, end)
+                        break
+                    except TRANSIENT_ERRORS as e:
+                        fetched += getattr(e, "fetched", 0)
+                        if attempt == self.retries:
+                            if fetched:
+                                save_progress(start, start + fetched - 1)
+                            raise
+                        planner.retrying()
+                        with self._retried_lock:
+                            self.retried += 1
+                        time.sleep(min(2 ** attempt * 0.1, 5))
+                save_progress(start, end)
+                planner.finished(fetched, time.monotonic() - started)
+            
+            def worker():
+                while True:
+                    segment = planner.next_segment()
+                    if segment is None:
+                        return
+                    try:
+                        fetch(*segment)
+                    except Exception as e:
+                        errors.append(f"bytes {segment[0]}-{segment[1]}: {e}")
+                        planner.abort()
+                        return
+            
+            threads = [threading.Thread(target=worker) for _ in range(self.max_connections)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            
+            if errors:
+                raise RangeDownloadError(f"Download of {url} interrupted ({errors[0]}); progress saved for resume")
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        
+        os.replace(part_path, path)
+        os.remove(sidecar_path)
+        return size
+    
+    def _fetch_segment(self, url, fd, start, end):
+        """
+        Write bytes start..end of url into fd at their offsets
+
+        Returns the number of bytes written. On failure the exception
+        carries the bytes written so far in its fetched attribute.
+        """
+        written = 0
+        try:
+            with self._open(url, start, end) as response:
+                if response.status != 206:
+                    raise HTTPException(f"expected 206 Partial Content, got {response.status}")
+                while start + written <= end:
+                    chunk = response.read(min(CHUNK_SIZE, end - start - written + 1))
+                    if not chunk:
+                        raise ConnectionError(f"connection closed after {written} bytes")
+                    os.pwrite(fd, chunk, start + written)
+                    written += len(chunk)
+        except TRANSIENT_ERRORS as e:
+            e.fetched = written
+            raise
+        return written
+    
+    def _download_single(self, response, path, part_path):
+        size = 0
+        with open(part_path, "wb") as f:
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(part_path, path)
+        return size
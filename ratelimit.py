@@ -0,0 +1,118 @@
+
+"""
+Adaptive token-bucket rate limiter shared by the downloaders
+"""
+
+import threading
+import time
+
+DEFAULT_MIN_RATE = 0.05  # requests per second
+DEFAULT_MAX_RATE = 10.0
+DEFAULT_INCREASE = 0.1
+DEFAULT_DECREASE = 0.5
+
+# Error text that means the server is throttling us
+THROTTLE_MARKERS = ("429", "too many requests", "rate limit", "rate-limit", "throttl")
+
+def is_throttle_error(error):
+    """
+    Return True if an error message indicates rate limiting
+    """
+    text = str(error).lower()
+    return any(marker in text for marker in THROTTLE_MARKERS)
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate adapts to server feedback (AIMD)
+
+    Each request takes one token with acquire(). The refill rate grows by
+    increase requests/s after every success() and is multiplied by
+    decrease after every throttled() signal, within [min_rate, max_rate].
+    One limiter can be shared by any number of threads; the current rate
+    is available as .rate and a snapshot of counters from stats().
+    """
+    
+    def __init__(self, rate=1.0, min_rate=DEFAULT_MIN_RATE, max_rate=DEFAULT_MAX_RATE,
+                 increase=DEFAULT_INCREASE, decrease=DEFAULT_DECREASE, burst=1.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._rate = min(max(rate, min_rate), max_rate)
+        self._tokens = burst
+        self._updated = clock()
+        self.successes = 0
+        self.throttles = 0
+        self.waited = 0.0
+    
+    @property
+    def rate(self):
+        """
+        Current refill rate in requests per second
+        """
+        return self._rate
+    
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+    
+    def acquire(self):
+        """
+        Block until a request may be made
+        """
+        while True:
+            with self._lock:
+                self._refill(self._clock())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+                self.waited += wait
+            self._sleep(wait)
+    
+    def success(self):
+        """
+        Additively increase the rate after a successful request
+        """
+        with self._lock:
+            self._refill(self._clock())
+            self._rate = min(self.max_rate, self._rate + self.increase)
+            self.successes += 1
+    
+    def throttled(self):
+        """
+        Multiplicatively decrease the rate after a throttling response
+        """
+        with self._lock:
+            self._refill(self._clock())
+            self._rate = max(self.min_rate, self._rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+            self.throttles += 1
+    
+    def record(self, error=None):
+        """
+        Feed back the result of a request: None for success, else its error
+
+        Errors that are not throttling leave the rate unchanged.
+        """
+        if error is None:
+            self.success()
+        elif is_throttle_error(error):
+            self.throttled()
+    
+    def stats(self):
+        """
+        Return a snapshot of the limiter state for monitoring
+        """
+        with self._lock:
+            return {
+                "rate": self._rate,
+                "successes": self.successes,
+                "throttles": self.throttles,
+                "waited": self.waited,
+            }
@@ -0,0 +1,148 @@
+
+"""
+Size-aware ordering of download work
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+# Orders accepted by SizeScheduler
+FIFO = "fifo"
+SHORTEST = "shortest"
+LARGEST = "largest"
+BLEND = "blend"
+POLICIES = (FIFO, SHORTEST, LARGEST, BLEND)
+DEFAULT_POLICY = BLEND
+
+# Bytes per second of a typical "best" format stream (about 2.5 Mbit/s), used
+# to turn durations into size estimates
+DEFAULT_BITRATE = 312500
+# Duration assumed for entries that carry none, in seconds
+UNKNOWN_DURATION = 600
+# Seconds of content a blended entry's estimate shrinks by per second it waits
+DEFAULT_AGING = 1.0
+# Entries waiting in a bounded scheduler; the download order is chosen among these
+DEFAULT_SCHEDULE_SIZE = 1024
+
+def estimate_size(video, bitrate=DEFAULT_BITRATE):
+    """
+    Estimate the download size of a video in bytes
+
+    Uses the filesize or filesize_approx yt-dlp reports when present and
+    otherwise the duration at bitrate.
+    """
+    for field in ("filesize", "filesize_approx"):
+        if video.get(field):
+            return video[field]
+    duration = video.get("duration")
+    return (duration if duration is not None else UNKNOWN_DURATION) * bitrate
+
+class SizeScheduler:
+    """
+    Priority queue that orders downloads by estimated size
+
+    policy is FIFO (listing order), SHORTEST (smallest first, which
+    completes the most videos per hour), LARGEST (biggest first, which
+    shortens the total run when workers outnumber the large videos) or
+    BLEND, smallest first with aging so that large videos do not starve
+    while new small ones keep arriving. aging is the number of seconds of
+    content (at bitrate) taken off an entry's estimate for every second
+    it has waited; it defaults to DEFAULT_AGING for BLEND and 0
+    otherwise. Because every waiting entry ages at the same rate, aging
+    only shifts each entry's key by its arrival time and the heap never
+    needs rebuilding.
+
+    With maxsize set, push() blocks while that many entries are waiting,
+    so a fast producer cannot run arbitrarily far ahead of the workers.
+    get() blocks until an entry is available and returns None once the
+    scheduler is closed and empty. Safe to share between threads.
+    """
+    
+    def __init__(self, policy=DEFAULT_POLICY, aging=None, bitrate=DEFAULT_BITRATE, clock=time.monotonic, maxsize=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.policy = policy
+        self.aging = aging if aging is not None else (DEFAULT_AGING if policy == BLEND else 0.0)
+        self.bitrate = bitrate
+        self.maxsize = maxsize
+        self._clock = clock
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._closed = False
+        lock = threading.Lock()
+        self._cond = threading.Condition(lock)
+        # Producers blocked by maxsize wait on their own condition, so that
+        # a get() only wakes a producer and a push() only wakes a consumer
+        self._not_full = threading.Condition(lock)
+    
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+    
+    def _key(self, entry):
+        size, enqueued, seq = entry["size"], entry["enqueued"], entry["seq"]
+        if self.policy == FIFO:
+            return (seq,)
+        if self.policy == LARGEST:
+            size = -size
+        return (size + self.aging * self.bitrate * enqueued, seq)
+    
+    def _push_entry(self, entry):
+        entry["key"] = self._key(entry)
+        heapq.heappush(self._heap, (entry["key"], entry["seq"], entry))
+    
+    def push(self, item_id, item, size=None):
+        """
+        Queue item under item_id; size defaults to estimate_size(item)
+
+        Pushing an item_id that is already waiting replaces its item and size.
+        """
+        with self._cond:
+            while self.maxsize and len(self._entries) >= self.maxsize and item_id not in self._entries:
+                self._not_full.wait()
+            if item_id in self._entries:
+                entry = self._entries[item_id]
+                entry["item"] = item
+                entry["size"] = size if size is not None else estimate_size(item, self.bitrate)
+            else:
+                entry = {
+                    "id": item_id,
+                    "item": item,
+                    "size": size if size is not None else estimate_size(item, self.bitrate),
+                    "enqueued": self._clock(),
+                    "seq": next(self._counter),
+                }
+                self._entries[item_id] = entry
+            self._push_entry(entry)
+            self._cond.notify()
+    
+    def close(self):
+        """
+        Signal that no more items will be pushed
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            self._not_full.notify_all()
+    
+    def get(self, block=True):
+        """
+        Return the next item, or None when the scheduler is closed and empty
+
+        With block=False None is also returned when nothing is waiting.
+        """
+        with self._cond:
+            while True:
+                while self._heap:
+                    key, _, entry = heapq.heappop(self._heap)
+                    # Skip heap records left behind when push() replaced an entry
+                    if key == entry["key"] and self._entries.get(entry["id"]) is entry:
+                        del self._entries[entry["id"]]
+                        self._not_full.notify()
+                        return entry["item"]
+                if self._closed or not block:
+                    return None
+                self._cond.wait()
@@ -0,0 +1,109 @@
+
+"""
+Shared YouTube Shorts classifier
+
+Decides from data already in hand (URL path, duration, thumbnail shapes)
+and only falls back to a caller-supplied probe, such as fetching the stream
+manifest, when that data is ambiguous. Decisions are cached by video ID.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Shorts can be up to three minutes long; anything longer is a regular video
+SHORT_MAX_DURATION = 180
+
+def entry_url(entry):
+    return entry.get("webpage_url") or entry.get("url") or ""
+
+def classify_entry(entry, max_duration=SHORT_MAX_DURATION):
+    """
+    Classify a flat-playlist style entry without any network access
+
+    Returns True for a short, False for a regular video, or None when the
+    available data is not enough to decide.
+    """
+    if "/shorts/" in entry_url(entry).lower():
+        return True
+    
+    # Listings give shorts portrait thumbnails and regular videos landscape ones
+    thumbnails = [t for t in entry.get("thumbnails") or [] if t.get("width") and t.get("height")]
+    if thumbnails:
+        largest = max(thumbnails, key=lambda t: t["width"] * t["height"])
+        return largest["height"] > largest["width"]
+    
+    duration = entry.get("duration")
+    if duration is not None and duration > max_duration:
+        return False
+    return None
+
+class ShortClassifier:
+    """
+    Classifies videos as shorts, caching every decision by video ID
+
+    probe is called with the entry only when classify_entry() cannot
+    decide; it should return a truthy value for a short. Without a probe
+    ambiguous entries count as regular videos. Safe to share between
+    threads.
+    """
+    
+    def __init__(self, probe=None, max_duration=SHORT_MAX_DURATION):
+        self.probe = probe
+        self.max_duration = max_duration
+        self.probes = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+    
+    def cached(self, video_id):
+        """
+        Return the cached decision for a video ID, or None
+        """
+        return self._cache.get(video_id)
+    
+    def classify(self, entry, probe=None):
+        """
+        Return True if the entry is a short
+
+        probe overrides the classifier's default probe for this call.
+        """
+        video_id = entry.get("id")
+        if video_id in self._cache:
+            return self._cache[video_id]
+        
+        decision = classify_entry(entry, self.max_duration)
+        probe = probe or self.probe
+        if decision is None and probe is not None:
+            with self._lock:
+                self.probes += 1
+            decision = bool(probe(entry))
+        decision = bool(decision)
+        
+        if video_id:
+            with self._lock:
+                self._cache[video_id] = decision
+        return decision
+    
+    def classify_many(self, entries, probe=None, workers=4):
+        """
+        Classify a whole listing at once and return a list of decisions
+
+        Entries are first decided from their own data; only the ambiguous
+        ones are probed, up to workers at a time.
+        """
+        entries = list(entries)
+        decisions = [self._cache.get(entry.get("id")) for entry in entries]
+        ambiguous = []
+        for i, entry in enumerate(entries):
+            if decisions[i] is None:
+                decision = classify_entry(entry, self.max_duration)
+                if decision is None and (probe or self.probe):
+                    ambiguous.append(i)
+                else:
+                    decisions[i] = self.classify(entry)
+        
+        if ambiguous:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                probed = pool.map(lambda i: self.classify(entries[i], probe), ambiguous)
+                for i, decision in zip(ambiguous, probed):
+                    decisions[i] = decision
+        return decisions
@@ -0,0 +1,352 @@
+
+"""
+Streaming pipeline that overlaps listing, classification, download and verification
+
+Each stage runs on its own threads and hands every video to the next stage
+through a bounded queue as soon as it is done with it, so the first videos
+are downloaded and verified while the channel is still being listed. When
+a stage falls behind, the queues in front of it fill up and the stages
+before it block, which keeps memory use bounded for any channel size.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
+
+from backends import get_backend
+from channel_info import iter_channel_entries, iter_new_entries
+from create_summary import create_summary_report
+from download_videos import (HostLimiter, download_video, failed_outcome, record_outcome, record_rate_stats,
+                             recover_downloads, DEFAULT_WORKERS, DEFAULT_PER_HOST)
+from extract_metadata import SummaryWriter, summarize_store
+from journal import DownloadJournal
+from jsonstream import JsonArrayWriter, iter_json_array
+from ledger import DownloadLedger, SHORT
+from metadata_store import MetadataStore, compact_entry, METADATA_STORE_FILE, VIDEO
+from metrics import Metrics
+from ratelimit import AdaptiveRateLimiter, DEFAULT_MAX_RATE
+from scheduling import SizeScheduler, estimate_size, DEFAULT_POLICY, DEFAULT_SCHEDULE_SIZE
+from shorts import ShortClassifier
+from verify_downloads import (carry_over_results, create_verification_report, load_manifest, save_manifest,
+                              update_manifest, record_results, verify_video, VERIFICATION_RESULTS_FILE)
+
+# Capacity of the queues between stages
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_VERIFY_WORKERS = 2
+
+# Marks the end of a stage's output
+END = object()
+
+class StreamingPipeline:
+    """
+    Runs the pipeline stages concurrently, connected by bounded queues
+
+    One thread lists the channel and another classifies each entry,
+    records it in the metadata store and queues the regular videos for
+    download. workers download threads take videos from a SizeScheduler
+    in the given order and pass them on to verify_workers verification
+    threads. The calling thread collects the verification results,
+    updates the checksum manifest and, once everything is verified,
+    writes the reports. With checkpoint set the same files as
+    main.run_pipeline() are written and results are streamed to them;
+    without it the videos, shorts and results are kept in memory for the
+    summary report.
+
+    If any stage fails the others stop taking new work and drain their
+    queues, so the pipeline always winds down instead of blocking.
+    """
+    
+    def __init__(self, channel_url, checkpoint=True, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST,
+                 incremental=None, backend=None, metrics=None, order=DEFAULT_POLICY, queue_size=DEFAULT_QUEUE_SIZE,
+                 schedule_size=DEFAULT_SCHEDULE_SIZE, verify_workers=DEFAULT_VERIFY_WORKERS, checksums=True,
+                 structure=True, blob_store=None):
+        self.channel_url = channel_url
+        self.checkpoint = checkpoint
+        self.workers = max(1, workers)
+        self.incremental = incremental
+        self.backend = backend if backend is not None else get_backend()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.verify_workers = max(1, verify_workers)
+        self.checksums = checksums
+        self.structure = structure
+        self.blob_store = blob_store
+        self.videos_dir = os.path.abspath("downloads/videos")
+        
+        self.listed = queue.Queue(queue_size)
+        self.scheduler = SizeScheduler(order, maxsize=schedule_size)
+        self.downloaded = queue.Queue(queue_size)
+        self.verified = queue.Queue(queue_size)
+        
+        self.classifier = ShortClassifier()
+        self.host_limiter = HostLimiter(per_host)
+        self.rate_limiter = AdaptiveRateLimiter(rate=DEFAULT_MAX_RATE)
+        self.ledger = None
+        self.journal = None
+        self.manifest = None
+        self.abort = threading.Event()
+        self.errors = []
+        
+        # Kept only without checkpoint files to stream the reports from
+        self.videos = []
+        self.shorts = []
+        self.results = []
+        
+        # Download outcomes are counted by status; only failures are kept
+        self.status_counts = {}
+        self.failures = []
+        self._lock = threading.Lock()
+        
+        self.first_verified = None
+        self.verified_count = 0
+        self.result_count = 0
+    
+    def fail(self, stage, error):
+        """
+        Record that stage failed and tell the other stages to wind down
+        """
+        print(f"Error in {stage} stage: {error}")
+        self.errors.append((stage, error))
+        self.abort.set()
+    
+    def drain(self, source):
+        """
+        Discard items from source up to its END marker
+        """
+        for _ in iter(source.get, END):
+            pass
+    
+    def list_channel(self):
+        """
+        Stage 1: put every flat-playlist entry on the listed queue
+        """
+        entries = None
+        try:
+            entries = iter_channel_entries(self.channel_url, checkpoint=self.checkpoint, lazy=bool(self.incremental),
+                                           backend=self.backend, merge=bool(self.incremental))
+            if self.incremental:
+                entries = iter_new_entries(entries, self.ledger.settled_ids(), self.incremental)
+            for entry in self.metrics.timed(entries, "metadata"):
+                if self.abort.is_set():
+                    break
+                self.listed.put(entry)
+        except Exception as e:
+            self.fail("listing", e)
+        finally:
+            # Stops yt-dlp when listing ends early
+            close = getattr(entries, "close", None)
+            if close:
+                close()
+            self.listed.put(END)
+    
+    def classify_entries(self):
+        """
+        Stage 2: classify each entry, store it and schedule the regular videos
+        """
+        ended = False
+        try:
+            with self.metrics.stage("list_and_extract"), ExitStack() as stack:
+                os.makedirs("metadata", exist_ok=True)
+                summary = stack.enter_context(SummaryWriter("metadata/summary.txt"))
+                # Incremental runs add the new uploads to the entries of earlier runs
+                merge = self.incremental and self.checkpoint
+                if self.checkpoint:
+                    store = stack.enter_context(MetadataStore())
+                    if merge:
+                        marker = store.mark()
+                    else:
+                        store.clear()
+                
+                video_count = short_count = 0
+                for entry in iter(self.listed.get, END):
+                    with self.metrics.phase("classification"):
+                        is_short = self.classifier.classify(entry)
+                    
+                    if is_short:
+                        short_count += 1
+                        if not merge:
+                            summary.add_short(entry)
+                        # Remember listed shorts so they count as known on incremental runs
+                        if entry.get('id') not in self.ledger:
+                            self.ledger.record(entry.get('id'), SHORT)
+                    else:
+                        video_count += 1
+                        if not merge:
+                            summary.add_video(entry)
+                    
+                    if self.checkpoint:
+                        store.add(entry, SHORT if is_short else VIDEO)
+                    else:
+                        (self.shorts if is_short else self.videos).append(entry)
+                    
+                    if not is_short and not self.abort.is_set():
+                        video = compact_entry(entry)
+                        self.scheduler.push(video.get('id'), video, estimate_size(video))
+                ended = True
+                
+                if merge:
+                    store.move_to_front(marker)
+                    summarize_store(summary, store)
+            
+            self.metrics.inc("entries_total", video_count, kind=VIDEO)
+            self.metrics.inc("entries_total", short_count, kind=SHORT)
+            self.metrics.inc("classification_probes_total", self.classifier.probes)
+            new = "new " if self.incremental else ""
+            print(f"Found {video_count} {new}videos and {short_count} {new}shorts")
+            if self.checkpoint:
+                print(f"Metadata extracted and saved to {METADATA_STORE_FILE}")
+        except Exception as e:
+            self.fail("classification", e)
+            if not ended:
+                self.drain(self.listed)
+        finally:
+            self.scheduler.close()
+    
+    def download_videos(self):
+        """
+        Stage 3 (one thread per worker): download scheduled videos
+        """
+        while True:
+            video = self.scheduler.get()
+            if video is None:
+                return
+            if self.abort.is_set():
+                continue
+            try:
+                outcome = download_video(video, self.videos_dir, self.backend, self.host_limiter, self.ledger,
+                                         self.rate_limiter, self.blob_store, self.journal)
+            except Exception as e:
+                outcome = failed_outcome(video, e)
+            record_outcome(self.metrics, outcome)
+            with self._lock:
+                self.status_counts[outcome["status"]] = self.status_counts.get(outcome["status"], 0) + 1
+                if outcome["status"] == "failed":
+                    self.failures.append(outcome)
+            self.downloaded.put(video)
+    
+    def verify_videos(self):
+        """
+        Stage 4 (one thread per verify worker): verify downloaded videos
+        """
+        for video in iter(self.downloaded.get, END):
+            if self.abort.is_set():
+                continue
+            video_id = video.get('id')
+            with self.metrics.phase("verify"):
+                try:
+                    video_dirs = {video_id} if os.path.isdir(os.path.join(self.videos_dir, video_id)) else set()
+                    result = verify_video(video, self.videos_dir, video_dirs, self.manifest,
+                                          self.ledger if self.checksums else None, self.structure)
+                except Exception as e:
+                    result = {"id": video_id, "title": video.get('title'), "verified": False,
+                              "issues": [f"Verification error: {e}"]}
+            self.verified.put(result)
+    
+    def finish_stages(self, downloads, verifications):
+        """
+        Pass the end of each worker stage on to the next once all its threads are done
+        """
+        with self.metrics.stage("verify"):
+            with self.metrics.stage("download"):
+                wait(downloads)
+            for _ in verifications:
+                self.downloaded.put(END)
+            wait(verifications)
+        self.verified.put(END)
+    
+    def collect_results(self, started):
+        """
+        Gather the verification results on the calling thread
+        """
+        ended = False
+        try:
+            with ExitStack() as stack:
+                writer = stack.enter_context(JsonArrayWriter(VERIFICATION_RESULTS_FILE)) if self.checkpoint else None
+                verified_ids = set()
+                for result in iter(self.verified.get, END):
+                    self.result_count += 1
+                    if self.incremental:
+                        verified_ids.add(result["id"])
+                    if result["verified"]:
+                        self.verified_count += 1
+                        if self.first_verified is None:
+                            self.first_verified = time.monotonic() - started
+                            self.metrics.set("first_verified_seconds", self.first_verified)
+                            print(f"First video verified after {self.first_verified:.1f}s")
+                    if self.manifest is not None:
+                        update_manifest(self.manifest, [result], self.metrics)
+                    record_results(self.metrics, [result])
+                    if writer is not None:
+                        writer.write(result)
+                    else:
+                        self.results.append(result)
+                ended = True
+                # Keep the results of earlier runs for the videos an incremental run did not list
+                if writer is not None and self.incremental and not self.abort.is_set():
+                    carry_over_results(writer, verified_ids)
+        except Exception as e:
+            self.fail("verification", e)
+            if not ended:
+                self.drain(self.verified)
+    
+    def run(self):
+        """
+        Run every stage and write the reports; returns False if a required stage failed
+        """
+        os.makedirs(self.videos_dir, exist_ok=True)
+        self.manifest = load_manifest() if self.checksums else None
+        started = time.monotonic()
+        
+        with DownloadLedger() as self.ledger, DownloadJournal() as self.journal:
+            recover_downloads(self.journal, self.videos_dir, self.ledger)
+            with self.metrics.stage("pipeline"):
+                with ThreadPoolExecutor(max_workers=3 + self.workers + self.verify_workers) as pool:
+                    pool.submit(self.list_channel)
+                    pool.submit(self.classify_entries)
+                    downloads = [pool.submit(self.download_videos) for _ in range(self.workers)]
+                    verifications = [pool.submit(self.verify_videos) for _ in range(self.verify_workers)]
+                    pool.submit(self.finish_stages, downloads, verifications)
+                    self.collect_results(started)
+            self.journal.checkpoint()
+        
+        rate_stats = self.rate_limiter.stats()
+        record_rate_stats(self.metrics, rate_stats)
+        print(", ".join(f"{status}: {count}" for status, count in sorted(self.status_counts.items())))
+        for outcome in self.failures:
+            print(f"Error downloading video {outcome['title']} (ID: {outcome['id']}): {outcome['error']}")
+        print(f"Request rate: {rate_stats['rate']:.2f}/s ({rate_stats['throttles']} throttled responses)")
+        
+        if self.errors:
+            print("Failed to list, classify or verify the channel. Exiting.")
+            return False
+        
+        if self.manifest is not None:
+            save_manifest(self.manifest)
+        results = iter_json_array(VERIFICATION_RESULTS_FILE) if self.checkpoint else self.results
+        create_verification_report(results)
+        print(f"Verified {self.verified_count} out of {self.result_count} videos")
+        if self.verified_count != self.result_count:
+            print("Warning: Some videos failed verification.")
+        
+        with self.metrics.stage("summary"):
+            if self.checkpoint:
+                reported = create_summary_report()
+            else:
+                reported = create_summary_report(self.videos, self.shorts, self.results)
+        if not reported:
+            print("Failed to create summary report.")
+        return True
+
+def run_streaming_pipeline(channel_url, checkpoint=True, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST,
+                           incremental=None, backend=None, metrics=None, order=DEFAULT_POLICY, blob_store=None):
+    """
+    Run the pipeline with every stage overlapping; see StreamingPipeline
+
+    Takes the same arguments as main.run_pipeline() and returns False if a
+    required stage failed.
+    """
+    return StreamingPipeline(channel_url, checkpoint=checkpoint, workers=workers, per_host=per_host,
+                             incremental=incremental, backend=backend, metrics=metrics, order=order,
+                             blob_store=blob_store).run()
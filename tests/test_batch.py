@@ -0,0 +1,32 @@
+import threading
+
+from batch import FairScheduler, channel_summary, list_channel
+from shorts import ShortClassifier
+
+
+def channel_record(url="https://www.youtube.com/@one"):
+    return {"channel": url, "videos": [], "shorts": 0, "duplicates": 0, "error": None, "outcomes": [], "results": []}
+
+
+def test_linked_videos_count_in_the_channel_summary():
+    channel = channel_record()
+    channel["outcomes"] = [
+        {"status": "downloaded", "bytes": 10},
+        {"status": "existing", "bytes": 0},
+        {"status": "linked", "bytes": 0},
+    ]
+    summary = channel_summary(channel)
+    assert (summary["downloaded"], summary["existing"], summary["linked"]) == (1, 1, 1)
+
+
+class BrokenListing:
+    def list_channel(self, url):
+        yield {"id": "vid1", "title": "Video", "duration": 120, "webpage_url": "https://www.youtube.com/watch?v=vid1"}
+        raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+
+def test_any_listing_error_is_recorded_for_its_channel():
+    channel = channel_record()
+    list_channel(channel, BrokenListing(), ShortClassifier(), None, FairScheduler(), set(), threading.Lock())
+    assert channel["error"] == "Expecting value: line 1 column 1 (char 0)"
+    assert len(channel["videos"]) == 1
@@ -0,0 +1,49 @@
+from channel_info import iter_new_entries
+from ledger import DownloadLedger, DOWNLOADED, FAILED, SHORT
+
+
+class FakeListing:
+    """Newest-first listing that counts how many entries were pulled."""
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.pulled = 0
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for video_id in self.ids:
+                self.pulled += 1
+                yield {"id": video_id}
+        finally:
+            self.closed = True
+
+
+def test_failed_videos_are_retried_and_listing_stops_after_known_streak(tmp_path):
+    with DownloadLedger(str(tmp_path / "ledger.sqlite3")) as ledger:
+        ledger.record("failed1", FAILED)
+        for video_id in ("old1", "old2", "old3", "old4"):
+            ledger.record(video_id, DOWNLOADED)
+        ledger.record("short1", SHORT)
+        known_ids = ledger.settled_ids()
+
+    listing = FakeListing(["new1", "failed1", "old1", "short1", "old2", "old3", "old4"])
+    entries = iter(listing)
+    yielded = [entry["id"] for entry in iter_new_entries(entries, known_ids, stop_after=3)]
+
+    assert yielded == ["new1", "failed1"]
+    assert listing.pulled == 5
+    assert listing.closed
+
+
+def test_failed_videos_do_not_count_towards_the_known_streak(tmp_path):
+    with DownloadLedger(str(tmp_path / "ledger.sqlite3")) as ledger:
+        for video_id in ("f1", "f2", "f3"):
+            ledger.record(video_id, FAILED)
+        known_ids = ledger.settled_ids()
+
+    listing = FakeListing(["f1", "f2", "f3", "new1"])
+    yielded = [entry["id"] for entry in iter_new_entries(iter(listing), known_ids, stop_after=2)]
+
+    assert yielded == ["f1", "f2", "f3", "new1"]
+    assert listing.pulled == 4
@@ -0,0 +1,57 @@
+import os
+import re
+
+import pytest
+
+from backends import get_backend
+from benchmarks.pipeline import install_fake_yt_dlp
+from channel_info import RAW_INFO_FILE
+from main import run_pipeline
+from metadata_store import MetadataStore, SHORT, VIDEO
+from streaming import run_streaming_pipeline
+
+CHANNEL_URL = "https://www.youtube.com/@synthetic1"
+
+
+@pytest.fixture
+def channel(tmp_path, monkeypatch):
+    install_fake_yt_dlp(str(tmp_path / "bin"))
+    monkeypatch.setenv("PATH", str(tmp_path / "bin") + os.pathsep + os.environ.get("PATH", ""))
+    monkeypatch.setenv("FAKE_YT_DLP_VIDEOS", "10")
+    monkeypatch.setenv("FAKE_YT_DLP_SIZE", "2048")
+    monkeypatch.chdir(tmp_path)
+
+
+def report_totals():
+    with open(os.path.join("reports", "summary_report.md")) as f:
+        return dict(re.findall(r"\*\*(Total Videos Found|Total Shorts Found|Videos Downloaded):\*\* (\d+)", f.read()))
+
+
+def checkpoint_state():
+    with open(RAW_INFO_FILE) as f:
+        raw_lines = sum(1 for line in f if line.strip())
+    with MetadataStore() as store:
+        return raw_lines, store.count(VIDEO), store.count(SHORT)
+
+
+@pytest.mark.parametrize("pipeline", [run_pipeline, run_streaming_pipeline])
+def test_incremental_run_keeps_earlier_metadata_and_report_totals(channel, pipeline):
+    with get_backend("cli") as backend:
+        assert pipeline(CHANNEL_URL, backend=backend)
+        first_totals, first_state = report_totals(), checkpoint_state()
+        assert first_totals == {"Total Videos Found": "8", "Total Shorts Found": "2", "Videos Downloaded": "8"}
+
+        assert pipeline(CHANNEL_URL, backend=backend, incremental=3)
+    assert report_totals() == first_totals
+    assert checkpoint_state() == first_state == (10, 8, 2)
+
+
+def test_move_to_front_puts_new_entries_first_in_listing_order(tmp_path):
+    with MetadataStore(str(tmp_path / "metadata.sqlite3")) as store:
+        for video_id in ("old1", "old2"):
+            store.add({"id": video_id})
+        marker = store.mark()
+        for video_id in ("new1", "new2", "old2"):
+            store.add({"id": video_id})
+        store.move_to_front(marker)
+        assert [entry["id"] for entry in store.iter_entries(fields=("id",))] == ["new1", "new2", "old2", "old1"]
@@ -0,0 +1,37 @@
+import pytest
+
+from download_videos import download_video, recover_downloads
+from journal import DownloadJournal, STARTED, staging_dir
+from ledger import DownloadLedger, FAILED
+
+
+def test_recovery_finds_a_worker_staging_directory_next_to_an_older_install(tmp_path):
+    videos_dir = tmp_path / "downloads" / "videos"
+    (videos_dir / "vid1").mkdir(parents=True)
+    (videos_dir / "vid1" / "video.mp4").write_bytes(b"older install")
+    staging = staging_dir(str(videos_dir), "vid1", "host:42")
+    assert staging.endswith("host_42/vid1")
+    (tmp_path / "downloads" / "partial" / "host_42" / "vid1").mkdir(parents=True)
+
+    with DownloadJournal(str(tmp_path / "journal.jsonl"), sync=False) as journal:
+        journal.append("vid1", STARTED, worker="host:42")
+        assert recover_downloads(journal, str(videos_dir)) == (0, 1)
+        assert journal.pending() == {}
+    assert (tmp_path / "downloads" / "partial" / "host_42" / "vid1").is_dir()
+
+
+class RaisingBackend:
+    def download(self, video_url, video_dir):
+        raise OSError("disk full")
+
+
+def test_a_raising_backend_settles_the_journal_and_ledger(tmp_path):
+    video = {"id": "vid1", "title": "Video", "webpage_url": "https://www.youtube.com/watch?v=vid1"}
+    with DownloadJournal(str(tmp_path / "journal.jsonl"), sync=False) as journal, \
+            DownloadLedger(str(tmp_path / "ledger.sqlite3")) as ledger:
+        with pytest.raises(OSError):
+            download_video(video, str(tmp_path / "downloads" / "videos"), RaisingBackend(), ledger=ledger,
+                           journal=journal)
+        assert journal.pending() == {}
+        assert journal.replay()["vid1"]["state"] == FAILED
+        assert ledger.get("vid1")["status"] == FAILED
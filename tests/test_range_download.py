@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from benchmarks.http_standin import StandInConfig, StandInServer, expected_content
+from range_download import RangeDownloadError, RangeDownloader
+
+SIZE = 1000 * 1000
+
+
+def standin(size=SIZE, disconnect_after=None):
+    return StandInConfig(video_count=1, video_size=size, info_latency=0, video_latency=0,
+                         disconnect_after=disconnect_after, chunk_size=16 * 1024)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_segments_survive_disconnects(tmp_path):
+    path = str(tmp_path / "video.mp4")
+    with StandInServer(standin(disconnect_after=100 * 1000)) as server:
+        downloader = RangeDownloader(max_connections=4, segment_size=256 * 1024, retries=5)
+        assert downloader.download(f"{server.base_url}/video/vid00000000", path) == SIZE
+    assert downloader.retried > 0
+    assert read(path) == expected_content(SIZE)
+    assert not os.path.exists(path + ".part") and not os.path.exists(path + ".part.json")
+
+
+def test_interrupted_download_resumes_byte_identical(tmp_path):
+    path = str(tmp_path / "video.mp4")
+    config = standin(disconnect_after=100 * 1000)
+    with StandInServer(config) as server:
+        url = f"{server.base_url}/video/vid00000000"
+        with pytest.raises(RangeDownloadError):
+            RangeDownloader(max_connections=2, segment_size=256 * 1024, retries=0).download(url, path)
+        assert os.path.exists(path + ".part.json")
+
+        config.disconnect_after = None
+        config.bytes_sent = 0
+        assert RangeDownloader(max_connections=2, segment_size=256 * 1024).download(url, path) == SIZE
+    assert config.bytes_sent < SIZE
+    assert read(path) == expected_content(SIZE)
+
+
+def test_zero_length_resource(tmp_path):
+    path = str(tmp_path / "empty.mp4")
+    with StandInServer(standin(size=0)) as server:
+        assert RangeDownloader().download(f"{server.base_url}/video/vid00000000", path) == 0
+    assert read(path) == b""
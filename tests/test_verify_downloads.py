@@ -0,0 +1,22 @@
+import os
+
+from ledger import DownloadLedger
+from verify_downloads import verify_video
+
+
+def test_first_verification_detects_same_size_corruption(tmp_path):
+    video_dir = tmp_path / "videos" / "vid1"
+    video_dir.mkdir(parents=True)
+    video_path = video_dir / "video.mp4"
+    video_path.write_bytes(b"original content")
+    for name in ("metadata.json", "video.info.json", "video.description", "video.webp"):
+        (video_dir / name).write_text("")
+
+    with DownloadLedger(str(tmp_path / "ledger.sqlite3")) as ledger:
+        ledger.record_file("vid1", str(video_path))
+        video_path.write_bytes(b"corrupt content!")
+        assert os.path.getsize(video_path) == ledger.get("vid1")["bytes"]
+
+        result = verify_video({"id": "vid1"}, str(tmp_path / "videos"), {"vid1"}, {}, ledger, structure=False)
+    assert "Checksum mismatch" in result["issues"]
+    assert not result["verified"]
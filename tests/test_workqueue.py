@@ -0,0 +1,106 @@
+import os
+import re
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from benchmarks.pipeline import REPO_DIR, install_fake_yt_dlp
+from benchmarks.synthetic_channel import iter_channel
+from metadata_store import MetadataStore, VIDEO
+from workqueue import FAILED, PENDING, WorkQueue
+
+VIDEOS = 6
+
+
+def leased_by(workdir, worker_id):
+    conn = sqlite3.connect(os.path.join(workdir, "downloads", "workqueue.sqlite3"))
+    try:
+        return conn.execute("SELECT video_id FROM items WHERE state = 'leased' AND owner = ?",
+                            (worker_id,)).fetchall()
+    finally:
+        conn.close()
+
+
+def wait_for_lease(workdir, worker_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if leased_by(workdir, worker_id):
+            return
+        time.sleep(0.05)
+    raise AssertionError(f"{worker_id} claimed nothing within {timeout}s")
+
+
+def start_worker(workdir, env, worker_id, latency):
+    env = dict(env, FAKE_YT_DLP_LATENCY=str(latency))
+    return subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, "workqueue.py"), "work", "--backend", "cli", "--worker-id", worker_id,
+         "--workers", "1", "--lease", "1", "--poll-interval", "0.2", "--max-rate", "1000"],
+        cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+
+def downloaded(output):
+    match = re.search(r"\bdownloaded: (\d+)", output)
+    return int(match.group(1)) if match else 0
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGSTOP"), reason="needs POSIX signals")
+def test_each_video_is_installed_once_when_workers_die_or_stall(tmp_path):
+    workdir = str(tmp_path)
+    env = dict(os.environ)
+    env["PATH"] = os.path.join(workdir, "bin") + os.pathsep + env.get("PATH", "")
+    env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    env.update({"FAKE_YT_DLP_VIDEOS": str(VIDEOS), "FAKE_YT_DLP_SHORTS_EVERY": "0", "FAKE_YT_DLP_SIZE": "1024"})
+    install_fake_yt_dlp(os.path.join(workdir, "bin"))
+    os.makedirs(os.path.join(workdir, "metadata"))
+    with MetadataStore(os.path.join(workdir, "metadata", "metadata.sqlite3")) as store:
+        for entry in iter_channel(VIDEOS, shorts_every=0):
+            store.add(entry, VIDEO)
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, "workqueue.py"), "enqueue"], cwd=workdir, env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+
+    # One worker dies mid-download; its yt-dlp keeps writing to its own staging directory
+    killed = start_worker(workdir, env, "killed", latency=5)
+    wait_for_lease(workdir, "killed")
+    killed.kill()
+    killed.wait()
+
+    # Another stalls past its lease while its download finishes
+    stalled = start_worker(workdir, env, "stalled", latency=2)
+    wait_for_lease(workdir, "stalled")
+    (stalled_id,), = leased_by(workdir, "stalled")
+    os.kill(stalled.pid, signal.SIGSTOP)
+    try:
+        healthy = start_worker(workdir, env, "healthy", latency=0)
+        healthy_output, _ = healthy.communicate(timeout=120)
+        time.sleep(2.5)
+    finally:
+        os.kill(stalled.pid, signal.SIGCONT)
+    stalled_output, _ = stalled.communicate(timeout=120)
+
+    assert downloaded(healthy_output) + downloaded(stalled_output) == VIDEOS, healthy_output + stalled_output
+    assert f"Lease of video {stalled_id} was lost" in stalled_output
+    conn = sqlite3.connect(os.path.join(workdir, "downloads", "workqueue.sqlite3"))
+    assert dict(conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state")) == {"done": VIDEOS}
+    conn.close()
+    videos_dir = os.path.join(workdir, "downloads", "videos")
+    assert len(os.listdir(videos_dir)) == VIDEOS
+    for name in os.listdir(videos_dir):
+        assert len([f for f in os.listdir(os.path.join(videos_dir, name)) if f.endswith(".mp4")]) == 1
+    assert not os.path.exists(os.path.join(workdir, "downloads", "partial", "stalled", stalled_id))
+
+
+def test_failed_downloads_are_requeued_until_max_attempts(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite3"), worker_id="w1", max_attempts=2)
+    try:
+        queue.enqueue([{"id": "vid1", "duration": 60}])
+        for expected in (PENDING, FAILED):
+            (video,) = queue.claim()
+            assert queue.complete(video["id"], "HTTP Error 429: Too Many Requests")
+            assert queue.counts()[expected] == 1
+        assert queue.claim() == []
+    finally:
+        queue.close()
@@ -3,132 +3,353 @@
 Script to organize and verify the downloaded videos and metadata
 """
 
+import argparse
 import json
 import os
+import shutil
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime
+from itertools import islice
 
-def organize_and_verify():
+from checksums import file_checksum
+from extract_metadata import iter_metadata
+from jsonstream import JsonArrayWriter, iter_json_array
+from metadata_store import VIDEO
+from ledger import DownloadLedger, LEDGER_FILE
+from metrics import Metrics
+from mp4check import validate_mp4
+
+VERIFICATION_RESULTS_FILE = "downloads/verification_results.json"
+MANIFEST_FILE = "downloads/verification_manifest.json"
+DEFAULT_WORKERS = 8
+# Videos read and verified at a time
+VERIFY_BATCH_SIZE = 256
+
+def file_suffix(name):
+    """
+    Return the suffix a verification check looks for, e.g. ".info.json" or ".mp4"
+    """
+    if name.endswith(".info.json"):
+        return ".info.json"
+    return os.path.splitext(name)[1]
+
+def index_video_dir(video_dir):
+    """
+    Index a video directory with a single os.scandir pass
+
+    Returns a dict mapping each suffix (see file_suffix) to a list of
+    {"name", "size", "mtime"} entries, or None if the directory does not
+    exist. Every verification check is answered from this index.
+    """
+    index = {}
+    try:
+        with os.scandir(video_dir) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                index.setdefault(file_suffix(entry.name), []).append(
+                    {"name": entry.name, "size": st.st_size, "mtime": st.st_mtime}
+                )
+    except FileNotFoundError:
+        return None
+    return index
+
+def load_manifest(path=MANIFEST_FILE):
+    """
+    Load the checksum manifest, mapping video ID to file name, size, mtime and checksum
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    """
+    Atomically replace the checksum manifest
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def video_checksum(video_id, video_dir, video_file, manifest):
+    """
+    Return the checksum of a video file, re-hashing only if it changed
+
+    video_file is an index entry; the manifest entry is reused when its file
+    name, size and mtime all match. A video without a manifest entry is
+    always hashed, so its first verification checks the file against the
+    checksum the ledger recorded at download time.
+    """
+    known = manifest.get(video_id)
+    if known and (known["file"], known["size"], known["mtime"]) == (video_file["name"], video_file["size"], video_file["mtime"]):
+        return known["checksum"]
+    return file_checksum(os.path.join(video_dir, video_file["name"]))
+
+def update_manifest(manifest, verification_results, metrics):
+    """
+    Store the checksums of verification_results in the manifest
+
+    Results whose manifest entry was already up to date count as checksum
+    cache hits in metrics, the others as misses.
+    """
+    for result in verification_results:
+        if "checksum" in result:
+            entry = {
+                "file": result["video_file"],
+                "size": result["video_size"],
+                "mtime": result["video_mtime"],
+                "checksum": result["checksum"]
+            }
+            hit = manifest.get(result["id"]) == entry
+            metrics.inc("cache_hits_total" if hit else "cache_misses_total", cache="checksum")
+            manifest[result["id"]] = entry
+
+def record_results(metrics, verification_results):
+    """
+    Add the verification outcomes and bytes checked to metrics
+    """
+    for result in verification_results:
+        metrics.inc("verified_total", status="verified" if result["verified"] else "failed")
+        metrics.inc("bytes_verified_total", result.get("video_size", 0))
+
+def verify_video(video, videos_dir, video_dirs, manifest=None, ledger=None, structure=True):
+    """
+    Verify one downloaded video against the files in its directory
+
+    video_dirs is the set of directory names found under videos_dir. When a
+    manifest is given the video file is checksummed (see video_checksum)
+    and compared with the checksum the ledger recorded at download time.
+    With structure set the MP4 box structure and duration are validated.
+    """
+    video_id = video.get('id')
+    video_title = video.get('title')
+    
+    result = {
+        "id": video_id,
+        "title": video_title,
+        "verified": False,
+        "issues": []
+    }
+    
+    # Check if video directory exists
+    video_dir = os.path.join(videos_dir, video_id)
+    index = index_video_dir(video_dir) if video_id in video_dirs else None
+    if index is None:
+        result["issues"].append(f"Video directory not found")
+        return result
+    
+    # Check for video file
+    video_files = index.get('.mp4', [])
+    if not video_files:
+        result["issues"].append(f"No video file found")
+    else:
+        result["video_file"] = video_files[0]["name"]
+        result["video_size"] = video_files[0]["size"]
+        result["video_mtime"] = video_files[0]["mtime"]
+        
+        if structure:
+            result["issues"].extend(validate_mp4(os.path.join(video_dir, video_files[0]["name"]), video.get('duration')))
+        
+        if manifest is not None:
+            result["checksum"] = video_checksum(video_id, video_dir, video_files[0], manifest)
+            recorded = ledger.get(video_id) if ledger is not None else None
+            if recorded and recorded["checksum"] and recorded["checksum"] != result["checksum"]:
+                result["issues"].append(f"Checksum mismatch")
+    
+    # Check for metadata files
+    if not any(f["name"] == "metadata.json" for f in index.get('.json', [])):
+        result["issues"].append(f"metadata.json not found")
+    
+    if not index.get('.info.json'):
+        result["issues"].append(f"info.json not found")
+    
+    if not index.get('.description'):
+        result["issues"].append(f"description file not found")
+    
+    if not index.get('.webp'):
+        result["issues"].append(f"thumbnail not found")
+    
+    # Mark as verified if no issues
+    if not result["issues"]:
+        result["verified"] = True
+    
+    return result
+
+def organize_and_verify(expected_videos=None, checkpoint=True, workers=DEFAULT_WORKERS, checksums=True, structure=True,
+                        metrics=None, collect=True, keep_previous=False):
     """
     Organize and verify the downloaded videos and metadata
+
+    expected_videos is the list returned by extract_metadata(), or any
+    iterable of entries; when omitted it is streamed from the metadata
+    store. Videos are read VERIFY_BATCH_SIZE at a time, and each batch is
+    checked on a pool of workers threads and written out before the next
+    is read. Each video directory is scanned once. With checksums set
+    every video file is checksummed, re-hashing only files whose size or
+    mtime changed since MANIFEST_FILE was written. With structure set each
+    .mp4 is also checked for truncation or corruption by walking its box
+    headers. Per-video verification times, checksum manifest hits and
+    bytes checked are recorded in metrics. Returns the list of per-video
+    verification results, or None on failure. When checkpoint is set the
+    results are also streamed to VERIFICATION_RESULTS_FILE, and with
+    collect=False only the results of videos that failed verification
+    are kept and returned. With keep_previous set (incremental runs, which
+    verify only the new uploads) the previous results of the videos not
+    verified now are carried over into VERIFICATION_RESULTS_FILE.
     """
     print("Organizing and verifying downloads...")
     
     # Define paths
     videos_dir = os.path.abspath("downloads/videos")
     
-    # Check if videos directory exists
-    if not os.path.exists(videos_dir):
-        print(f"Error: Videos directory {videos_dir} does not exist")
-        return False
-    
     # Read the videos metadata
     try:
-        with open("metadata/videos_metadata.json", "r") as f:
-            expected_videos = json.load(f)
+        if expected_videos is None:
+            expected_videos = iter_metadata(VIDEO, fields=("id", "title", "duration"))
         
-        print(f"Expected {len(expected_videos)} videos")
+        if isinstance(expected_videos, list):
+            print(f"Expected {len(expected_videos)} videos")
         
         # Get list of downloaded video directories
-        video_dirs = [d for d in os.listdir(videos_dir) if os.path.isdir(os.path.join(videos_dir, d))]
+        try:
+            with os.scandir(videos_dir) as it:
+                video_dirs = {entry.name for entry in it if entry.is_dir()}
+        except FileNotFoundError:
+            print(f"Error: Videos directory {videos_dir} does not exist")
+            return None
         print(f"Found {len(video_dirs)} video directories")
         
         # Verify each video
+        if metrics is None:
+            metrics = Metrics()
+        manifest = load_manifest() if checksums else None
+        ledger = DownloadLedger(LEDGER_FILE) if checksums and os.path.exists(LEDGER_FILE) else None
+        
+        def verify(video):
+            with metrics.phase("verify"):
+                return verify_video(video, videos_dir, video_dirs, manifest, ledger, structure)
+        
+        # Without the results file the report is written from the kept results
+        keep_all = collect or not checkpoint
         verification_results = []
-        for video in expected_videos:
-            video_id = video.get('id')
-            video_title = video.get('title')
-            
-            result = {
-                "id": video_id,
-                "title": video_title,
-                "verified": False,
-                "issues": []
-            }
-            
-            # Check if video directory exists
-            video_dir = os.path.join(videos_dir, video_id)
-            if not os.path.exists(video_dir):
-                result["issues"].append(f"Video directory not found")
-                verification_results.append(result)
-                continue
-            
-            # Check for video file
-            video_files = [f for f in os.listdir(video_dir) if f.endswith('.mp4')]
-            if not video_files:
-                result["issues"].append(f"No video file found")
-            else:
-                result["video_file"] = video_files[0]
-            
-            # Check for metadata files
-            if not os.path.exists(os.path.join(video_dir, "metadata.json")):
-                result["issues"].append(f"metadata.json not found")
-            
-            if not any(f.endswith('.info.json') for f in os.listdir(video_dir)):
-                result["issues"].append(f"info.json not found")
-            
-            if not any(f.endswith('.description') for f in os.listdir(video_dir)):
-                result["issues"].append(f"description file not found")
-            
-            if not any(f.endswith('.webp') for f in os.listdir(video_dir)):
-                result["issues"].append(f"thumbnail not found")
-            
-            # Mark as verified if no issues
-            if not result["issues"]:
-                result["verified"] = True
-            
-            verification_results.append(result)
+        verified_count = 0
+        total_count = 0
+        verified_ids = set()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool, ExitStack() as stack:
+                writer = stack.enter_context(JsonArrayWriter(VERIFICATION_RESULTS_FILE)) if checkpoint else None
+                videos = iter(expected_videos)
+                while True:
+                    batch = list(islice(videos, VERIFY_BATCH_SIZE))
+                    if not batch:
+                        break
+                    results = list(pool.map(verify, batch))
+                    
+                    # Update the checksum manifest
+                    if manifest is not None:
+                        update_manifest(manifest, results, metrics)
+                    record_results(metrics, results)
+                    
+                    for result in results:
+                        total_count += 1
+                        verified_count += bool(result["verified"])
+                        if writer is not None:
+                            writer.write(result)
+                        if keep_all or not result["verified"]:
+                            verification_results.append(result)
+                        if keep_previous:
+                            verified_ids.add(result["id"])
+                if writer is not None and keep_previous:
+                    carry_over_results(writer, verified_ids)
+        finally:
+            if ledger is not None:
+                ledger.close()
         
-        # Save verification results
-        with open("downloads/verification_results.json", "w") as f:
-            json.dump(verification_results, f, indent=2)
+        if manifest is not None:
+            save_manifest(manifest)
         
         # Create a human-readable verification report
-        create_verification_report(verification_results)
+        create_verification_report(iter_json_array(VERIFICATION_RESULTS_FILE) if checkpoint else verification_results)
         
         # Check overall verification status
-        verified_count = sum(1 for r in verification_results if r["verified"])
-        print(f"Verified {verified_count} out of {len(expected_videos)} videos")
+        print(f"Verified {verified_count} out of {total_count} videos")
         
-        if verified_count == len(expected_videos):
+        if verified_count == total_count:
             print("All videos successfully verified")
-            return True
         else:
-            print(f"Warning: {len(expected_videos) - verified_count} videos failed verification")
-            return False
+            print(f"Warning: {total_count - verified_count} videos failed verification")
+        
+        return verification_results
     
     except Exception as e:
         print(f"Error during verification: {e}")
-        return False
+        return None
+
+def carry_over_results(writer, verified_ids, path=VERIFICATION_RESULTS_FILE):
+    """
+    Copy the results in path of the videos not in verified_ids to writer
+
+    writer, a JsonArrayWriter, replaces path only when it is closed, so
+    the previous results can be read while the new ones are written.
+    Returns the number of results copied.
+    """
+    if not os.path.exists(path):
+        return 0
+    copied = 0
+    for result in iter_json_array(path):
+        if result.get("id") not in verified_ids:
+            writer.write(result)
+            copied += 1
+    return copied
 
 def create_verification_report(verification_results):
     """
     Create a human-readable verification report
+
+    verification_results may be any iterable and is consumed once; the
+    details are spooled to a temporary file until the totals are known.
     """
-    with open("downloads/verification_report.txt", "w") as f:
-        f.write(f"Video Download Verification Report\n")
-        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        
-        verified_count = sum(1 for r in verification_results if r["verified"])
-        f.write(f"Summary: {verified_count} out of {len(verification_results)} videos verified\n\n")
-        
-        f.write("=== VERIFICATION DETAILS ===\n")
+    verified_count = 0
+    total_count = 0
+    with tempfile.TemporaryFile(mode="w+") as details:
         for result in verification_results:
-            f.write(f"\nVideo: {result['title']} (ID: {result['id']})\n")
-            f.write(f"Status: {'✓ Verified' if result['verified'] else '✗ Failed'}\n")
+            total_count += 1
+            verified_count += bool(result["verified"])
+            details.write(f"\nVideo: {result['title']} (ID: {result['id']})\n")
+            details.write(f"Status: {'✓ Verified' if result['verified'] else '✗ Failed'}\n")
             
             if "video_file" in result:
-                f.write(f"Video file: {result['video_file']}\n")
+                details.write(f"Video file: {result['video_file']}\n")
             
             if result["issues"]:
-                f.write("Issues:\n")
+                details.write("Issues:\n")
                 for issue in result["issues"]:
-                    f.write(f"  - {issue}\n")
+                    details.write(f"  - {issue}\n")
+        
+        with open("downloads/verification_report.txt", "w") as f:
+            f.write(f"Video Download Verification Report\n")
+            f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+            f.write(f"Summary: {verified_count} out of {total_count} videos verified\n\n")
+            
+            f.write("=== VERIFICATION DETAILS ===\n")
+            details.seek(0)
+            shutil.copyfileobj(details, f)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Verify the downloaded videos and metadata.')
+    parser.add_argument('--no-checksums', action='store_true', help='Skip video file checksums')
+    parser.add_argument('--no-structure', action='store_true', help='Skip MP4 structure and duration checks')
+    args = parser.parse_args()
+    
     print(f"Starting organization and verification at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    success = organize_and_verify()
-    if success:
+    results = organize_and_verify(checksums=not args.no_checksums, structure=not args.no_structure, collect=False)
+    if results is not None and all(r["verified"] for r in results):
         print("Successfully organized and verified downloads")
     else:
         print("Verification completed with issues")
@@ -0,0 +1,445 @@
+
+"""
+Lease-based work queue for sharing one channel archive between hosts
+
+The queue is a SQLite database next to the shared downloads/videos/ tree.
+Any host can enqueue the extracted videos; every worker process then
+claims videos under a time-limited lease, renews its leases with
+heartbeats while downloading, and marks each video done or failed. A
+worker that crashes stops renewing, its leases expire and other workers
+re-claim the videos, so every video is downloaded by exactly one live
+worker at a time.
+
+    python workqueue.py enqueue
+    python workqueue.py work --workers 4
+    python workqueue.py status
+
+SQLite relies on the file system's locks, so the database must be on a
+file system with working POSIX locking (a local disk for several
+processes, or a shared mount that supports it). Lease times are wall
+clock times, so hosts need roughly synchronised clocks.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+from backends import BACKENDS, DEFAULT_BACKEND, BackendError, get_backend
+from download_videos import (HostLimiter, download_video, failed_outcome, positive_int, summarize_outcomes,
+                             DEFAULT_PER_HOST)
+from extract_metadata import iter_metadata
+from ledger import DownloadLedger, LEDGER_FILE
+from metadata_store import compact_entry, VIDEO
+from ratelimit import AdaptiveRateLimiter, DEFAULT_MAX_RATE
+from scheduling import estimate_size
+
+WORK_QUEUE_FILE = "downloads/workqueue.sqlite3"
+DEFAULT_LEASE = 300.0  # seconds
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_WORKERS = 4
+
+# Item states
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+def default_worker_id():
+    """
+    Return an ID unique to this process on this host
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """
+    SQLite-backed queue of videos with leases
+
+    Each row holds one video, its state (PENDING, LEASED, DONE or
+    FAILED), the worker holding its lease, the lease expiry time and the
+    number of claims so far. claim() leases the smallest waiting videos
+    first, including leased ones whose lease has expired, in a single
+    write transaction, so two workers never get the same video. A video
+    whose download failed goes back to PENDING; once a video has been
+    claimed max_attempts times, a failure or an expired lease marks it
+    FAILED instead of handing it out again. heartbeat() extends every lease this
+    object holds; start() runs it on a background thread every third of
+    the lease time. complete() and release() only act on videos whose
+    lease is still held by worker_id, so a worker that lost a lease
+    cannot overwrite the result of the worker that re-claimed it. Safe to
+    share between the threads of one process; each process opens its own
+    WorkQueue.
+    """
+    
+    def __init__(self, path=WORK_QUEUE_FILE, worker_id=None, lease=DEFAULT_LEASE, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 clock=time.time):
+        self.path = path
+        self.worker_id = worker_id or default_worker_id()
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._held = set()
+        self._stop = threading.Event()
+        self._heartbeat_thread = None
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " video_id TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " priority REAL NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " state TEXT NOT NULL,"
+            " owner TEXT,"
+            " lease_expires REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " updated_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS items_waiting ON items (state, priority, position);"
+        )
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def _write(self, func):
+        """
+        Run func(conn) inside one IMMEDIATE transaction and return its result
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+    
+    def enqueue(self, videos):
+        """
+        Add videos to the queue; videos that are already queued are left alone
+
+        Returns the number of videos added. Every host may enqueue the same
+        listing without creating duplicates.
+        """
+        now = self._clock()
+        
+        def insert(conn):
+            position = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM items").fetchone()[0]
+            added = 0
+            for video in videos:
+                video = compact_entry(video)
+                if not video.get("id"):
+                    continue
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO items (video_id, payload, priority, position, state, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (video["id"], json.dumps(video, separators=(",", ":")), estimate_size(video), position, PENDING, now)
+                )
+                added += cursor.rowcount
+                position += 1
+            return added
+        
+        return self._write(insert)
+    
+    def claim(self, limit=1):
+        """
+        Lease up to limit waiting videos to this worker and return them
+
+        Videos whose lease expired are re-claimed; those that have used up
+        max_attempts are marked FAILED instead.
+        """
+        now = self._clock()
+        
+        def lease(conn):
+            conn.execute(
+                "UPDATE items SET state = ?, owner = NULL, error = ?, updated_at = ?"
+                " WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, "lease expired too many times", now, LEASED, now, self.max_attempts)
+            )
+            rows = conn.execute(
+                "SELECT video_id, payload FROM items"
+                " WHERE state = ? OR (state = ? AND lease_expires < ?)"
+                " ORDER BY priority, position LIMIT ?",
+                (PENDING, LEASED, now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE items SET state = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE video_id = ?",
+                [(LEASED, self.worker_id, now + self.lease, now, video_id) for video_id, _ in rows]
+            )
+            return rows
+        
+        rows = self._write(lease)
+        with self._lock:
+            self._held.update(video_id for video_id, _ in rows)
+        return [json.loads(payload) for _, payload in rows]
+    
+    def heartbeat(self):
+        """
+        Extend the lease of every video this worker holds
+
+        Returns the IDs whose lease had already been lost; they are
+        forgotten and should not be completed.
+        """
+        with self._lock:
+            held = list(self._held)
+        if not held:
+            return set()
+        now = self._clock()
+        
+        def renew(conn):
+            lost = set()
+            for video_id in held:
+                cursor = conn.execute(
+                    "UPDATE items SET lease_expires = ?, updated_at = ? WHERE video_id = ? AND state = ? AND owner = ?",
+                    (now + self.lease, now, video_id, LEASED, self.worker_id)
+                )
+                if not cursor.rowcount:
+                    lost.add(video_id)
+            return lost
+        
+        lost = self._write(renew)
+        with self._lock:
+            self._held -= lost
+        return lost
+    
+    def holds(self, video_id):
+        """
+        Return True if this worker still holds the lease of video_id
+        """
+        with self._lock:
+            return video_id in self._held
+    
+    def confirm(self, video_id):
+        """
+        Extend the lease of video_id and return True if this worker still held it
+
+        Unlike holds(), this checks the database, so it also notices a lease
+        that expired and was re-claimed since the last heartbeat. Call it
+        right before acting on a video; the lease then lasts long enough for
+        the action to finish.
+        """
+        now = self._clock()
+        held = self._write(lambda conn: conn.execute(
+            "UPDATE items SET lease_expires = ?, updated_at = ? WHERE video_id = ? AND state = ? AND owner = ?",
+            (now + self.lease, now, video_id, LEASED, self.worker_id)
+        ).rowcount == 1)
+        if not held:
+            with self._lock:
+                self._held.discard(video_id)
+        return held
+    
+    def _finish(self, video_id, state, error=None, attempt_used=True, retry=False):
+        now = self._clock()
+        
+        def update(conn):
+            # With retry set, a video with attempts left goes back to PENDING instead of state
+            cursor = conn.execute(
+                "UPDATE items SET state = CASE WHEN attempts < ? THEN ? ELSE ? END, owner = NULL,"
+                " lease_expires = NULL, error = ?, updated_at = ?,"
+                " attempts = attempts - ? WHERE video_id = ? AND state = ? AND owner = ?",
+                (self.max_attempts if retry else 0, PENDING, state, error, now, 0 if attempt_used else 1,
+                 video_id, LEASED, self.worker_id)
+            )
+            return cursor.rowcount == 1
+        
+        finished = self._write(update)
+        with self._lock:
+            self._held.discard(video_id)
+        return finished
+    
+    def complete(self, video_id, error=None):
+        """
+        Mark a leased video DONE, or record a failed attempt when error is given
+
+        A failed video is queued again until it has been claimed
+        max_attempts times, and is then marked FAILED. Returns False if
+        this worker no longer held the lease.
+        """
+        if error:
+            return self._finish(video_id, FAILED, error, retry=True)
+        return self._finish(video_id, DONE)
+    
+    def release(self, video_id):
+        """
+        Hand a leased video back without using up an attempt
+        """
+        return self._finish(video_id, PENDING, attempt_used=False)
+    
+    def requeue_failed(self):
+        """
+        Make every FAILED video PENDING again with fresh attempts; returns how many
+        """
+        now = self._clock()
+        return self._write(lambda conn: conn.execute(
+            "UPDATE items SET state = ?, attempts = 0, error = NULL, updated_at = ? WHERE state = ?",
+            (PENDING, now, FAILED)
+        ).rowcount)
+    
+    def counts(self):
+        """
+        Return the number of videos in each state
+        """
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state"))
+        return {state: counts.get(state, 0) for state in (PENDING, LEASED, DONE, FAILED)}
+    
+    def finished(self):
+        """
+        Return True when no video is waiting or leased
+        """
+        counts = self.counts()
+        return not counts[PENDING] and not counts[LEASED]
+    
+    def start(self):
+        """
+        Start renewing this worker's leases in the background
+        """
+        if self._heartbeat_thread is None:
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+            self._heartbeat_thread.start()
+    
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.lease / 3):
+            try:
+                lost = self.heartbeat()
+            except sqlite3.Error as e:
+                print(f"Work queue heartbeat failed: {e}")
+                continue
+            for video_id in lost:
+                print(f"Lost the lease of video {video_id}")
+    
+    def close(self):
+        """
+        Stop the heartbeat, release any videos still held and close the database
+        """
+        self._stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+        with self._lock:
+            held = list(self._held)
+        for video_id in held:
+            self.release(video_id)
+        with self._lock:
+            self._conn.close()
+
+def work(queue, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, ledger_path=LEDGER_FILE, backend=None,
+         rate_limiter=None, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    Download videos claimed from queue until it is finished
+
+    Each of workers threads claims one video at a time and downloads it
+    with download_videos.download_video into the shared downloads/videos
+    tree. Videos are staged in a directory of this worker's own and only
+    installed if the lease is still held (WorkQueue.confirm()), so a worker
+    that stalled past its lease discards its copy instead of replacing the
+    one of the worker that re-claimed the video. When nothing can be
+    claimed but other workers still hold leases the thread waits
+    poll_interval seconds, in case one of them crashes and its leases
+    expire. Returns the list of outcomes of this process.
+    """
+    videos_dir = os.path.abspath("downloads/videos")
+    os.makedirs(videos_dir, exist_ok=True)
+    host_limiter = HostLimiter(per_host)
+    ledger = DownloadLedger(ledger_path) if ledger_path else None
+    if rate_limiter is None:
+        rate_limiter = AdaptiveRateLimiter(rate=DEFAULT_MAX_RATE)
+    outcomes = []
+    
+    def worker():
+        while True:
+            claimed = queue.claim()
+            if not claimed:
+                if queue.finished():
+                    return
+                time.sleep(poll_interval)
+                continue
+            video = claimed[0]
+            try:
+                outcome = download_video(video, videos_dir, backend, host_limiter, ledger, rate_limiter,
+                                         worker=queue.worker_id, holds_lease=partial(queue.confirm, video["id"]))
+            except Exception as e:
+                outcome = failed_outcome(video, e)
+            if outcome["status"] == "lost":
+                print(f"Lease of video {video['id']} was lost; discarded this worker's copy")
+            elif not queue.complete(video["id"], outcome["error"] if outcome["status"] == "failed" else None):
+                print(f"Lease of video {video['id']} was lost; another worker owns it now")
+            outcomes.append(outcome)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for future in [pool.submit(worker) for _ in range(max(1, workers))]:
+                future.result()
+    finally:
+        if ledger is not None:
+            ledger.close()
+    return outcomes
+
+def print_counts(queue):
+    counts = queue.counts()
+    print(", ".join(f"{state}: {count}" for state, count in counts.items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Share the downloads of a channel between several worker processes.')
+    parser.add_argument('command', choices=['enqueue', 'work', 'status', 'retry'],
+                        help='enqueue the extracted videos, work on the queue, show its status or retry failed videos')
+    parser.add_argument('--queue', default=WORK_QUEUE_FILE, help=f'Work queue database (default: {WORK_QUEUE_FILE})')
+    parser.add_argument('--worker-id', default=None, help='Name of this worker (default: host:pid)')
+    parser.add_argument('--workers', '-w', type=positive_int, default=DEFAULT_WORKERS, help='Concurrent downloads in this process')
+    parser.add_argument('--per-host', type=positive_int, default=DEFAULT_PER_HOST, help='Maximum concurrent downloads per host')
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE,
+                        help=f'Seconds a claimed video stays leased without a heartbeat (default: {DEFAULT_LEASE:g})')
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help=f'Claims of a video before it is marked failed (default: {DEFAULT_MAX_ATTEMPTS})')
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help='Seconds to wait when every remaining video is leased by another worker')
+    parser.add_argument('--max-rate', type=float, default=DEFAULT_MAX_RATE,
+                        help=f'Maximum download requests per second of this process (default: {DEFAULT_MAX_RATE})')
+    parser.add_argument('--backend', choices=['auto'] + sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help='Use yt-dlp as an in-process library or as a command line tool (default: auto)')
+    args = parser.parse_args()
+    
+    queue = WorkQueue(args.queue, worker_id=args.worker_id, lease=args.lease, max_attempts=args.max_attempts)
+    if args.command == 'enqueue':
+        with queue:
+            added = queue.enqueue(iter_metadata(VIDEO))
+            print(f"Queued {added} new videos in {args.queue}")
+            print_counts(queue)
+    elif args.command == 'status':
+        with queue:
+            print_counts(queue)
+    elif args.command == 'retry':
+        with queue:
+            print(f"Requeued {queue.requeue_failed()} failed videos")
+    else:
+        print(f"Worker {queue.worker_id} starting at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        try:
+            backend = get_backend(args.backend)
+        except BackendError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        with backend, queue:
+            outcomes = work(queue, workers=args.workers, per_host=args.per_host, backend=backend,
+                            rate_limiter=AdaptiveRateLimiter(rate=args.max_rate, max_rate=args.max_rate),
+                            poll_interval=args.poll_interval)
+            summarize_outcomes(outcomes)
+            print_counts(queue)
@@ -1,10 +1,17 @@
 import os
 import json
-import time
 import argparse
 
 import pytube
-from pytube import Channel, exceptions
+from pytube import Channel, exceptions, extract
+
+from blobstore import BlobStore
+from ledger import DownloadLedger, DOWNLOADED, FAILED, SHORT
+from metadata_cache import field_class, MetadataCache
+from metrics import Metrics
+from range_download import RangeDownloader
+from ratelimit import AdaptiveRateLimiter, DEFAULT_MAX_RATE
+from shorts import ShortClassifier
 
 
 class YouTubeChannelDownloader:
@@ -12,7 +19,9 @@ class YouTubeChannelDownloader:
     A simpler, more reliable YouTube channel downloader using pytube's Channel class.
     """
     
-    def __init__(self, channel_url, output_dir="downloads", skip_shorts=True, delay=1.5):
+    def __init__(self, channel_url, output_dir="downloads", skip_shorts=True, delay=1.5, ledger_path=None,
+                 rate_limiter=None, video_factory=pytube.YouTube, range_downloader=None, metadata_cache=None,
+                 metrics=None, blob_store=None):
         """
         Initialize the YouTube channel downloader.
         
@@ -20,12 +29,30 @@ class YouTubeChannelDownloader:
             channel_url (str): URL of the YouTube channel
             output_dir (str): Directory to save downloaded videos and metadata
             skip_shorts (bool): Whether to skip YouTube Shorts
-            delay (float): Delay between requests to avoid rate limiting
+            delay (float): Initial delay between requests; adapts to throttling
+            ledger_path (str): Download ledger file (default: <output_dir>/ledger.sqlite3)
+            rate_limiter (AdaptiveRateLimiter): Limiter to share with other downloaders
+                (default: a new one starting at one request per delay seconds)
+            video_factory (callable): Builds a video object from a URL (default: pytube.YouTube)
+            range_downloader (RangeDownloader): Fetches stream URLs as resumable parallel
+                segments (default: a new RangeDownloader); pass False to use stream.download
+            metadata_cache (MetadataCache): Per-video metadata cache
+                (default: <output_dir>/metadata_cache.sqlite3)
+            metrics (Metrics): Collects phase timings, bytes, retries and cache hits;
+                written to <output_dir>/metrics.json and metrics.prom after a run
+            blob_store (BlobStore): Content-addressed store shared with other output
+                directories; videos already in it are linked instead of downloaded
         """
         self.channel_url = channel_url
         self.output_dir = output_dir
         self.skip_shorts = skip_shorts
         self.delay = delay
+        self.video_factory = video_factory
+        self.range_downloader = RangeDownloader() if range_downloader is None else range_downloader
+        self.short_classifier = ShortClassifier()
+        self.metadata_cache = MetadataCache(os.path.join(output_dir, "metadata_cache.sqlite3")) if metadata_cache is None else metadata_cache
+        self.metrics = Metrics() if metrics is None else metrics
+        self.blob_store = blob_store
         self.video_dir = os.path.join(output_dir, "videos")
         self.metadata_dir = os.path.join(output_dir, "metadata")
         
@@ -33,13 +60,20 @@ class YouTubeChannelDownloader:
         os.makedirs(self.video_dir, exist_ok=True)
         os.makedirs(self.metadata_dir, exist_ok=True)
         
+        self.ledger = DownloadLedger(ledger_path or os.path.join(output_dir, "ledger.sqlite3"))
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(rate=1.0 / delay if delay > 0 else DEFAULT_MAX_RATE)
+        
         print(f"Initialized downloader for channel: {channel_url}")
         print(f"Output directory: {os.path.abspath(output_dir)}")
     
-    def get_video_list(self):
+    def get_video_list(self, stop_after=None):
         """
         Get a list of all videos from the channel using pytube's Channel class.
         
+        Args:
+            stop_after (int): If set, stop walking the channel (newest first) after
+                this many consecutive videos that are already in the ledger
+        
         Returns:
             list: List of video URLs
         """
@@ -48,9 +82,19 @@ class YouTubeChannelDownloader:
             # Use pytube's Channel class which handles the dynamic loading
             channel = Channel(self.channel_url)
             
-            # Get all video URLs
-            video_urls = list(channel.video_urls)
-            print(f"Found {len(video_urls)} total videos")
+            # Iterating video_urls loads further pages only as they are needed
+            video_urls = []
+            streak = 0
+            for video_url in channel.video_urls:
+                if stop_after and self.is_known(extract.video_id(video_url)):
+                    streak += 1
+                    if streak >= stop_after:
+                        print(f"Stopped after {streak} consecutive known videos")
+                        break
+                    continue
+                streak = 0
+                video_urls.append(video_url)
+            print(f"Found {len(video_urls)} {'new' if stop_after else 'total'} videos")
             
             # If we're skipping shorts, filter them out
             if self.skip_shorts:
@@ -66,39 +110,73 @@ class YouTubeChannelDownloader:
             print(f"Error fetching video list: {str(e)}")
             return []
     
-    def is_short(self, video):
+    def is_short(self, video, video_data=None):
         """
         Check if a video is a YouTube Short.
         
+        The URL and duration decide most videos without another request; the
+        stream manifest is only probed when they are inconclusive. Decisions
+        are cached by video ID.
+        
         Args:
             video (pytube.YouTube): A pytube YouTube object
+            video_data (dict): Metadata from collect_metadata, used instead of
+                fetching the duration again
             
         Returns:
             bool: True if the video is a short, False otherwise
         """
-        # Method 1: Check duration (Shorts are typically under 60 seconds)
-        if video.length < 60:
-            # Method 2: Check video dimensions (Shorts are vertical)
-            streams = video.streams.filter(progressive=True, file_extension='mp4')
-            for stream in streams:
-                if hasattr(stream, 'resolution'):
-                    # Try to extract height and width
-                    try:
-                        res = stream.resolution
-                        if res:
-                            width, height = map(int, res.split('x'))
-                            # Vertical video (height > width) is likely a Short
-                            if height > width:
-                                return True
-                    except:
-                        pass
-        
-        # Method 3: Check URL for shorts path
-        if '/shorts/' in video.watch_url:
-            return True
+        cached = self.short_classifier.cached(video.video_id)
+        if cached is not None:
+            self.metrics.inc("cache_hits_total", cache="shorts")
+            return cached
+        self.metrics.inc("cache_misses_total", cache="shorts")
+        with self.metrics.phase("classification"):
+            entry = {
+                'id': video.video_id,
+                'webpage_url': video.watch_url,
+                'duration': video_data['length'] if video_data else video.length,
+            }
+            return self.short_classifier.classify(entry, probe=lambda entry: self.has_vertical_stream(video))
+    
+    def has_vertical_stream(self, video):
+        """
+        Check the stream manifest for a vertical progressive stream.
+        
+        Args:
+            video (pytube.YouTube): A pytube YouTube object
             
+        Returns:
+            bool: True if a stream is taller than it is wide
+        """
+        streams = video.streams.filter(progressive=True, file_extension='mp4')
+        for stream in streams:
+            if hasattr(stream, 'resolution'):
+                # Try to extract height and width
+                try:
+                    res = stream.resolution
+                    if res:
+                        width, height = map(int, res.split('x'))
+                        # Vertical video (height > width) is likely a Short
+                        if height > width:
+                            return True
+                except:
+                    pass
         return False
     
+    def is_known(self, video_id):
+        """
+        Check whether the ledger already settles a video without network access.
+        
+        Args:
+            video_id (str): YouTube video ID
+            
+        Returns:
+            bool: True if the video is already downloaded, or is a known Short being skipped
+        """
+        status = self.ledger.status(video_id)
+        return status == DOWNLOADED or (status == SHORT and self.skip_shorts)
+    
     def download_video(self, video_url):
         """
         Download a single video and its metadata.
@@ -110,64 +188,22 @@ class YouTubeChannelDownloader:
             bool: True if download was successful, False otherwise
         """
         try:
-            # Create a YouTube object
-            yt = pytube.YouTube(video_url)
-            
-            video_id = yt.video_id
-            title = yt.title
-            
-            print(f"\nProcessing: {title} ({video_id})")
-            
-            # Check if it's a short and we're skipping shorts
-            if self.skip_shorts and self.is_short(yt):
-                print(f"Skipping YouTube Short: {title}")
-                return False
-            
-            # Check if already downloaded
-            video_filename = f"{video_id}.mp4"
-            metadata_filename = f"{video_id}.json"
-            video_path = os.path.join(self.video_dir, video_filename)
-            metadata_path = os.path.join(self.metadata_dir, metadata_filename)
-            
-            if os.path.exists(video_path) and os.path.exists(metadata_path):
-                print(f"Video and metadata already exist. Skipping.")
-                return True
-            
-            # Prepare metadata
-            video_data = {
-                'video_id': video_id,
-                'title': title,
-                'url': video_url,
-                'description': yt.description,
-                'author': yt.author,
-                'publish_date': str(yt.publish_date) if yt.publish_date else 'Unknown',
-                'length': yt.length,
-                'views': yt.views,
-                'keywords': yt.keywords,
-                'channel_id': yt.channel_id,
-                'channel_url': yt.channel_url,
-            }
+            # Consult the ledger before any network request
+            video_id = extract.video_id(video_url)
+            if self.is_known(video_id):
+                print(f"\n{video_id} already processed ({self.ledger.status(video_id)}). Skipping.")
+                return self.ledger.is_downloaded(video_id)
             
-            # Save metadata
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(video_data, f, indent=4, ensure_ascii=False)
+            # Wait for the shared rate limiter before touching the network
+            self.rate_limiter.acquire()
+            try:
+                downloaded = self.fetch_and_download(video_url, video_id)
+            except Exception as e:
+                self.rate_limiter.record(e)
+                raise
+            self.rate_limiter.record()
+            return downloaded
             
-            # Download the video (highest resolution)
-            print(f"Downloading video...")
-            stream = yt.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first()
-            
-            if not stream:
-                print(f"No suitable stream found for {video_id}. Trying audio only.")
-                stream = yt.streams.filter(only_audio=True).first()
-                
-            if stream:
-                stream.download(output_path=self.video_dir, filename=video_filename)
-                print(f"Successfully downloaded: {title}")
-                return True
-            else:
-                print(f"No streams available for {video_id}")
-                return False
-                
         except exceptions.VideoUnavailable:
             print(f"Video {video_url} is unavailable, skipping.")
             return False
@@ -175,14 +211,186 @@ class YouTubeChannelDownloader:
             print(f"Error downloading {video_url}: {str(e)}")
             return False
     
-    def download_all_videos(self):
+    def fetch_and_download(self, video_url, video_id):
+        """
+        Fetch a video's metadata and download it, without error handling.
+        
+        Args:
+            video_url (str): URL of the video to download
+            video_id (str): YouTube video ID
+            
+        Returns:
+            bool: True if download was successful, False otherwise
+        """
+        # Create a YouTube object
+        yt = self.video_factory(video_url)
+        
+        video_data = self.collect_metadata(yt, video_url)
+        title = video_data['title']
+        
+        print(f"\nProcessing: {title} ({video_id})")
+        
+        # Check if it's a short and we're skipping shorts
+        if self.skip_shorts and self.is_short(yt, video_data):
+            print(f"Skipping YouTube Short: {title}")
+            self.ledger.record(video_id, SHORT)
+            return False
+        
+        # Check if already downloaded
+        video_path, metadata_path = self.video_paths(video_id)
+        
+        if os.path.exists(video_path) and os.path.exists(metadata_path):
+            print(f"Video and metadata already exist. Skipping.")
+            self.ledger.record_file(video_id, video_path)
+            return True
+        
+        # Save metadata
+        self.save_metadata(video_data, metadata_path)
+        
+        if self.link_stored(video_id):
+            return True
+        
+        return self.download_stream(yt, video_id)
+    
+    def video_paths(self, video_id):
+        """
+        Return the paths of a video's file and metadata file.
+        
+        Args:
+            video_id (str): YouTube video ID
+            
+        Returns:
+            tuple: (video_path, metadata_path)
+        """
+        video_path = os.path.join(self.video_dir, f"{video_id}.mp4")
+        metadata_path = os.path.join(self.metadata_dir, f"{video_id}.json")
+        return video_path, metadata_path
+    
+    def collect_metadata(self, yt, video_url):
+        """
+        Gather the metadata saved alongside a video, from the cache when fresh.
+        
+        Only the field classes whose cache entries are missing or expired
+        are fetched again, so an expired view count does not refetch the title.
+        
+        Args:
+            yt (pytube.YouTube): A pytube YouTube object
+            video_url (str): URL of the video
+            
+        Returns:
+            dict: Video metadata
+        """
+        cached, stale = self.metadata_cache.lookup(yt.video_id)
+        if not stale:
+            self.metrics.inc("cache_hits_total", cache="metadata")
+            return cached
+        self.metrics.inc("cache_misses_total", cache="metadata")
+        
+        # Fields are read lazily: each pytube attribute may cost a request
+        fields = {
+            'video_id': lambda: yt.video_id,
+            'title': lambda: yt.title,
+            'url': lambda: video_url,
+            'description': lambda: yt.description,
+            'author': lambda: yt.author,
+            'publish_date': lambda: str(yt.publish_date) if yt.publish_date else 'Unknown',
+            'length': lambda: yt.length,
+            'views': lambda: yt.views,
+            'keywords': lambda: yt.keywords,
+            'channel_id': lambda: yt.channel_id,
+            'channel_url': lambda: yt.channel_url,
+        }
+        # A class cached before one of its fields was collected is refetched whole
+        stale |= {field_class(field) for field in fields if field not in cached}
+        fetched = {}
+        with self.metrics.phase("metadata"):
+            for field, fetch in fields.items():
+                if field_class(field) in stale:
+                    fetched[field] = fetch()
+        self.metadata_cache.put(yt.video_id, fetched, classes=stale)
+        return {field: fetched[field] if field in fetched else cached[field] for field in fields}
+    
+    def save_metadata(self, video_data, metadata_path):
+        """
+        Write video metadata to a JSON file.
+        
+        Args:
+            video_data (dict): Video metadata
+            metadata_path (str): Destination file
+        """
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(video_data, f, indent=4, ensure_ascii=False)
+    
+    def link_stored(self, video_id):
+        """
+        Link a video stored in the blob store by another output directory.
+        
+        Args:
+            video_id (str): YouTube video ID
+            
+        Returns:
+            bool: True if the video was linked, False if it is not stored
+        """
+        if self.blob_store is None:
+            return False
+        video_path, _ = self.video_paths(video_id)
+        checksum = self.blob_store.link_file(video_id, video_path)
+        if not checksum:
+            return False
+        print(f"Linked stored copy of {video_id}")
+        self.metrics.inc("videos_linked_total")
+        self.ledger.record_file(video_id, video_path, checksum)
+        return True
+    
+    def download_stream(self, yt, video_id):
+        """
+        Download the best progressive MP4 stream of a video and record it in the ledger.
+        
+        Args:
+            yt (pytube.YouTube): A pytube YouTube object
+            video_id (str): YouTube video ID
+            
+        Returns:
+            bool: True if download was successful, False otherwise
+        """
+        video_path, _ = self.video_paths(video_id)
+        
+        # Download the video (highest resolution)
+        print(f"Downloading video...")
+        stream = yt.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first()
+        
+        if not stream:
+            print(f"No suitable stream found for {video_id}. Trying audio only.")
+            stream = yt.streams.filter(only_audio=True).first()
+            
+        if stream:
+            with self.metrics.phase("download"):
+                if self.range_downloader:
+                    self.range_downloader.download(stream.url, video_path)
+                else:
+                    stream.download(output_path=self.video_dir, filename=os.path.basename(video_path))
+            self.metrics.inc("bytes_downloaded_total", os.path.getsize(video_path))
+            checksum = self.blob_store.add(video_id, video_path) if self.blob_store is not None else None
+            self.ledger.record_file(video_id, video_path, checksum)
+            print(f"Successfully downloaded: {video_id}")
+            return True
+        else:
+            print(f"No streams available for {video_id}")
+            self.ledger.record(video_id, FAILED)
+            return False
+    
+    def download_all_videos(self, stop_after=None):
         """
         Download all videos from the channel.
         
+        Args:
+            stop_after (int): If set, only list new uploads (see get_video_list)
+        
         Returns:
             tuple: (success_count, total_count)
         """
-        video_urls = self.get_video_list()
+        with self.metrics.stage("list"):
+            video_urls = self.get_video_list(stop_after)
         
         if not video_urls:
             print("No videos found to download.")
@@ -191,22 +399,33 @@ class YouTubeChannelDownloader:
         success_count = 0
         total_count = len(video_urls)
         
-        for i, video_url in enumerate(video_urls):
-            print(f"\nProcessing video {i+1}/{total_count}")
-            
-            if self.download_video(video_url):
-                success_count += 1
-            
-            # Add delay between downloads to avoid rate limiting
-            if i < total_count - 1:
-                print(f"Waiting {self.delay} seconds before next download...")
-                time.sleep(self.delay)
+        with self.metrics.stage("download"):
+            for i, video_url in enumerate(video_urls):
+                print(f"\nProcessing video {i+1}/{total_count}")
+                
+                if self.download_video(video_url):
+                    success_count += 1
         
         print(f"\nDownload complete! Successfully downloaded {success_count}/{total_count} videos.")
+        print(f"Final request rate: {self.rate_limiter.rate:.2f}/s")
+        stats = self.metadata_cache.stats()
+        print(f"Metadata cache: {stats['hits']} hits, {stats['partial_hits']} partial hits, {stats['misses']} misses")
         print(f"Videos saved to: {os.path.abspath(self.video_dir)}")
         print(f"Metadata saved to: {os.path.abspath(self.metadata_dir)}")
+        self.write_metrics()
         
         return success_count, total_count
+    
+    def write_metrics(self):
+        """
+        Save the run's metrics to metrics.json and metrics.prom in the output directory.
+        """
+        if self.range_downloader:
+            self.metrics.inc("retries_total", self.range_downloader.retried)
+        self.metrics.inc("throttled_total", self.rate_limiter.stats()["throttles"])
+        self.metrics.write(os.path.join(self.output_dir, "metrics.json"),
+                           os.path.join(self.output_dir, "metrics.prom"))
+        print(f"Metrics saved to: {os.path.abspath(os.path.join(self.output_dir, 'metrics.json'))}")
 
 
 def main():
@@ -215,7 +434,11 @@ def main():
     parser.add_argument('channel_url', help='YouTube channel URL')
     parser.add_argument('--output', '-o', default='downloads', help='Output directory for downloads')
     parser.add_argument('--include-shorts', action='store_true', help='Include YouTube Shorts in download')
-    parser.add_argument('--delay', '-d', type=float, default=1.5, help='Delay between video downloads (in seconds)')
+    parser.add_argument('--delay', '-d', type=float, default=1.5, help='Initial delay between video downloads (in seconds); adapts to throttling')
+    parser.add_argument('--incremental', type=int, nargs='?', const=5, metavar='N',
+                        help='Stop listing after N consecutive videos already in the download ledger (default N: 5)')
+    parser.add_argument('--connections', type=int, default=4, help='Parallel Range requests per video (0 for a single stream)')
+    parser.add_argument('--blob-store', metavar='DIR', help='Content-addressed store shared with other output directories')
     
     args = parser.parse_args()
     
@@ -224,10 +447,12 @@ def main():
             channel_url=args.channel_url,
             output_dir=args.output,
             skip_shorts=not args.include_shorts,
-            delay=args.delay
+            delay=args.delay,
+            range_downloader=RangeDownloader(max_connections=args.connections) if args.connections else False,
+            blob_store=BlobStore(args.blob_store) if args.blob_store else None
         )
         
-        downloader.download_all_videos()
+        downloader.download_all_videos(stop_after=args.incremental)
         
     except KeyboardInterrupt:
         print("\nProcess interrupted by user.")